@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the import time of the darwin modules, each one in a fresh
+Python process, as the batch workers do.
+It also lists which of the heavy dependencies each import loads.
+
+Usage: python benchmarks/bench_import.py [n_repeats]
+"""
+from __future__ import print_function
+
+import sys
+import subprocess
+
+MODULES = ['darwin', 'darwin.data_io', 'darwin.results', 'darwin.distance',
+           'darwin.features', 'darwin.pipeline', 'darwin.gini', 'darwin.plot']
+
+HEAVY = ['matplotlib', 'nibabel', 'scipy.stats', 'sklearn.metrics',
+         'sklearn.grid_search', 'sklearn.cross_validation', 'sklearn.model_selection',
+         'sklearn.ensemble', 'sklearn.pipeline']
+
+SNIPPET = """
+import sys, time
+start = time.time()
+import {module}
+elapsed = time.time() - start
+print(elapsed)
+print(','.join(m for m in {heavy!r} if m in sys.modules) or '-')
+"""
+
+
+def time_import(module, n_repeats=5):
+    """Return the minimum import time of module in n_repeats fresh
+    interpreters and the heavy modules it loaded."""
+    times  = []
+    loaded = ''
+    for _ in range(n_repeats):
+        out = subprocess.check_output([sys.executable, '-c',
+                                       SNIPPET.format(module=module, heavy=HEAVY)])
+        lines  = out.decode().strip().splitlines()
+        times.append(float(lines[-2]))
+        loaded = lines[-1]
+
+    return min(times), loaded
+
+
+if __name__ == '__main__':
+    n_repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    for module in MODULES:
+        try:
+            elapsed, loaded = time_import(module, n_repeats)
+        except subprocess.CalledProcessError:
+            print('{:<18} import failed'.format(module))
+            continue
+
+        print('{:<18} {:.3f} s   heavy modules loaded: {}'.format(module, elapsed, loaded))
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of results.get_cv_classification_metrics, which measures all
+the folds from their stacked confusion matrices, against the former loop
+of one set of sklearn.metrics scorers per fold, on the results of a
+repeated cross-validation with 1000 folds.
+
+Usage: python benchmarks/bench_metrics.py [n_folds] [fold_size]
+"""
+from __future__ import print_function
+
+import sys
+import time
+import numpy as np
+
+from darwin.results import get_cv_classification_metrics, _sklearn_classification_metrics
+
+
+def loop_metrics(cv_targets, cv_preds):
+    """The former get_cv_classification_metrics."""
+    metrics = np.zeros((len(cv_targets), 6))
+    for i in range(len(cv_targets)):
+        metrics[i, :] = _sklearn_classification_metrics(cv_targets[i], cv_preds[i], [0, 1])
+    return metrics
+
+
+def timeit(func, *args):
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+
+if __name__ == '__main__':
+    n_folds   = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    fold_size = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    rng     = np.random.RandomState(0)
+    targets = np.tile(np.arange(fold_size) % 2, (n_folds, 1))
+    preds   = np.where(rng.rand(n_folds, fold_size) < 0.8, targets, 1 - targets)
+
+    loop_time = timeit(loop_metrics, targets, preds)
+    vect_time = timeit(get_cv_classification_metrics, targets, preds)
+    print('get_cv_classification_metrics, {} folds of {}: loop {:.3f} s, '
+          'stacked {:.4f} s, x{:.0f}'.format(n_folds, fold_size, loop_time, vect_time, loop_time / vect_time))
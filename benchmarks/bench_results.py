@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the pickling of the predictions of a leave-one-out stored
+as a FoldArrays, one contiguous array with the fold offsets, against
+the former OrderedDict of one small array per fold.
+
+Usage: python benchmarks/bench_results.py [n_folds]
+"""
+from __future__ import print_function
+
+import sys
+import time
+import pickle
+import numpy as np
+from collections import OrderedDict
+
+from darwin.results import FoldArrays
+
+
+def pickle_time(obj, n_times=10):
+    start = time.time()
+    for _ in range(n_times):
+        dump = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.loads(dump)
+    return (time.time() - start) / n_times, len(dump)
+
+
+if __name__ == '__main__':
+    n_folds = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    rng    = np.random.RandomState(0)
+    preds  = OrderedDict((fold, rng.randint(0, 2, 1)) for fold in range(n_folds))
+    arrays = FoldArrays.from_dict(preds)
+
+    dict_time, dict_size = pickle_time(preds)
+    fold_time, fold_size = pickle_time(arrays)
+    print('Pickling {} folds: OrderedDict {:.4f} s, {} bytes; '
+          'FoldArrays {:.4f} s, {} bytes'.format(n_folds, dict_time, dict_size, fold_time, fold_size))
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the memory and time of ClassificationPipeline.cross_validation
+and the distance measures on high-dimensional sparse text-like features,
+as a CSR matrix, against the size the same data would take dense.
+
+Usage: python benchmarks/bench_sparse.py [n_samples] [n_features]
+"""
+from __future__ import print_function
+
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import StandardScaler
+
+from darwin.pipeline import ClassificationPipeline
+from darwin.distance import PearsonCorrelationDistance, WelchTestDistance
+
+
+def text_like_features(n_samples, n_feats, density=0.002, seed=0):
+    """Return a CSR matrix of tf-idf like term weights, with Zipf
+    distributed term frequencies, and binary labels that shift the
+    frequency of a few terms."""
+    rng    = np.random.RandomState(seed)
+    y      = rng.randint(0, 2, n_samples)
+    nnz    = int(n_samples * n_feats * density)
+    rows   = rng.randint(0, n_samples, nnz)
+    cols   = np.minimum(rng.zipf(1.3, nnz) - 1, n_feats - 1)
+    counts = rng.poisson(2, nnz) + 1.
+
+    #class-related terms
+    informative = rng.choice(n_feats, 50, replace=False)
+    rows = np.concatenate([rows, np.repeat(np.nonzero(y)[0], 5)])
+    cols = np.concatenate([cols, rng.choice(informative, 5 * y.sum())])
+    counts = np.concatenate([counts, np.ones(5 * y.sum())])
+
+    x = sp.csr_matrix((counts, (rows, cols)), shape=(n_samples, n_feats))
+    x.sum_duplicates()
+    idf = np.log(n_samples / (1. + np.bincount(x.indices, minlength=n_feats)))
+    x.data *= idf[x.indices]
+    return x, y
+
+
+def measure(func, *args):
+    """Return the seconds and the peak of traced memory in MB of func(*args)."""
+    tracemalloc.start()
+    start = time.time()
+    try:
+        func(*args)
+        elapsed = time.time() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return elapsed, peak / 1e6
+
+
+if __name__ == '__main__':
+    n_samples = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    n_feats   = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+
+    x, y  = text_like_features(n_samples, n_feats)
+    sparse_mb = (x.data.nbytes + x.indices.nbytes + x.indptr.nbytes) / 1e6
+    print('{} x {} features, {} stored values: {:.1f} MB as CSR, {:.1f} MB dense.'.format(
+          n_samples, n_feats, x.nnz, sparse_mb, n_samples * n_feats * 8 / 1e6))
+
+    for dist_cls in [PearsonCorrelationDistance, WelchTestDistance]:
+        elapsed, peak = measure(dist_cls().fit, x, y)
+        print('{:<28} {:.3f} s, peak {:.1f} MB'.format(dist_cls.__name__, elapsed, peak))
+
+    pipe = ClassificationPipeline(clfmethod='LinearSVC', cvmethod='5', scaler=StandardScaler(with_mean=False))
+    elapsed, peak = measure(pipe.cross_validation, x, y)
+    print('{:<28} {:.3f} s, peak {:.1f} MB'.format('cross_validation', elapsed, peak))
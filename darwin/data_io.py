@@ -11,41 +11,68 @@
 
 import os
 import sys
+import json
+import time
+import hashlib
 import logging
+import os.path as op
+from multiprocessing.pool import ThreadPool
 
 import numpy as np
-import nibabel as nib
-from sklearn.preprocessing import LabelEncoder
-from sklearn.datasets import load_svmlight_file
 
-from .filenames import parse_subjects_list, grep_one
+from .utils.filenames import parse_subjects_list, grep_one, file_hash
 
 
 log = logging.getLogger(__name__)
 
+#name of the file that describes the content of a load_data_cached folder
+CACHE_MANIFEST = 'manifest.json'
 
-def load_data(subjsf, datadir, maskf, labelsf=None):
-    """
 
-    @param subjsf:
-    @param datadir:
-    @param maskf:
-    @param labelsf:
-    @return:
+def load_data(subjsf, datadir, maskf, labelsf=None, n_jobs=1, out_file=None, dtype=None):
+    """Read the voxels within the mask of all subjects in subjsf.
+
+    Parameters
+    ----------
+    subjsf: str
+        Path to the subjects list file. See parse_subjects_list.
+
+    datadir: str
+
+    maskf: str
+        Path to the mask file
+
+    labelsf: str
+
+    n_jobs: int
+        Number of threads reading subject files at the same time.
+
+    out_file: str
+        Path to a .npy file. If given, the data matrix is written
+        there and x is a memory-map of it.
+
+    dtype: numpy dtype or None
+        Type of x, e.g., np.float32 to halve the memory of float64 images.
+        If None, the data type of the first subject image.
+
+    Returns
+    -------
     x, y, scores, imgsiz, msk, indices
     """
+    import nibabel as nib
 
     #loading mask
     msk     = nib.load(maskf).get_data()
-    n_vox   = np.sum  (msk > 0)
     indices = np.where(msk > 0)
+    n_vox   = len(indices[0])
 
     #reading subjects list
     [scores, subjs] = parse_subjects_list(subjsf, datadir, labelsf=labelsf)
     scores = np.array(scores)
 
-    imgsiz  = nib.load(subjs[0]).shape
-    dtype   = nib.load(subjs[0]).get_data_dtype()
+    first   = nib.load(subjs[0])
+    imgsiz  = first.shape
+    dtype   = first.get_data_dtype() if dtype is None else np.dtype(dtype)
     n_subjs = len(subjs)
 
     #checking mask and first subject dimensions match
@@ -55,32 +82,336 @@ def load_data(subjsf, datadir, maskf, labelsf=None):
         log.error(msg)
         raise(ValueError(msg))
 
+    y = encode_labels(scores)
+
+    #loading data
+    log.info('Loading data...')
+    if out_file is None:
+        x = np.zeros((n_subjs, n_vox), dtype=dtype)
+    else:
+        x = np.lib.format.open_memmap(out_file, mode='w+', dtype=dtype, shape=(n_subjs, n_vox))
+
+    read_masked_subjects(subjs, indices, x, imgsiz, n_jobs=n_jobs)
+
+    if out_file is not None:
+        x.flush()
+
+    return x, y, scores, imgsiz, msk, indices
+
+
+def load_data_cached(subjsf, datadir, maskf, cache_dir, labelsf=None, n_jobs=1, dtype=None):
+    """Same as load_data, but the outputs are kept in .npy files in cache_dir
+    and reused while the subjects list, the mask and the subject files
+    do not change.
+
+    There is one cache folder for each mask file content, with one entry
+    for each subjects list, labels file and datadir, so the cohorts loaded
+    with the same mask do not overwrite each other. Each entry keeps the
+    modification time and size of its subject files, so when the subjects
+    change only the ones not cached in any entry of the mask are read again.
+
+    Parameters
+    ----------
+    subjsf: str
+        Path to the subjects list file. See parse_subjects_list.
+
+    datadir: str
+
+    maskf: str
+        Path to the mask file
+
+    cache_dir: str
+        Path to the cache root folder
+
+    labelsf: str
+
+    n_jobs: int
+        Number of threads reading subject files at the same time.
+
+    dtype: numpy dtype or None
+        Type of x. If None, the data type of the first subject image.
+
+    Returns
+    -------
+    x, y, scores, imgsiz, msk, indices
+        x is a read-only memory-map of the cached data matrix.
+    """
+    import nibabel as nib
+
+    msk     = nib.load(maskf).get_data()
+    indices = np.where(msk > 0)
+    imgsiz  = msk.shape
+
+    #what the cache should contain
+    [scores, subjs] = parse_subjects_list(subjsf, datadir, labelsf=labelsf)
+    stamps     = [_file_stamp(imf) for imf in subjs]
+    list_hash  = file_hash(subjsf) + (file_hash(labelsf) if labelsf is not None else '') + datadir
+
+    cache_path = op.join(cache_dir, file_hash(maskf))
+    entry_path = op.join(cache_path, hashlib.md5(list_hash.encode('utf-8')).hexdigest())
+    if not op.exists(entry_path):
+        os.makedirs(entry_path)
+
+    cache_file    = lambda name: op.join(entry_path, name + '.npy')
+    manifest_file = op.join(entry_path, CACHE_MANIFEST)
+
+    manifest = None
+    if op.exists(manifest_file):
+        with open(manifest_file, 'rt') as f:
+            manifest = json.load(f)
+
+    if dtype is not None:
+        dtype = np.dtype(dtype)
+
+    if manifest is not None and manifest['list_hash'] == list_hash and manifest['subjects'] == stamps \
+            and (dtype is None or manifest['dtype'] == dtype.str):
+        log.info('Loading cached data from {}.'.format(entry_path))
+        return (np.load(cache_file('x'), mmap_mode='r'), np.load(cache_file('y')),
+                np.load(cache_file('scores')), imgsiz, msk, indices)
+
+    scores = np.array(scores)
+    y      = encode_labels(scores)
+    dtype  = nib.load(subjs[0]).get_data_dtype() if dtype is None else dtype
+    x      = np.lib.format.open_memmap(cache_file('x_tmp'), mode='w+', dtype=dtype,
+                                       shape=(len(subjs), len(indices[0])))
+
+    #copy the unchanged subjects from the cached cohorts of the mask
+    cached_rows = _cached_rows(cache_path, dtype, first=op.basename(entry_path))
+    old_xs      = {}
+    to_read     = []
+    for row, stamp in enumerate(stamps):
+        if tuple(stamp) not in cached_rows:
+            to_read.append(row)
+            continue
+
+        old_xf, old_row = cached_rows[tuple(stamp)]
+        if old_xf not in old_xs:
+            old_xs[old_xf] = np.load(old_xf, mmap_mode='r')
+        x[row, :] = old_xs[old_xf][old_row]
+    del old_xs
+
+    log.info('Reading {} of {} subjects into cache {}.'.format(len(to_read), len(subjs), entry_path))
+    read_masked_subjects([subjs[row] for row in to_read], indices, x, imgsiz,
+                         n_jobs=n_jobs, rows=to_read)
+    x.flush()
+    del x
+
+    #the manifest goes last, so an interrupted update is never taken as valid
+    if op.exists(manifest_file):
+        os.remove(manifest_file)
+
+    if op.exists(cache_file('x')):
+        os.remove(cache_file('x'))
+    os.rename(cache_file('x_tmp'), cache_file('x'))
+
+    np.save(cache_file('y'), y)
+    np.save(cache_file('scores'), scores)
+
+    with open(manifest_file, 'wt') as f:
+        json.dump({'list_hash': list_hash, 'dtype': dtype.str, 'subjects': stamps}, f)
+
+    return np.load(cache_file('x'), mmap_mode='r'), y, scores, imgsiz, msk, indices
+
+
+def _cached_rows(cache_path, dtype, first=None):
+    """Return {subject file stamp: (x .npy file, row)} of the entries of the
+    cache folder cache_path with a valid manifest and data of type dtype.
+    The rows of the entry named first are preferred."""
+    entries = sorted(os.listdir(cache_path), key=lambda entry: entry != first)
+
+    cached_rows = {}
+    for entry in entries:
+        manifest_file = op.join(cache_path, entry, CACHE_MANIFEST)
+        if not op.exists(manifest_file):
+            continue
+
+        with open(manifest_file, 'rt') as f:
+            manifest = json.load(f)
+        if manifest['dtype'] != dtype.str:
+            continue
+
+        x_file = op.join(cache_path, entry, 'x.npy')
+        for row, stamp in enumerate(manifest['subjects']):
+            cached_rows.setdefault(tuple(stamp), (x_file, row))
+
+    return cached_rows
+
+
+def _file_stamp(filepath):
+    """Return [absolute path, modification time, size] of filepath."""
+    stat = os.stat(filepath)
+    return [op.abspath(filepath), stat.st_mtime, stat.st_size]
+
+
+def read_masked_voxels(imf, indices, imgsiz=None):
+    """Read the voxels in indices of the image file imf.
+
+    The voxels are taken from the unscaled data of the image proxy, which
+    nibabel memory-maps for uncompressed images, so only the pages that
+    hold masked voxels are read from disk, and the scl_slope and
+    scl_inter of the header are applied only to them.
+    Compressed images (.nii.gz) can not be memory-mapped: their whole
+    unscaled volume is read, but not scaled or kept on the image.
+
+    Parameters
+    ----------
+    imf: str
+        Path to the image file
+
+    indices: tuple of arrays
+        As returned by np.where(mask > 0)
+
+    imgsiz: tuple
+        If given, the shape the image should have.
+
+    Returns
+    -------
+    numpy array
+    """
+    import nibabel as nib
+
+    img = nib.load(imf)
+    if imgsiz is not None and img.shape != imgsiz:
+        msg = 'Subject image {0} shape {1} should be {2}.'.format(imf, img.shape, imgsiz)
+        log.error(msg)
+        raise(ValueError(msg))
+
+    proxy = getattr(img, 'dataobj', None)
+    if not hasattr(proxy, 'get_unscaled'):
+        #nibabel < 2.0 or an image held in memory
+        return np.asarray(img.get_data()[indices])
+
+    voxels = np.asarray(proxy.get_unscaled()[indices])
+
+    slope, inter = getattr(proxy, 'slope', 1.), getattr(proxy, 'inter', 0.)
+    if slope != 1. or inter != 0.:
+        voxels = voxels * slope + inter
+
+    return voxels
+
+
+def read_masked_subjects(subjs, indices, out, imgsiz=None, n_jobs=1, rows=None):
+    """Read the masked voxels of each file in subjs into the rows of out.
+
+    Parameters
+    ----------
+    subjs: list of str
+        Paths to the subject image files
+
+    indices: tuple of arrays
+        As returned by np.where(mask > 0)
+
+    out: numpy array or memmap
+        Shape: n_subjs x n_vox
+
+    imgsiz: tuple
+        If given, the shape all images should have.
+
+    n_jobs: int
+        Number of threads reading files at the same time.
+
+    rows: list of int
+        Row of out for each file in subjs.
+        If None, will be range(len(subjs)).
+
+    Returns
+    -------
+    out
+    """
+    if rows is None:
+        rows = list(range(len(subjs)))
+
+    read = lambda row_imf: (row_imf[0], read_masked_voxels(row_imf[1], indices, imgsiz))
+
+    pool = None
+    if n_jobs > 1:
+        pool = ThreadPool(n_jobs)
+        reader = pool.imap_unordered(read, zip(rows, subjs))
+    else:
+        reader = (read(row_imf) for row_imf in zip(rows, subjs))
+
+    n_subjs   = len(subjs)
+    log_every = max(1, n_subjs // 10)
+    row_bytes = out.shape[1] * out.dtype.itemsize
+    start     = time.time()
+    try:
+        for count, (row, voxels) in enumerate(reader, 1):
+            out[row, :] = voxels
+
+            if count % log_every == 0 or count == n_subjs:
+                elapsed = max(time.time() - start, 1e-6)
+                log.info('Read {}/{} subjects: {:.1f} subjects/s, '
+                         '{:.1f} MB/s.'.format(count, n_subjs, count / elapsed,
+                                               count * row_bytes / elapsed / 1e6))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return out
+
+
+def encode_labels(scores):
+    """Return scores as integer class labels, relabeling them if needed.
+
+    Parameters
+    ----------
+    scores: numpy array
+
+    Returns
+    -------
+    numpy array of ints
+    """
     #relabeling scores to integers, if needed
     if not np.all(scores.astype(int) == scores):
-    #    unis = np.unique(scores)
-    #    scs  = np.zeros (scores.shape, dtype=int)
-    #    for k in np.arange(len(unis)):
-    #        scs[scores == unis[k]] = k
-    #    y = scs.copy()
+        from sklearn.preprocessing import LabelEncoder
         le = LabelEncoder()
         le.fit(scores)
         y = le.transform(scores)
     else:
         y = scores.copy()
 
-    y = y.astype(int)
+    return y.astype(int)
 
-    #loading data
-    log.info('Loading data...')
-    x = np.zeros((n_subjs, n_vox), dtype=dtype)
-    for f in np.arange(n_subjs):
-        imf = subjs[f]
-        log.info('Reading ' + imf)
 
-        img = nib.load(imf).get_data()
-        x[f, :] = img[indices]
+def iter_data_batches(subjsf, datadir, maskf, labelsf=None, batch_size=50):
+    """Read the masked data of the subjects in subjsf by batches of
+    batch_size subjects. Useful when the whole data matrix does not fit
+    in memory, e.g., with DistanceMeasure.fit_batches.
 
-    return x, y, scores, imgsiz, msk, indices
+    Parameters
+    ----------
+    subjsf: str
+        Path to the subjects list file. See parse_subjects_list.
+
+    datadir: str
+
+    maskf: str
+        Path to the mask file
+
+    labelsf: str
+
+    batch_size: int
+        Number of subjects in each batch
+
+    Returns
+    -------
+    Generator of (x, y) batches, where x is [batch_size x n_vox]
+    """
+    import nibabel as nib
+
+    msk     = nib.load(maskf).get_data()
+    indices = np.where(msk > 0)
+
+    [scores, subjs] = parse_subjects_list(subjsf, datadir, labelsf=labelsf)
+    y = encode_labels(np.array(scores))
+
+    for start in range(0, len(subjs), batch_size):
+        batch = subjs[start:start + batch_size]
+        log.info('Reading subjects {} to {}'.format(start, start + len(batch) - 1))
+
+        x = np.array([read_masked_voxels(imf, indices) for imf in batch])
+        yield x, y[start:start + len(batch)]
 
 
 def write_svmperf_dat(filename, dataname, data, labels):
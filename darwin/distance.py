@@ -14,12 +14,17 @@
 # Use this at your own risk!
 #------------------------------------------------------------------------------
 
+import sys
 import numpy as np
-import scipy.stats as stats
+import scipy.sparse as sp
 
 from .validation import check_X_y
 from .utils.printable import Printable
 
+#Maximum size in bytes of the temporary arrays created when scoring
+#the features of a wide matrix by chunks of columns.
+CHUNK_BYTES = 128 * 1024 * 1024
+
 
 class DistanceMeasure(object):
     """Base adapter class to measure distances between groups in
@@ -30,11 +35,17 @@ class DistanceMeasure(object):
     score_func : callable
         Function taking two arrays x and y, and returning one array of
         distance scores
+
+    moments_score_func : callable
+        Function taking a ClassMoments object and returning the same
+        distance scores as score_func. Needed for partial_fit.
     """
 
-    def __init__(self, score_func):
+    def __init__(self, score_func, moments_score_func=None):
         self.score_func = score_func
+        self.moments_score_func = moments_score_func
         self.scores_ = None
+        self.moments_ = None
 
     def fit(self, samples, targets):
         """
@@ -63,6 +74,63 @@ class DistanceMeasure(object):
 
         self._check_params(samples, targets)
         self.scores_ = np.asarray(self.score_func(samples, targets))
+        self.moments_ = None
+
+        return self
+
+    def partial_fit(self, samples, targets):
+        """Add a batch of samples to the running class moments and
+        update scores_ with them.
+
+        After all the batches, scores_ is the same as calling fit with
+        all the samples at once, but only one batch is in memory at a time.
+        The per-class feature bounds are carried across the batches, so the
+        features constant inside a class also score as in fit.
+
+        Parameters
+        ----------
+        samples: array-like, shape = [n_samples, n_features]
+            A batch of the training input samples.
+
+        targets: array-like, shape = [n_samples]
+            The class labels of the batch.
+
+        Returns
+        -------
+        self : object
+            Returns self.
+        """
+        if not callable(self.moments_score_func):
+            raise TypeError("{} can't be fitted by batches, it has no moments score "
+                            "function.".format(self.__class__.__name__))
+
+        samples, targets = check_X_y(samples, targets, ['csr', 'csc', 'coo'])
+
+        self._check_params(samples, targets)
+        if self.moments_ is None:
+            self.moments_ = ClassMoments()
+
+        self.moments_.update(samples, targets)
+        self.scores_ = np.asarray(self.moments_score_func(self.moments_))
+
+        return self
+
+    def fit_batches(self, batches):
+        """Call partial_fit for each (samples, targets) batch.
+
+        Parameters
+        ----------
+        batches: iterable of (samples, targets) tuples
+            For example, data_io.iter_data_batches
+
+        Returns
+        -------
+        self : object
+            Returns self.
+        """
+        self.moments_ = None
+        for samples, targets in batches:
+            self.partial_fit(samples, targets)
 
         return self
 
@@ -90,7 +158,8 @@ class PearsonCorrelationDistance(DistanceMeasure):
     """
 
     def __init__(self):
-        super(PearsonCorrelationDistance, self).__init__(stats.pearsonr)
+        super(PearsonCorrelationDistance, self).__init__(pearson_correlation,
+                                                         pearson_from_moments)
 
 
 class WelchTestDistance(DistanceMeasure):
@@ -111,8 +180,9 @@ class WelchTestDistance(DistanceMeasure):
     Size: n_features
     """
 
-    def __init__(self, threshold):
-        super(WelchTestDistance, self).__init__(self, welch_ttest)
+    def __init__(self, threshold=None):
+        super(WelchTestDistance, self).__init__(welch_ttest,
+                                                welch_ttest_from_moments)
 
 
 class BhatacharyyaGaussianDistance(DistanceMeasure):
@@ -135,28 +205,150 @@ class BhatacharyyaGaussianDistance(DistanceMeasure):
     """
 
     def __init__(self):
-        super(BhatacharyyaGaussianDistance, self).__init__(self, bhattacharyya_dist)
+        super(BhatacharyyaGaussianDistance, self).__init__(bhattacharyya_dist,
+                                                           bhattacharyya_from_moments)
+
+
+def work_dtype(x):
+    """Return the float type of the temporary copies of x: float32 if x is
+    float32, so float32 datasets are not upcast chunk by chunk, else float64.
+    The means, norms and sums of the chunks are accumulated in float64
+    in any case, with the dtype argument of the numpy reductions."""
+    return np.float32 if getattr(x, 'dtype', None) == np.float32 else np.float64
 
 
-def pearson_correlation(x, y):
+def column_chunks(n_samples, n_feats, itemsize=8, chunk_size=None):
+    """
+    Split the columns of a [n_samples x n_feats] matrix in chunks
+    whose temporary copies fit in CHUNK_BYTES.
+
+    Parameters
+    ----------
+    n_samples: int
+
+    n_feats: int
+
+    itemsize: int
+        Size in bytes of each element of the temporary copies.
+
+    chunk_size: int
+        Number of columns of each chunk.
+        If None, will be calculated from CHUNK_BYTES.
+
+    Returns
+    -------
+    Generator of slices
+    """
+    if chunk_size is None:
+        chunk_size = CHUNK_BYTES // max(1, n_samples * itemsize)
+
+    chunk_size = max(1, int(chunk_size))
+    for start in range(0, n_feats, chunk_size):
+        yield slice(start, min(start + chunk_size, n_feats))
+
+
+def sparse_column_sums(x):
+    """Return the per-column sum and sum of squares of the sparse matrix x,
+    accumulated in float64 without densifying it.
+
+    Parameters
+    ----------
+    x: scipy.sparse matrix
+        Shape: n_samples x n_features
+
+    Returns
+    -------
+    sums, sqsums: numpy arrays
+        Size: n_features
+    """
+    x    = x.tocsr()
+    data = np.asarray(x.data, dtype=np.float64)
+    return (np.bincount(x.indices, weights=data,        minlength=x.shape[1]),
+            np.bincount(x.indices, weights=data * data, minlength=x.shape[1]))
+
+
+def sparse_column_range(x):
+    """Return the per-column minimum and maximum of the sparse matrix x,
+    counting its implicit zeros."""
+    return (np.asarray(x.min(axis=0).todense()).ravel(),
+            np.asarray(x.max(axis=0).todense()).ravel())
+
+
+def pearson_correlation(x, y, chunk_size=None):
     """
     Calculates for each feature in X the
     pearson correlation with y.
 
+    All the correlations of a chunk of columns are calculated at once with
+    a matrix product, the result is the same as calling
+    scipy.stats.pearsonr on each column.
+    A sparse x is not densified, the correlations come from its column sums.
+
     Parameters
     ----------
-    x: numpy array
+    x: numpy array or scipy.sparse matrix
         Shape: n_samples x n_features
 
     y: numpy array or list
         Size: n_samples
 
+    chunk_size: int
+        Number of columns of x processed at once.
+        If None, will be calculated so the temporary arrays fit in CHUNK_BYTES.
+
     Returns
     -------
     array_like
     Size: n_features
     """
-    return distance_computation(x, y, stats.pearsonr)
+    if sp.issparse(x):
+        return _sparse_pearson_correlation(x, y)
+
+    n_samples, n_feats = x.shape
+    dtype = work_dtype(x)
+
+    yc = np.asarray(y, dtype=np.float64).ravel()
+    yc = (yc - yc.mean()).astype(dtype)
+    y_norm = np.sqrt(np.dot(yc, yc.astype(np.float64)))
+
+    r = np.zeros(n_feats)
+    for cols in column_chunks(n_samples, n_feats, itemsize=np.dtype(dtype).itemsize, chunk_size=chunk_size):
+        xc  = np.array(x[:, cols], dtype=dtype)
+        constant = (xc == xc[0]).all(axis=0)
+        xc -= xc.mean(axis=0, dtype=np.float64)
+
+        #constant features have no correlation, avoid rounding errors in their mean
+        x_norm = np.sqrt(np.einsum('ij,ij->j', xc, xc, dtype=np.float64))
+        x_norm[constant] = 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r[cols] = np.einsum('i,ij->j', yc, xc, dtype=np.float64) / (x_norm * y_norm)
+
+    r[np.isnan(r)] = 0
+
+    #as scipy.stats.pearsonr, remove rounding errors out of [-1, 1]
+    return np.clip(r, -1., 1., out=r)
+
+
+def _sparse_pearson_correlation(x, y):
+    """pearson_correlation of a scipy.sparse matrix x."""
+    x = x.tocsr()
+    n_samples = x.shape[0]
+
+    yc = np.asarray(y, dtype=np.float64).ravel()
+    yc = yc - yc.mean()
+    y_norm = np.sqrt(np.dot(yc, yc))
+
+    sums, sqsums = sparse_column_sums(x)
+    x_norm = np.sqrt(np.maximum(sqsums - np.square(sums) / n_samples, 0))
+    x_min, x_max = sparse_column_range(x)
+    x_norm[x_min == x_max] = 0
+
+    #yc is centered, so its products with x and with the centered x are the same
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = x.T.dot(yc) / (x_norm * y_norm)
+
+    r[np.isnan(r)] = 0
+    return np.clip(r, -1., 1., out=r)
 
 
 def distance_computation(x, y, dist_function):
@@ -185,22 +377,246 @@ def distance_computation(x, y, dist_function):
     Apply any given 1-D distance function to X and y.
     Have a look at:
     http://docs.scipy.org/doc/scipy/reference/spatial.distance.html
+
+    scipy.stats.pearsonr is not applied column by column, it is
+    replaced by the vectorized pearson_correlation.
     """
+    #if scipy.stats is not loaded yet, dist_function can't be its pearsonr
+    stats = sys.modules.get('scipy.stats')
+    if stats is not None and dist_function is stats.pearsonr:
+        return pearson_correlation(x, y)
+
     #number of features
     n_feats = x.shape[1]
 
     #creating output volume file
     p = np.zeros(n_feats)
 
+    #sparse matrices are densified one column at a time
+    if sp.issparse(x):
+        x = x.tocsc()
+        column = lambda i: x[:, i].toarray().ravel()
+    else:
+        column = lambda i: x[:, i]
+
     #calculating dist_function across all subjects
     for i in list(range(x.shape[1])):
-        p[i] = dist_function(x[:, i], y)[0]
+        p[i] = dist_function(column(i), y)[0]
 
     p[np.isnan(p)] = 0
 
     return p
 
 
+class ClassMoments(object):
+    """
+    Per-class sufficient statistics of each feature: number of samples,
+    sum and sum of squares. They are accumulated in one pass over the data
+    and all the group distances can be derived from them.
+
+    The sums are taken around a per-feature shift, the feature means of the
+    first data seen, to keep the variances accurate.
+
+    Members
+    -------
+    classes: numpy array
+        Size: n_classes, sorted
+
+    counts: numpy array
+        Size: n_classes
+
+    sums: numpy array
+        Shape: n_classes x n_features
+
+    sqsums: numpy array
+        Shape: n_classes x n_features
+
+    shift: numpy array
+        Size: n_features
+
+    mins, maxs: numpy arrays
+        Shape: n_classes x n_features
+        Per-class minimum and maximum of each feature, the features
+        constant inside a class have exactly 0 variance in it.
+    """
+
+    def __init__(self):
+        self.classes = None
+        self.counts  = None
+        self.sums    = None
+        self.sqsums  = None
+        self.shift   = None
+        self.mins    = None
+        self.maxs    = None
+
+    def _add_classes(self, labels, n_feats):
+        """Make room for the classes in labels that have not been seen yet."""
+        labels = np.unique(labels)
+        if self.classes is None:
+            self.classes = labels
+            self.counts  = np.zeros(len(labels))
+            self.sums    = np.zeros((len(labels), n_feats))
+            self.sqsums  = np.zeros((len(labels), n_feats))
+            self.mins    = np.full((len(labels), n_feats),  np.inf)
+            self.maxs    = np.full((len(labels), n_feats), -np.inf)
+            return
+
+        new_classes = np.setdiff1d(labels, self.classes)
+        if not len(new_classes):
+            return
+
+        classes = np.union1d(self.classes, new_classes)
+        rows    = np.searchsorted(classes, self.classes)
+
+        counts, sums, sqsums = (np.zeros(len(classes)),
+                                np.zeros((len(classes), n_feats)),
+                                np.zeros((len(classes), n_feats)))
+        counts[rows], sums[rows], sqsums[rows] = self.counts, self.sums, self.sqsums
+
+        mins, maxs = np.full((len(classes), n_feats), np.inf), np.full((len(classes), n_feats), -np.inf)
+        mins[rows], maxs[rows] = self.mins, self.maxs
+
+        self.classes, self.counts, self.sums, self.sqsums = classes, counts, sums, sqsums
+        self.mins,    self.maxs = mins, maxs
+
+    def update(self, x, y, chunk_size=None):
+        """Add the samples in x, labeled by y, to the statistics.
+
+        Parameters
+        ----------
+        x: numpy array or scipy.sparse matrix
+            Shape: n_samples x n_features
+            A sparse x is not densified.
+
+        y: numpy array or list
+            Size: n_samples
+
+        chunk_size: int
+            Number of columns of x processed at once.
+            See column_chunks. Not used for sparse x.
+
+        Returns
+        -------
+        self
+        """
+        y = np.asarray(y).ravel()
+        n_samples, n_feats = x.shape
+        dtype = work_dtype(x)
+
+        self._add_classes(y, n_feats)
+
+        #class indicator matrix, the class sums are one matrix product
+        class_idx  = np.searchsorted(self.classes, y)
+        membership = np.zeros((len(self.classes), n_samples), dtype=dtype)
+        membership[class_idx, np.arange(n_samples)] = 1
+        self.counts += membership.sum(axis=1)
+
+        class_rows = [(k, np.flatnonzero(class_idx == k)) for k in np.unique(class_idx)]
+
+        first_update = self.shift is None
+        if first_update:
+            self.shift = np.zeros(n_feats)
+
+        if sp.issparse(x):
+            return self._update_sparse(x.tocsr(), class_idx, class_rows, first_update)
+
+        for cols in column_chunks(n_samples, n_feats, itemsize=np.dtype(dtype).itemsize, chunk_size=chunk_size):
+            xc = np.array(x[:, cols], dtype=dtype)
+            if first_update:
+                self.shift[cols] = xc.mean(axis=0, dtype=np.float64)
+
+            for k, rows in class_rows:
+                xk = xc[rows]
+                self.mins[k, cols] = np.minimum(self.mins[k, cols], xk.min(axis=0))
+                self.maxs[k, cols] = np.maximum(self.maxs[k, cols], xk.max(axis=0))
+
+            xc -= self.shift[cols]
+            self.sums  [:, cols] += np.einsum('kn,nj->kj', membership, xc, dtype=np.float64)
+            xc *= xc
+            self.sqsums[:, cols] += np.einsum('kn,nj->kj', membership, xc, dtype=np.float64)
+
+        return self
+
+    def _update_sparse(self, x, class_idx, class_rows, first_update):
+        """update for a CSR matrix x, with the class sums taken from its
+        stored values. The class rows of membership are already counted."""
+        n_samples, n_feats = x.shape
+
+        if first_update:
+            self.shift = sparse_column_sums(x)[0] / n_samples
+
+        for k, rows in class_rows:
+            x_min, x_max = sparse_column_range(x[rows])
+            self.mins[k] = np.minimum(self.mins[k], x_min)
+            self.maxs[k] = np.maximum(self.maxs[k], x_max)
+
+        #one bin per class and feature for each stored value
+        rows      = np.repeat(np.arange(n_samples), np.diff(x.indptr))
+        bins      = class_idx[rows] * n_feats + x.indices
+        n_bins    = self.n_classes * n_feats
+        data      = np.asarray(x.data, dtype=np.float64)
+
+        sums   = np.bincount(bins, weights=data,        minlength=n_bins).reshape(self.n_classes, n_feats)
+        sqsums = np.bincount(bins, weights=data * data, minlength=n_bins).reshape(self.n_classes, n_feats)
+        counts = np.bincount(class_idx, minlength=self.n_classes)[:, np.newaxis]
+
+        #sums of x - shift from the sums of x
+        self.sums   += sums - counts * self.shift
+        self.sqsums += sqsums - 2 * self.shift * sums + counts * np.square(self.shift)
+
+        return self
+
+    @property
+    def n_classes(self):
+        return len(self.classes)
+
+    @property
+    def class_constant(self):
+        """True for the features with only one value inside a class.
+        Shape: n_classes x n_features"""
+        return self.mins == self.maxs
+
+    @property
+    def constant(self):
+        """True for the features with only one value. Size: n_features"""
+        return self.mins.min(axis=0) == self.maxs.max(axis=0)
+
+    @property
+    def means(self):
+        """Per-class feature means. Shape: n_classes x n_features"""
+        means = self.shift + self.sums / self.counts[:, np.newaxis]
+        const = self.class_constant
+        means[const] = self.mins[const]
+        return means
+
+    @property
+    def variances(self):
+        """Per-class feature variances, as np.var. Shape: n_classes x n_features"""
+        means = self.sums / self.counts[:, np.newaxis]
+        varis = np.maximum(self.sqsums / self.counts[:, np.newaxis] - np.square(means), 0)
+        varis[self.class_constant] = 0
+        return varis
+
+
+def class_moments(x, y):
+    """
+    Calculates the ClassMoments of the groups in X, labeled by y.
+
+    Parameters
+    ----------
+    x: numpy array
+        Shape: n_samples x n_features
+
+    y: numpy array or list
+        Size: n_samples
+
+    Returns
+    -------
+    ClassMoments
+    """
+    return ClassMoments().update(x, y)
+
+
 def bhattacharyya_dist(x, y):
     """
     Univariate Gaussian Bhattacharyya distance
@@ -214,91 +630,140 @@ def bhattacharyya_dist(x, y):
     y: numpy array or list
         Size: n_samples
 
-    dist_function: function
-        distance function
+    Returns
+    -------
+    array_like
+    Size: n_features
+    """
+    return bhattacharyya_from_moments(class_moments(x, y))
+
+
+def welch_ttest(x, y):
+    """
+    Welch's t-test between the groups in X, labeled by y.
+
+    Parameters
+    ----------
+    x: numpy array
+        Shape: n_samples x n_features
+
+    y: numpy array or list
+        Size: n_samples
 
     Returns
     -------
     array_like
     Size: n_features
     """
-    classes = np.unique(y)
-    n_class = len(classes)
-    n_feats = x.shape[1]
+    return welch_ttest_from_moments(class_moments(x, y))
+
+
+def pearson_from_moments(moments):
+    """
+    Pearson's correlation between each feature and the class labels
+    of the groups summarized in moments.
+    The class labels must be numbers.
+
+    Parameters
+    ----------
+    moments: ClassMoments
+
+    Returns
+    -------
+    array_like
+    Size: n_features
+    """
+    counts  = moments.counts
+    n_total = counts.sum()
+
+    labels = moments.classes.astype(np.float64)
+    labels = labels - np.dot(counts, labels) / n_total
+    y_var  = np.dot(counts, np.square(labels))
 
-    b = np.zeros(n_feats)
-    for i in np.arange(n_class):
-        for j in np.arange(i + 1, n_class):
-            if j > i:
-                xi = x[y == i, :]
-                xj = x[y == j, :]
+    #the shifted sums are centered on the overall mean
+    sums   = moments.sums.sum(axis=0)
+    x_var  = moments.sqsums.sum(axis=0) - np.square(sums) / n_total
+    x_var[moments.constant] = 0
+    x_cov  = np.dot(labels, moments.sums)
 
-                mi = np.mean (xi, axis=0)
-                mj = np.mean (xj, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = x_cov / np.sqrt(np.maximum(x_var, 0) * y_var)
 
-                vi = np.var  (xi, axis=0)
-                vj = np.var  (xj, axis=0)
+    r[np.isnan(r)] = 0
+    r[np.isinf(r)] = 0
 
-                si = np.std  (xi, axis=0)
-                sj = np.std  (xj, axis=0)
+    return np.clip(r, -1., 1., out=r)
 
+
+def bhattacharyya_from_moments(moments):
+    """
+    Univariate Gaussian Bhattacharyya distance between the groups
+    summarized in moments. For more than two groups, the maximum
+    distance between any pair of them.
+
+    Parameters
+    ----------
+    moments: ClassMoments
+
+    Returns
+    -------
+    array_like
+    Size: n_features
+    """
+    means = moments.means
+    varis = moments.variances
+    stds  = np.sqrt(varis)
+
+    b = np.zeros(means.shape[1])
+    for i in np.arange(moments.n_classes):
+        for j in np.arange(i + 1, moments.n_classes):
+            mi, mj = means[i], means[j]
+            vi, vj = varis[i], varis[j]
+            si, sj = stds [i], stds [j]
+
+            with np.errstate(divide='ignore', invalid='ignore'):
                 d = 0.25 * (np.square(mi - mj) / (vi + vj)) + \
                     0.5 * (np.log((vi + vj) / (2*si*sj)))
-                d[np.isnan(d)] = 0
-                d[np.isinf(d)] = 0
+            d[np.isnan(d)] = 0
+            d[np.isinf(d)] = 0
 
-                b = np.maximum(b, d)
+            b = np.maximum(b, d)
 
     return b
 
 
-def welch_ttest(x, y):
+def welch_ttest_from_moments(moments):
     """
-    Welch's t-test between the groups in X, labeled by y.
+    Welch's t-test between the groups summarized in moments.
+    For more than two groups, the maximum value between any pair of them.
 
     Parameters
     ----------
-    x: numpy array
-        Shape: n_samples x n_features
-
-    y: numpy array or list
-        Size: n_samples
-
-    dist_function: function
-        distance function
+    moments: ClassMoments
 
     Returns
     -------
     array_like
     Size: n_features
     """
-    classes = np.unique(y)
-    n_class = len(classes)
-    n_feats = x.shape[1]
-
-    b = np.zeros(n_feats)
-    for i in np.arange(n_class):
-        for j in np.arange(i+1, n_class):
-            if j > i:
-                xi = x[y == i, :]
-                xj = x[y == j, :]
-                yi = y[y == i]
-                yj = y[y == j]
-
-                mi = np.mean(xi, axis=0)
-                mj = np.mean(xj, axis=0)
+    means = moments.means
+    varis = moments.variances
 
-                vi = np.var (xi, axis=0)
-                vj = np.var (xj, axis=0)
+    b = np.zeros(means.shape[1])
+    for i in np.arange(moments.n_classes):
+        for j in np.arange(i + 1, moments.n_classes):
+            mi, mj = means[i], means[j]
+            vi, vj = varis[i], varis[j]
 
-                n_subjsi = len(yi)
-                n_subjsj = len(yj)
+            n_subjsi = moments.counts[i]
+            n_subjsj = moments.counts[j]
 
+            with np.errstate(divide='ignore', invalid='ignore'):
                 t = (mi - mj) / np.sqrt((np.square(vi) / n_subjsi) +
                                         (np.square(vj) / n_subjsj))
-                t[np.isnan(t)] = 0
-                t[np.isinf(t)] = 0
+            t[np.isnan(t)] = 0
+            t[np.isinf(t)] = 0
 
-                b = np.maximum(b, t)
+            b = np.maximum(b, t)
 
     return b
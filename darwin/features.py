@@ -15,13 +15,14 @@
 
 import os
 import numpy as np
-import scipy.stats as stats
+import scipy.sparse as sp
 import logging
 
 from sklearn.feature_selection.base import SelectorMixin
 from sklearn.feature_selection.univariate_selection import (_BaseFilter, _clean_nans)
 
-from .distance import (welch_ttest, bhattacharyya_dist,
+from .distance import (welch_ttest, bhattacharyya_dist, pearson_correlation,
+                       work_dtype,
                        DistanceMeasure,
                        PearsonCorrelationDistance,
                        BhatacharyyaGaussianDistance,
@@ -101,7 +102,7 @@ class PearsonCorrelationSelection(DistanceBasedSelection):
     groups in X, labeled by y.
     """
     def __init__(self, threshold):
-        super(PearsonCorrelationSelection, self).__init__(stats.pearsonr, threshold)
+        super(PearsonCorrelationSelection, self).__init__(pearson_correlation, threshold)
 
 
 class WelchTestSelection(DistanceBasedSelection):
@@ -201,14 +202,22 @@ def feature_selection(samples, targets, method, thr=95, dist_function=None, thr_
 def calculate_stats(data):
     """
 
-    @param data: numpy array
+    @param data: numpy array or scipy.sparse matrix
     Shape: n_samples x n_features
+    A sparse matrix is not densified, its statistics come from the
+    moments of its stored values.
 
-    @return:
+    @return: numpy array
+    Shape: n_samples x 7, float32 if data is float32.
     """
+    if sp.issparse(data):
+        return _sparse_stats(data.tocsr())
+
+    import scipy.stats as stats
+
     n_subjs = data.shape[0]
 
-    feats = np.zeros((n_subjs, 7))
+    feats = np.zeros((n_subjs, 7), dtype=work_dtype(data))
 
     feats[:, 0] = data.max(axis=1)
     feats[:, 1] = data.min(axis=1)
@@ -221,6 +230,51 @@ def calculate_stats(data):
     return feats
 
 
+def _sparse_stats(data):
+    """calculate_stats of a CSR matrix, counting its implicit zeros.
+    As scipy.stats, the skewness and kurtosis of a constant row are 0 and -3."""
+    n_subjs, n_feats = data.shape
+
+    rows = np.repeat(np.arange(n_subjs), np.diff(data.indptr))
+    vals = np.asarray(data.data, dtype=np.float64)
+
+    #raw moments, then central moments
+    mu, e2, e3, e4 = [np.bincount(rows, weights=vals ** k, minlength=n_subjs) / n_feats for k in (1, 2, 3, 4)]
+    m2 = np.maximum(e2 - mu**2, 0)
+    m3 = e3 - 3 * mu * e2 + 2 * mu**3
+    m4 = e4 - 4 * mu * e3 + 6 * mu**2 * e2 - 3 * mu**4
+
+    feats = np.zeros((n_subjs, 7), dtype=work_dtype(data))
+
+    feats[:, 0] = np.asarray(data.max(axis=1).todense()).ravel()
+    feats[:, 1] = np.asarray(data.min(axis=1).todense()).ravel()
+    feats[:, 2] = mu
+    feats[:, 3] = m2
+    feats[:, 4] = [_sparse_row_median(data.data[data.indptr[i]:data.indptr[i + 1]], n_feats)
+                   for i in range(n_subjs)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        feats[:, 5] = np.where(m2 == 0, 0, m4 / m2**2) - 3
+        feats[:, 6] = np.where(m2 == 0, 0, m3 / m2**1.5)
+
+    return feats
+
+
+def _sparse_row_median(values, n_feats):
+    """Median of a row of n_feats elements whose non-zero values are in values."""
+    values  = np.sort(values)
+    n_neg   = np.searchsorted(values, 0)
+    n_zeros = n_feats - len(values)
+
+    def nth(k):
+        if k < n_neg:
+            return values[k]
+        if k < n_neg + n_zeros:
+            return 0.
+        return values[k - n_zeros]
+
+    return 0.5 * (nth((n_feats - 1) // 2) + nth(n_feats // 2))
+
+
 def calculate_hist3d(data, bins):
     """
 
@@ -1,11 +1,8 @@
 # -*- coding: utf-8 -*-
 import numpy as np
-import matplotlib.pyplot as plt
-import scipy.stats as stats
-from sklearn.ensemble import ExtraTreesClassifier
-from sklearn.cross_validation import LeaveOneOut
 
 from .pipeline import ClassificationPipeline
+from .instance import import_this
 
 
 class FeaturesGiniIndex(object):
@@ -30,7 +27,7 @@ class FeaturesGiniIndex(object):
 
         self.results_, self.metrics_ = pipe.cross_validation(samples, targets)
 
-        ginis = np.array(list(self.results_.features_importance.values()))
+        ginis = np.asarray(self.results_.features_importance)
 
         return ginis.mean(axis=0)
 
@@ -42,6 +39,9 @@ def get_gini_indices(samples, targets):
     :param targets:
     :return:
     """
+    ExtraTreesClassifier = import_this('sklearn.ensemble.ExtraTreesClassifier')
+    LeaveOneOut          = import_this('sklearn.cross_validation.LeaveOneOut')
+
     # Leave One Out
     cv = LeaveOneOut(len(targets))
     feat_imp = np.zeros(samples.shape[1])
@@ -53,7 +53,7 @@ def get_gini_indices(samples, targets):
                           targets[train], targets[test]
 
         # We correct NaN values in x_train and x_test
-        nan_mean = stats.nanmean(x_train)
+        nan_mean = np.nanmean(x_train, axis=0)
         nan_train = np.isnan(x_train)
         nan_test = np.isnan(x_test)
 
@@ -109,6 +109,8 @@ def plot_gini_indices(ginis, var_names, comparison_name,
     num_vars_to_plot: int
 
     """
+    import matplotlib.pyplot as plt
+
     if num_vars_to_plot > len(ginis):
         num_vars_to_plot = len(ginis)
 
@@ -2,14 +2,70 @@
 """
 YAML Class Instantiator
 """
+import os
 import os.path as op
 import sys
+import copy
 import yaml
 import logging
 import importlib
+import threading
 
 log = logging.getLogger(__name__)
 
+#Process-wide caches of parsed YAML files and imported objects.
+#_yaml_registry: absolute file path -> ((modification time, size), parsed content)
+#_import_registry: object path -> imported object
+_yaml_registry   = {}
+_import_registry = {}
+_registry_lock   = threading.Lock()
+
+
+def read_yaml(ymlpath):
+    """Return the parsed content of a YAML file.
+    The file is parsed only once per process, and again
+    only if its modification time or size change.
+
+    Parameters
+    ----------
+    ymlpath: str
+        Path to the YAML file
+
+    Returns
+    -------
+    The parsed content. It is shared, do not modify it.
+
+    Raises
+    ------
+    IOError
+        If file is not found
+    """
+    ymlpath = op.abspath(ymlpath)
+    if not op.exists(ymlpath):
+        raise IOError('File {} not found.'.format(ymlpath))
+
+    stat  = os.stat(ymlpath)
+    stamp = (stat.st_mtime, stat.st_size)
+    with _registry_lock:
+        cached = _yaml_registry.get(ymlpath)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+    with open(ymlpath, 'rt') as f:
+        yamldata = yaml.load(f)
+
+    with _registry_lock:
+        _yaml_registry[ymlpath] = (stamp, yamldata)
+
+    return yamldata
+
+
+def clear_registries():
+    """Empty the caches of parsed YAML files and imported objects."""
+    with _registry_lock:
+        _yaml_registry.clear()
+        _import_registry.clear()
+
 
 def import_this(object_module_path):
     """Import any class or function to the global Python environment.j
@@ -27,16 +83,26 @@ def import_this(object_module_path):
     Returns
     -------
     The specified module will be inserted into sys.modules and returned.
+    The imported object is cached for the following calls.
     """
+    obj = _import_registry.get(object_module_path)
+    if obj is not None:
+        return obj
+
     try:
         mod_path_list = object_module_path.split('.')
 
         mod = import_module('.'.join(mod_path_list[:-1]))
-        return getattr(mod, mod_path_list[-1])
+        obj = getattr(mod, mod_path_list[-1])
     except:
         log.exception('Importing object {}.'.format(object_module_path))
         raise
 
+    with _registry_lock:
+        _import_registry[object_module_path] = obj
+
+    return obj
+
 
 def import_module(module_path):
     """Import any module to the global Python environment.
@@ -142,6 +208,9 @@ class MethodInstantiator(object):
         The name of the method to be instantiated. Its definition should be in self.ymlpath.
         It is not mandatory to use it for this class to work.
         You can use this using the gettter methods as well.
+
+    The YAML file content is shared by all instantiators of the same file,
+    see read_yaml.
     """
     method_name = None
 
@@ -153,8 +222,7 @@ class MethodInstantiator(object):
         self.method_name = None
 
         try:
-            with open(self._ymlpath, 'rt') as f:
-                self.yamldata = yaml.load(f)
+            read_yaml(self._ymlpath)
 
         except IOError:
             log.exception("File {} not found.".format(ymlpath))
@@ -163,6 +231,11 @@ class MethodInstantiator(object):
             log.exception("Error reading file {}.".format(ymlpath))
             raise
 
+    @property
+    def yamldata(self):
+        """The parsed content of the YAML file"""
+        return read_yaml(self._ymlpath)
+
     def get_yaml_item(self, method_name):
         """Return the item in the YAML file corresponding to the given method_name
 
@@ -280,7 +353,7 @@ class MethodInstantiator(object):
             If the there is any error importing the class
         """
         try:
-            return self.get_yaml_item(method_name)['param_grid']
+            return copy.deepcopy(self.get_yaml_item(method_name)['param_grid'])
         except ImportError:
             log.exception("Error importing module class {}.".format(method_name))
             raise
@@ -327,6 +400,8 @@ class MethodInstantiator(object):
             if def_parms is None:
                 return None
 
+            #the YAML content is shared, the instances go in a new dict
+            def_parms = dict(def_parms)
             for parm_name in def_parms:
                 obj = get_if_any_instance(def_parms[parm_name])
                 if obj is not None:
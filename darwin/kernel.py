@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+
+#------------------------------------------------------------------------------
+#Authors:
+# Alexandre Manhaes Savio <alexsavio@gmail.com>
+# Grupo de Inteligencia Computational <www.ehu.es/ccwintco>
+# Neurita S.L.
+#
+# BSD 3-Clause License
+#
+# 2014, Alexandre Manhaes Savio
+# Use this at your own risk!
+#------------------------------------------------------------------------------
+"""
+Kernel SVMs on a Gram matrix computed once for all the cross-validation.
+
+The RBF and polynomial kernels of any pair of samples only depend on
+their dot product and squared norms. The n x n Gram matrix of the
+dataset is computed once, in chunks of features, and every fold, inner
+grid search fold and C/gamma/degree candidate takes its kernel matrix
+from it, instead of recomputing the dot products over all the features.
+
+The estimators of the cross-validation are then fitted on a column of
+sample indices instead of the samples, see sample_indices.
+"""
+import logging
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.base import BaseEstimator, ClassifierMixin
+
+from .distance import column_chunks
+from .instance import import_this
+
+log = logging.getLogger(__name__)
+
+KERNELS = ['rbf', 'poly']
+
+
+def gram_matrix(samples, center=False, chunk_size=None):
+    """Return the Gram matrix of the samples, computing it by chunks of
+    columns so only one chunk is copied at a time.
+
+    Parameters
+    ----------
+    samples: array_like or scipy.sparse matrix
+        [n_samples x n_feats]
+
+    center: bool
+        If True, the mean of each feature is removed first.
+        Not possible for sparse samples.
+
+    chunk_size: int or None
+        See distance.column_chunks.
+
+    Returns
+    -------
+    numpy array
+        [n_samples x n_samples]
+    """
+    n_samples, n_feats = samples.shape
+    if sp.issparse(samples):
+        if center:
+            raise ValueError('Cannot center sparse matrices.')
+        samples = samples.tocsr()
+        return np.asarray(samples.dot(samples.T).todense(), dtype=np.float64)
+
+    gram = np.zeros((n_samples, n_samples))
+    for cols in column_chunks(n_samples, n_feats, chunk_size=chunk_size):
+        chunk = np.asarray(samples[:, cols], dtype=np.float64)
+        if center:
+            chunk = chunk - chunk.mean(axis=0)
+        gram += np.dot(chunk, chunk.T)
+
+    return gram
+
+
+class SharedGram(object):
+    """
+    The Gram matrix of a dataset, shared by all the copies of the
+    estimators that use it: sklearn.base.clone deep-copies the
+    parameters of an estimator, and copying a SharedGram returns itself.
+
+    Parameters
+    ----------
+    samples: array_like or scipy.sparse matrix
+        [n_samples x n_feats]. It is kept to give the support vectors.
+
+    center: bool
+        Center the features before the dot products. Distances, and so
+        the RBF kernel, do not change, but they are more accurate.
+
+    chunk_size: int or None
+        See gram_matrix.
+
+    Members
+    -------
+    gram: numpy array
+        [n_samples x n_samples]
+
+    sqnorms: numpy array
+        Diagonal of gram.
+
+    n_features: int
+    """
+    def __init__(self, samples, center=False, chunk_size=None):
+        self.samples    = samples
+        self.center     = center
+        self.n_features = samples.shape[1]
+        self.gram       = gram_matrix(samples, center=center, chunk_size=chunk_size)
+        self.sqnorms    = np.diag(self.gram).copy()
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def kernel(self, rows, cols, kernel='rbf', gamma=0.0, degree=3, coef0=0.0):
+        """Return the kernel matrix between the samples in rows and cols,
+        as sklearn.svm.SVC computes it.
+
+        Parameters
+        ----------
+        rows: array_like of ints
+
+        cols: array_like of ints
+
+        kernel: str
+            'rbf': exp(-gamma |x - x'|^2)
+            'poly': (gamma <x, x'> + coef0)^degree
+
+        gamma: float or 'auto'
+            If 0 or 'auto', 1 / n_features.
+
+        degree: int
+
+        coef0: float
+
+        Returns
+        -------
+        numpy array
+            [len(rows) x len(cols)]
+        """
+        gamma = 1. / self.n_features if gamma in (0, 'auto') else gamma
+        dots  = self.gram[np.ix_(rows, cols)]
+
+        if kernel == 'rbf':
+            sqdists = self.sqnorms[rows][:, np.newaxis] + self.sqnorms[cols][np.newaxis, :] - 2 * dots
+            return np.exp(-gamma * np.maximum(sqdists, 0))
+
+        elif kernel == 'poly':
+            if self.center:
+                raise ValueError('The polynomial kernel needs a Gram matrix of the uncentered samples.')
+            #libsvm takes the degree as an int
+            return (gamma * dots + coef0) ** int(degree)
+
+        raise ValueError('Unknown kernel {}, expected one of {}.'.format(kernel, KERNELS))
+
+
+def sample_indices(n_samples):
+    """Return the [n_samples x 1] column of sample indices that replaces
+    the samples as input of PrecomputedKernelSVC."""
+    return np.arange(n_samples, dtype=np.float64)[:, np.newaxis]
+
+
+def _as_indices(X):
+    return np.asarray(X)[:, 0].astype(int)
+
+
+class PrecomputedKernelSVC(ClassifierMixin, BaseEstimator):
+    """sklearn.svm.SVC with a RBF or polynomial kernel taken from a
+    SharedGram. Its input X is a column of sample indices of the dataset
+    of the SharedGram, see sample_indices.
+
+    Parameters
+    ----------
+    gram: SharedGram
+
+    kernel: str
+        'rbf' or 'poly'
+
+    center: bool
+        If True, the support vectors are given centered on the mean of the
+        training samples, as with a StandardScaler(with_std=False) in front
+        of a sklearn.svm.SVC. The kernels do not change.
+
+    The rest are the same as sklearn.svm.SVC.
+    """
+    def __init__(self, gram=None, kernel='rbf', center=False, C=1.0, degree=3, gamma=0.0, coef0=0.0,
+                 shrinking=True, probability=False, tol=1e-3, cache_size=200,
+                 class_weight=None, verbose=False, max_iter=-1, random_state=None):
+        self.gram         = gram
+        self.kernel       = kernel
+        self.center       = center
+        self.C            = C
+        self.degree       = degree
+        self.gamma        = gamma
+        self.coef0        = coef0
+        self.shrinking    = shrinking
+        self.probability  = probability
+        self.tol          = tol
+        self.cache_size   = cache_size
+        self.class_weight = class_weight
+        self.verbose      = verbose
+        self.max_iter     = max_iter
+        self.random_state = random_state
+
+    @classmethod
+    def from_svc(cls, svc, gram, center=False):
+        """Return a PrecomputedKernelSVC with the parameters of the
+        sklearn.svm.SVC svc and the kernel from gram."""
+        params = svc.get_params()
+        kwargs = dict((name, params[name]) for name in cls._get_param_names()
+                      if name not in ('gram', 'center') and name in params)
+        return cls(gram=gram, center=center, **kwargs)
+
+    def _kernel(self, rows, cols):
+        return self.gram.kernel(rows, cols, self.kernel, self.gamma, self.degree, self.coef0)
+
+    def fit(self, X, y):
+        SVC = import_this('sklearn.svm.SVC')
+
+        self.train_idx_ = _as_indices(X)
+        self.svc_ = SVC(kernel='precomputed', C=self.C, shrinking=self.shrinking,
+                        probability=self.probability, tol=self.tol, cache_size=self.cache_size,
+                        class_weight=self.class_weight, verbose=self.verbose,
+                        max_iter=self.max_iter, random_state=self.random_state)
+        self.svc_.fit(self._kernel(self.train_idx_, self.train_idx_), y)
+        self.classes_ = self.svc_.classes_
+        return self
+
+    @property
+    def support_vectors_(self):
+        """The rows of the dataset that are support vectors, as sklearn.svm.SVC gives them."""
+        support_vectors = self.gram.samples[self.train_idx_[self.svc_.support_]]
+        if self.center:
+            support_vectors = support_vectors - self.gram.samples[self.train_idx_].mean(axis=0)
+        return support_vectors
+
+    def predict(self, X):
+        return self.svc_.predict(self._kernel(_as_indices(X), self.train_idx_))
+
+    def predict_proba(self, X):
+        return self.svc_.predict_proba(self._kernel(_as_indices(X), self.train_idx_))
+
+    def decision_function(self, X):
+        return self.svc_.decision_function(self._kernel(_as_indices(X), self.train_idx_))
+
+
+def is_precomputed_kernel_compatible(estimator, scaler, samples, fsmethods=None, param_grid=None):
+    """Return True if the cross-validation of estimator can take its
+    kernels from a SharedGram with the same results.
+
+    It needs a sklearn.svm.SVC with a RBF or polynomial kernel (LinearSVC
+    is liblinear, which has no precomputed kernel) whose gamma does not
+    depend on the variance of the data, no feature selection, no NaNs in
+    samples, and no feature scaling: the Gram matrix is the one of the
+    unscaled samples. The RBF kernel also allows centering.
+
+    Parameters
+    ----------
+    estimator: sklearn estimator
+
+    scaler: sklearn scaler object or None
+
+    samples: array_like or scipy.sparse matrix
+
+    fsmethods: list or None
+
+    param_grid: dict or None
+        The grid search parameters of estimator.
+
+    Returns
+    -------
+    bool
+    """
+    SVC = import_this('sklearn.svm.SVC')
+
+    if type(estimator) is not SVC or estimator.kernel not in KERNELS or fsmethods:
+        return False
+
+    if estimator.gamma == 'scale' and 'gamma' not in (param_grid or {}):
+        return False
+
+    if scaler is not None:
+        centers_only = not getattr(scaler, 'with_std', True) and hasattr(scaler, 'with_mean')
+        if estimator.kernel != 'rbf' or not centers_only:
+            return False
+
+    data = samples.data if sp.issparse(samples) else samples
+    return bool(np.isfinite(np.sum(data)))
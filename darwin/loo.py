@@ -0,0 +1,394 @@
+# -*- coding: utf-8 -*-
+
+#------------------------------------------------------------------------------
+#Authors:
+# Alexandre Manhaes Savio <alexsavio@gmail.com>
+# Grupo de Inteligencia Computational <www.ehu.es/ccwintco>
+# Neurita S.L.
+#
+# BSD 3-Clause License
+#
+# 2014, Alexandre Manhaes Savio
+# Use this at your own risk!
+#------------------------------------------------------------------------------
+"""
+Exact leave-one-out cross-validation of ridge classifiers.
+
+A ridge classifier with intercept trained on any subset T of the samples
+only depends on the Gram matrix of the samples centered on T, which can
+be taken from the Gram matrix of the whole dataset. So the n-1 fits of
+a leave-one-out, including the inner grid search of each fold, are
+solved in the n x n sample space after one pass over the features.
+
+If there is only one parameter candidate, the leave-one-out predictions
+come from the hat matrix of one fit on all the samples:
+    f_{-i}(x_i) = (f(x_i) - H_ii y_i) / (1 - H_ii)
+
+The coefficients of each fold are taken from the dual solution of one fit
+on all the samples, without the sample left out, see ridge_loo_coefs.
+"""
+import time
+import logging
+
+import numpy as np
+import scipy.sparse as sp
+
+from .distance import column_chunks
+from .search import SearchStats
+from .instance import import_this
+from .sklearn_utils import get_cv_method
+
+log = logging.getLogger(__name__)
+
+#number of folds of the inner grid search, as in sklearn.grid_search.GridSearchCV
+INNER_CV_FOLDS = 3
+
+
+def is_ridge_loo_compatible(estimator, param_grid, scaler, samples, targets, gs_scoring):
+    """Return True if the leave-one-out of estimator can be done with
+    ridge_loo_folds giving the same results as the generic loop.
+
+    It needs a RidgeClassifier with intercept and without class weights,
+    a parameter grid only over alpha, accuracy as grid search scoring,
+    no feature scaling (centering is fine), dense samples without NaNs
+    and at least two samples of each class.
+
+    Parameters
+    ----------
+    estimator: sklearn estimator
+
+    param_grid: dict or None
+
+    scaler: sklearn scaler object or None
+
+    samples: array_like
+
+    targets: vector
+
+    gs_scoring: str
+
+    Returns
+    -------
+    bool
+    """
+    RidgeClassifier = import_this('sklearn.linear_model.RidgeClassifier')
+
+    if type(estimator) is not RidgeClassifier:
+        return False
+
+    params = estimator.get_params()
+    if not params.get('fit_intercept', True) or params.get('normalize', False) \
+            or params.get('class_weight') is not None:
+        return False
+
+    if param_grid and set(param_grid.keys()) != set(['alpha']):
+        return False
+
+    if gs_scoring != 'accuracy':
+        return False
+
+    #centering does not change a ridge with intercept, scaling does
+    if scaler is not None and getattr(scaler, 'with_std', True):
+        return False
+
+    if sp.issparse(samples) or not np.isfinite(np.sum(samples)):
+        return False
+
+    _, counts = np.unique(targets, return_counts=True)
+    return counts.min() >= 2
+
+
+def centered_gram(samples, chunk_size=None):
+    """Return the Gram matrix of the samples after removing the mean of
+    each feature, computing it by chunks of columns.
+
+    Parameters
+    ----------
+    samples: array_like
+        [n_samples x n_feats]
+
+    chunk_size: int or None
+        See distance.column_chunks.
+
+    Returns
+    -------
+    numpy array
+        [n_samples x n_samples]
+    """
+    n_samples, n_feats = samples.shape
+    gram = np.zeros((n_samples, n_samples))
+    for cols in column_chunks(n_samples, n_feats, chunk_size=chunk_size):
+        chunk = np.asarray(samples[:, cols], dtype=float)
+        chunk = chunk - chunk.mean(axis=0)
+        gram += np.dot(chunk, chunk.T)
+
+    return gram
+
+
+def encode_ridge_targets(targets, classes):
+    """Encode targets as sklearn.linear_model.RidgeClassifier does:
+    +1 for the class and -1 for the rest, with one column for two classes.
+
+    Parameters
+    ----------
+    targets: vector
+
+    classes: vector
+        Sorted class labels
+
+    Returns
+    -------
+    numpy array
+        [n_samples x n_columns]
+    """
+    codes = 2. * (np.asarray(targets)[:, np.newaxis] == classes[np.newaxis, :]) - 1.
+    if len(classes) == 2:
+        return codes[:, 1:]
+    return codes
+
+
+def decode_ridge_scores(scores, classes):
+    """Return the predicted labels from the decision values of a ridge classifier.
+
+    Parameters
+    ----------
+    scores: numpy array
+        [n_samples x n_columns]
+
+    classes: vector
+
+    Returns
+    -------
+    numpy array
+    """
+    if scores.shape[1] == 1:
+        return classes[(scores[:, 0] > 0).astype(int)]
+    return classes[scores.argmax(axis=1)]
+
+
+def ridge_dual_scores(gram, targets, train, test, alphas):
+    """Decision values on test of the ridge classifiers with intercept
+    trained on train for each alpha, from the Gram matrix of the samples.
+
+    Parameters
+    ----------
+    gram: numpy array
+        [n_samples x n_samples] Gram matrix.
+
+    targets: vector
+
+    train: array_like
+        Indices of the training samples
+
+    test: array_like
+        Indices of the test samples
+
+    alphas: list of float
+
+    Returns
+    -------
+    classes, list of [n_test x n_columns] numpy arrays, one per alpha
+    """
+    classes = np.unique(targets[train])
+    y_train = encode_ridge_targets(targets[train], classes)
+    y_mean  = y_train.mean(axis=0)
+
+    #center the samples on the training means
+    g_tt   = gram[np.ix_(train, train)]
+    g_st   = gram[np.ix_(test, train)]
+    row_tt = g_tt.mean(axis=1)
+    mean_t = row_tt.mean()
+    k_tt   = g_tt - row_tt[:, np.newaxis] - row_tt[np.newaxis, :] + mean_t
+    k_st   = g_st - g_st.mean(axis=1)[:, np.newaxis] - row_tt[np.newaxis, :] + mean_t
+
+    eigvals, eigvecs = np.linalg.eigh(k_tt)
+    uty = np.dot(eigvecs.T, y_train - y_mean)
+    kstu = np.dot(k_st, eigvecs)
+
+    scores = [np.dot(kstu, uty / (eigvals + alpha)[:, np.newaxis]) + y_mean for alpha in alphas]
+    return classes, scores
+
+
+def ridge_loo_coefs(samples, gram, targets, left_out, alphas, chunk_size=None):
+    """Coefficients of the ridge classifiers with intercept trained
+    without each of the samples in left_out, as the coef_ of
+    sklearn.linear_model.RidgeClassifier.
+
+    The dual coefficients d and intercept b of a ridge with intercept solve
+        [[K + alpha I, 1], [1', 0]] [d; b] = [y; 0]
+    and removing sample i from this system changes them by
+        -C[:, i] d_i / C_ii,    C = inverse of the system matrix,
+    so one inverse per alpha gives all the leave-one-out duals. The
+    coefficients X' d are computed by chunks of columns, as centered_gram.
+
+    Parameters
+    ----------
+    samples: array_like
+        [n_samples x n_feats]
+
+    gram: numpy array
+        centered_gram(samples)
+
+    targets: vector
+        Every class must have at least two samples.
+
+    left_out: array_like
+        Index of the sample left out of each fold.
+
+    alphas: array_like
+        alpha of each fold.
+
+    chunk_size: int or None
+        See distance.column_chunks.
+
+    Returns
+    -------
+    numpy array
+        [n_folds x n_columns x n_feats]
+    """
+    n_samples, n_feats = samples.shape
+    classes  = np.unique(targets)
+    y        = encode_ridge_targets(targets, classes)
+    left_out = np.asarray(left_out)
+    alphas   = np.asarray(alphas, dtype=float)
+
+    coefs = np.zeros((len(left_out), y.shape[1], n_feats))
+    for alpha in np.unique(alphas):
+        folds  = np.flatnonzero(alphas == alpha)
+        out    = left_out[folds]
+
+        system = np.zeros((n_samples + 1, n_samples + 1))
+        system[:n_samples, :n_samples] = gram + alpha * np.eye(n_samples)
+        system[:n_samples, n_samples]  = system[n_samples, :n_samples] = 1.
+        inverse = np.linalg.inv(system)[:n_samples, :n_samples]
+
+        dual     = np.dot(inverse, y)
+        downdate = inverse[:, out] / inverse[out, out]
+
+        #the duals of a fold sum 0, so the samples can be centered on all of them
+        for cols in column_chunks(n_samples, n_feats, chunk_size=chunk_size):
+            chunk = np.asarray(samples[:, cols], dtype=float)
+            chunk = chunk - chunk.mean(axis=0)
+            full  = np.dot(dual.T, chunk)
+            proj  = np.dot(downdate.T, chunk)
+            coefs[folds, :, cols] = full[np.newaxis] - dual[out][:, :, np.newaxis] * proj[:, np.newaxis, :]
+
+    return coefs
+
+
+def ridge_hat_loo_scores(gram, targets, alpha):
+    """Leave-one-out decision values of a ridge classifier with intercept
+    from the diagonal of its hat matrix on all the samples.
+
+    Parameters
+    ----------
+    gram: numpy array
+        [n_samples x n_samples] centered Gram matrix.
+
+    targets: vector
+        Every class must have at least two samples.
+
+    alpha: float
+
+    Returns
+    -------
+    classes, [n_samples x n_columns] numpy array
+    """
+    n_samples = len(targets)
+    classes   = np.unique(targets)
+    y         = encode_ridge_targets(targets, classes)
+    y_mean    = y.mean(axis=0)
+
+    eigvals, eigvecs = np.linalg.eigh(gram)
+    shrink = eigvals / (eigvals + alpha)
+
+    fitted = y_mean + np.dot(eigvecs, shrink[:, np.newaxis] * np.dot(eigvecs.T, y - y_mean))
+    hat    = 1. / n_samples + np.dot(np.square(eigvecs), shrink)
+
+    return classes, (fitted - hat[:, np.newaxis] * y) / (1. - hat[:, np.newaxis])
+
+
+def ridge_loo_folds(samples, targets, cv_folds, param_grid=None, estimator=None, gram=None, importance=True):
+    """Leave-one-out cross-validation of a ridge classifier with the
+    grid search over alpha of each fold, with the same results as
+    ClassificationPipeline.cross_validation without scaling.
+    See is_ridge_loo_compatible.
+
+    Parameters
+    ----------
+    samples: array_like
+
+    targets: vector
+
+    cv_folds: list of (train, test) indices
+        The leave-one-out folds.
+
+    param_grid: dict or None
+        {'alpha': [...]}, if None will use the alpha of estimator.
+
+    estimator: sklearn.linear_model.RidgeClassifier or None
+        If None, alpha must be in param_grid.
+
+    gram: numpy array or None
+        centered_gram(samples), if already computed.
+
+    importance: bool
+        If True, the importance of each fold is the coef_ of its
+        classifier, see ridge_loo_coefs. Otherwise it is None.
+
+    Returns
+    -------
+    list of (preds, probs, y_test, best_params, importance, search_stats), one per fold
+        The search_stats count the fits of the generic grid search,
+        here solved in the sample space.
+    """
+    start   = time.time()
+    targets = np.asarray(targets)
+    alphas  = list(param_grid['alpha']) if param_grid else [estimator.alpha]
+    gram    = centered_gram(samples) if gram is None else gram
+
+    n_fits  = len(alphas) * INNER_CV_FOLDS + 1
+    #each fold trains on n - 1 samples
+    n_fit_samples = (len(alphas) * (INNER_CV_FOLDS - 1) + 1) * (len(targets) - 1)
+
+    if len(alphas) == 1:
+        classes, loo_scores = ridge_hat_loo_scores(gram, targets, alphas[0])
+        scores = dict((test[0], loo_scores[test]) for _, test in cv_folds)
+    else:
+        scores = {}
+
+    folds = []
+    for fold_count, (train, test) in enumerate(cv_folds):
+        best_alpha = alphas[0]
+        if len(alphas) > 1:
+            #inner grid search, accuracy weighted by the inner test sizes
+            #and computed in the same order as GridSearchCV, so ties break the same way
+            acc_sum = np.zeros(len(alphas))
+            n_tests = 0
+            for inner_train, inner_test in get_cv_method(targets[train], INNER_CV_FOLDS, True):
+                classes, inner_scores = ridge_dual_scores(gram, targets, train[inner_train],
+                                                          train[inner_test], alphas)
+                inner_y = targets[train[inner_test]]
+                for idx, alpha_scores in enumerate(inner_scores):
+                    acc_sum[idx] += np.mean(decode_ridge_scores(alpha_scores, classes) == inner_y) * len(inner_test)
+                n_tests += len(inner_test)
+
+            best_alpha = alphas[int(np.argmax(acc_sum / float(n_tests)))]
+            classes, fold_scores = ridge_dual_scores(gram, targets, train, test, [best_alpha])
+            scores[test[0]] = fold_scores[0]
+
+        preds = decode_ridge_scores(scores[test[0]], classes)
+        folds.append([preds, None, targets[test], {'alpha': best_alpha}, None])
+
+    if importance:
+        coefs = ridge_loo_coefs(samples, gram, targets, [test[0] for _, test in cv_folds],
+                                [fold[3]['alpha'] for fold in folds])
+        for fold, coef in zip(folds, coefs):
+            fold[4] = coef
+
+    fold_time = (time.time() - start) / max(1, len(folds))
+    for fold in folds:
+        fold.append(SearchStats(fold_time, n_fits, len(alphas), n_fit_samples))
+
+    log.debug('Ridge leave-one-out of {} samples in {:.2f} s.'.format(len(targets), fold_time * len(folds)))
+    return [tuple(fold) for fold in folds]
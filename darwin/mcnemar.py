@@ -1,5 +1,6 @@
 
 import logging
+import collections
 import numpy as np
 from math import sqrt
 from scipy import stats
@@ -131,26 +132,176 @@ def get_mcnemar_abcd(y_vals, c1_preds, c2_preds):
     """
     assert(len(y_vals) == len(c1_preds) == len(c2_preds))
 
-    a, b, c, d = 0, 0, 0, 0
-
-    for idx in range(len(y_vals)):
-        y = y_vals[idx]
-        c1 = c1_preds[idx]
-        c2 = c2_preds[idx]
-        if c1 == c2:
-            if c1 == y:
-                a += 1
-            else:
-                d += 1
-        else:
-            if c1 == y:
-                b += 1
-            else:
-                c += 1
+    y_vals, c1_preds, c2_preds = np.asarray(y_vals), np.asarray(c1_preds), np.asarray(c2_preds)
+
+    same = c1_preds == c2_preds
+    hit  = c1_preds == y_vals
+
+    a = int(np.count_nonzero(same & hit))
+    d = int(np.count_nonzero(same)) - a
+    b = int(np.count_nonzero(hit)) - a
+    c = len(y_vals) - a - b - d
 
     return a, b, c, d
 
 
+def get_mcnemar_tables(y_vals, preds, chunk_size=100000):
+    """Returns the McNemar's confusion matrix values A, B, C, D of every pair
+    of classifiers at once.
+
+    A is the number of samples both classifiers get right, B the number
+    the first one gets right and the second wrong, C the number the first
+    one gets wrong and the second one predicts differently, D the number
+    both classifiers get wrong with the same prediction.
+    All of them are matrix products of the hit/miss indicators of each
+    classifier, calculated by chunks of samples.
+
+    Parameters
+    ----------
+    y_vals : np.ndarray or list
+        Classification target values. Size: n_samples
+
+    preds : np.ndarray
+        Predictions of each classifier. Shape: n_classifiers x n_samples
+
+    chunk_size: int
+        Number of samples processed at once.
+
+    Returns
+    -------
+    tables: np.ndarray of ints
+        Shape: n_classifiers x n_classifiers x 4, where tables[i, j] are the
+        a, b, c, d values of classifier i versus classifier j.
+    """
+    y_vals = np.asarray(y_vals).ravel()
+    preds  = np.atleast_2d(preds)
+    n_clfs, n_samples = preds.shape
+    assert(n_samples == len(y_vals))
+
+    labels = np.unique(preds)
+
+    hits = np.zeros((n_clfs, n_clfs))
+    both = np.zeros((n_clfs, n_clfs))
+    same = np.zeros((n_clfs, n_clfs))
+    for start in range(0, n_samples, chunk_size):
+        y = y_vals[start:start + chunk_size]
+        p = preds [:, start:start + chunk_size]
+
+        hit   = (p == y).astype(np.float64)
+        hits += hit.sum(axis=1)[:, np.newaxis]
+        both += np.dot(hit, hit.T)
+
+        #pairs of classifiers that agree on the same wrong label
+        for label in labels:
+            miss = ((p == label) & (y != label)).astype(np.float64)
+            same += np.dot(miss, miss.T)
+
+    tables = np.empty((n_clfs, n_clfs, 4), dtype=np.int64)
+    tables[:, :, 0] = np.round(both)
+    tables[:, :, 1] = np.round(hits - both)
+    tables[:, :, 3] = np.round(same)
+    tables[:, :, 2] = n_samples - tables[:, :, 0] - tables[:, :, 1] - tables[:, :, 3]
+
+    return tables
+
+
+def mcnemar_pvalues(tables, onetailed=False):
+    """Returns the z statistics and p-values of McNemar's test on an array
+    of a, b, c, d values, z = (b - c) / sqrt(b + c).
+
+    The one-tailed test has as alternative hypothesis that the first
+    classifier is better than the second one, its p-value is 1 if b <= c.
+    Tables with b + c == 0 have z = 0 and p-value 1.
+
+    Parameters
+    ----------
+    tables: np.ndarray
+        Array of any shape whose last axis holds the a, b, c, d values.
+        See get_mcnemar_tables.
+
+    onetailed: bool
+        False for two-tailed test
+        True for one-tailed test
+
+    Returns
+    -------
+    z, pvalues: np.ndarray
+        Shape: tables.shape[:-1]
+    """
+    tables = np.asarray(tables)
+    b, c   = tables[..., 1].astype(np.float64), tables[..., 2].astype(np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (b - c) / np.sqrt(b + c)
+    z[(b + c) == 0] = 0
+
+    if onetailed:
+        pvalues = stats.norm.sf(z)
+        pvalues[(b - c) <= 0] = 1.
+    else:
+        pvalues = 2 * stats.norm.sf(np.abs(z))
+
+    pvalues[(b + c) == 0] = 1.
+
+    return z, pvalues
+
+
+def mcnemar_decisions(tables, alpha=0.05, onetailed=False):
+    """Performs the same test as mcnemar on an array of a, b, c, d values.
+
+    Parameters
+    ----------
+    tables: np.ndarray
+        Array of any shape whose last axis holds the a, b, c, d values.
+        See get_mcnemar_tables.
+
+    alpha: float
+        Level of significance
+
+    onetailed: bool
+        False for two-tailed test
+        True for one-tailed test
+
+    Returns
+    -------
+    np.ndarray of bool
+        Shape: tables.shape[:-1]
+        True where the Null hypotheses pi1 == pi2 is accepted.
+    """
+    return mcnemar_pvalues(tables, onetailed)[1] > alpha
+
+
+def mcnemar_test_matrix(y_vals, preds, alpha=0.1, onetailed=True):
+    """Returns McNemar's tables and tests of every pair of classifiers.
+
+    Parameters
+    ----------
+    y_vals : np.ndarray or list
+        Classification target values. Size: n_samples
+
+    preds : np.ndarray
+        Predictions of each classifier. Shape: n_classifiers x n_samples
+
+    alpha : float
+        Level of significance
+
+    onetailed: bool
+        False for two-tailed test
+        True for one-tailed test
+
+    Returns
+    -------
+    tables: np.ndarray of ints
+        Shape: n_classifiers x n_classifiers x 4. See get_mcnemar_tables.
+
+    accepted: np.ndarray of bool
+        Shape: n_classifiers x n_classifiers
+        accepted[i, j] is mcnemar_test(y_vals, preds[i], preds[j], alpha, onetailed)
+    """
+    tables = get_mcnemar_tables(y_vals, preds)
+    return tables, mcnemar_decisions(tables, alpha=alpha, onetailed=onetailed)
+
+
 def mcnemar(a, b, c, d, alpha=0.05, onetailed=False, verbose=False):
     """Performs a mcnemar test.
 
@@ -245,6 +396,100 @@ def mcnemar_test(y_vals, c1_preds, c2_preds, alpha=0.1, onetailed=True):
                    verbose=False)
 
 
+class McNemarComparison(collections.namedtuple('McNemar_Comparison',
+                                                ['tables', 'statistic', 'pvalue', 'reject'])):
+    """
+    Namedtuple to store McNemar's tests of every pair of k classifiers.
+
+    tables: k x k x 4 ints, the a, b, c, d values. See get_mcnemar_tables.
+    statistic: k x k floats, the Z statistic of classifier i versus j.
+    pvalue: k x k floats, (corrected) p-values.
+    reject: k x k bools, True where the Null hypotheses pi1 == pi2 is rejected.
+    """
+    pass
+
+
+def adjust_pvalues(pvalues, method='holm'):
+    """Correct a set of p-values for multiple comparisons.
+
+    Parameters
+    ----------
+    pvalues: np.ndarray
+        Flat array of p-values
+
+    method: str or None
+        Choices: {'bonferroni', 'holm', None}
+
+    Returns
+    -------
+    np.ndarray
+        Adjusted p-values, in the same order as pvalues.
+    """
+    pvalues = np.asarray(pvalues, dtype=np.float64)
+    n_tests = len(pvalues)
+
+    if method is None or n_tests == 0:
+        return pvalues.copy()
+
+    if method == 'bonferroni':
+        return np.minimum(pvalues * n_tests, 1.)
+
+    if method == 'holm':
+        order    = np.argsort(pvalues)
+        adjusted = np.empty(n_tests)
+        adjusted[order] = np.minimum(np.maximum.accumulate(pvalues[order] * np.arange(n_tests, 0, -1)), 1.)
+        return adjusted
+
+    raise ValueError('Unknown multiple comparison correction {}.'.format(method))
+
+
+def mcnemar_pairwise(y_vals, preds, alpha=0.05, onetailed=False, correction=None):
+    """Performs McNemar's test between every pair of classifiers at once.
+
+    Without correction, reject is the negation of mcnemar_test for each
+    pair. The one-tailed test of classifier i versus j has as alternative
+    hypothesis that i is better than j.
+
+    Parameters
+    ----------
+    y_vals : np.ndarray or list
+        Classification target values. Size: n_samples
+
+    preds : np.ndarray
+        Predictions of each classifier. Shape: n_classifiers x n_samples
+
+    alpha: float
+        Level of significance
+
+    onetailed: bool
+        False for two-tailed test
+        True for one-tailed test
+
+    correction: str or None
+        Multiple comparison correction over all the tested pairs.
+        Choices: {'bonferroni', 'holm', None}
+
+    Returns
+    -------
+    McNemarComparison
+    """
+    tables = get_mcnemar_tables(y_vals, preds)
+    n_clfs = tables.shape[0]
+
+    z, pvalue = mcnemar_pvalues(tables, onetailed)
+
+    if onetailed:
+        tested = ~np.eye(n_clfs, dtype=bool)
+    else:
+        tested = np.triu(np.ones((n_clfs, n_clfs), dtype=bool), 1)
+
+    pvalue[tested] = adjust_pvalues(pvalue[tested], correction)
+    if not onetailed:
+        pvalue.T[tested] = pvalue[tested]
+
+    return McNemarComparison(tables, z, pvalue, pvalue <= alpha)
+
+
 #prep_mcnemar_borja
 def entrenar_clasificador():
     from sklearn import tree
@@ -15,26 +15,50 @@
 #------------------------------------------------------------------------------
 
 
+import time
 import logging
+import collections
 
 import numpy                    as np
-from   scipy                    import stats
+import scipy.sparse             as sp
 from   collections              import OrderedDict
-from   sklearn.grid_search      import GridSearchCV
+from   joblib                   import Parallel, delayed
+from   sklearn.base             import clone
 from   sklearn.preprocessing    import StandardScaler
-from   sklearn.cross_validation import LeaveOneOut
 
 from   .utils.strings           import append_to_keys
 from   .utils.printable         import Printable
-from   .sklearn_utils           import (get_pipeline, get_cv_method)
-from   .instance                import (LearnerInstantiator, SelectorInstantiator)
-from   .results                 import (ClassificationResult, ClassificationMetrics,
+from   .utils.parallel          import plan_core_allocation, limit_blas_threads
+from   .sklearn_utils           import (get_pipeline, get_cv_method, get_repeated_cv_methods,
+                                        is_leave_one_out, get_ranked_param_grid, fit_accepts)
+from   .instance                import (LearnerInstantiator, SelectorInstantiator, import_this)
+from   .search                  import (get_search_method, get_search_stats, count_candidates)
+from   .loo                     import (is_ridge_loo_compatible, ridge_loo_folds, centered_gram)
+from   .kernel                  import (SharedGram, PrecomputedKernelSVC, is_precomputed_kernel_compatible,
+                                        sample_indices)
+from   .preprocessing           import (FoldStatistics, FoldBuffers, prepare_fold,
+                                        is_standard_scaler, standard_scale_, ImputationStats,
+                                        check_float_dtype)
+from   .results                 import (ClassificationResult, ClassificationMetrics, RepeatedCVResult,
+                                        PermutationTestResult,
                                         classification_metrics, get_cv_classification_metrics,
-                                        enlist_cv_results_from_dict)
+                                        enlist_cv_results_from_dict, to_fold_arrays, repeated_cv_metrics,
+                                        permutation_p_value, is_p_value_decided)
 
 log = logging.getLogger(__name__)
 
 
+class FoldSetup(collections.namedtuple('Fold_Setup', ['samples', 'scaler', 'grid_search', 'col_stats',
+                                                      'buffers', 'gram', 'use_fast_loo', 'use_kernel'])):
+    """
+    Namedtuple to store what the folds of a cross-validation share and
+    does not depend on the labels, see ClassificationPipeline._setup_folds.
+    samples are the sample indices if use_kernel, gram is the SharedGram
+    or the centered Gram matrix of the ridge leave-one-out.
+    """
+    pass
+
+
 #Classification Pipeline
 class ClassificationPipeline(Printable):
     """This class wraps a classification pipeline with grid search.
@@ -61,6 +85,9 @@ class ClassificationPipeline(Printable):
         parameters.
 
     scaler: sklearn scaler object
+        A StandardScaler is not refitted in each fold: the per-feature sums
+        of the whole dataset are computed once and the statistics of each
+        training set are derived from them, see preprocessing.FoldStatistics.
 
     cvmethod  : string or int
         String with a number or number for K, for a K-fold method.
@@ -70,17 +97,95 @@ class ClassificationPipeline(Printable):
         Indicates whether to use a Stratified K-fold approach (in case it is a K-fold what you choose for cvmethod)
 
     n_cpus: int
-        Number of CPUS to be used in the Grid Search
+        Total number of CPUs to be used. They are shared between the
+        cross-validation folds, the grid search candidates of each fold and
+        the BLAS threads of each grid search job, see the core_plan member
+        after calling cross_validation.
+        -1 means using all the CPUs.
 
     gs_scoring: str
         Grid search scoring objective function.
+
+    n_fold_jobs: int or None
+        Number of cross-validation folds to be processed at the same time.
+        Each fold works on its own clone of the grid search and the scaler.
+        It is capped to n_cpus.
+        If None, it will be chosen from the n_cpus budget.
+
+    fold_backend: str
+        joblib backend used to run the folds in parallel.
+        Choices: {'multiprocessing', 'threading'}
+        joblib runs the grid search of a fold in a worker process without
+        jobs of its own, so with 'multiprocessing' the CPUs that the
+        parallel folds leave go to BLAS.
+
+    warm_start: bool
+        If True, the folds are processed one after the other and each one
+        starts from what the previous one learned: the grid search
+        candidates are ordered by their score in the previous fold and,
+        if the classifier fit accepts coef_init (e.g., SGDClassifier,
+        Perceptron), it is initialized with the coefficients of the previous
+        best estimator. The CPUs go to the grid search and BLAS.
+        If warm_start_n_best is None and the classifier does not accept
+        coef_init, nothing is carried to the next fold and the folds are
+        run as without warm start.
+
+    warm_start_n_best: int or None
+        Only used if warm_start is True.
+        Number of the best candidates of the previous fold that are
+        searched in the next one. If None, all candidates are searched.
+
+    search_method: str
+        Hyper-parameter search strategy of each fold.
+        Choices: {'grid', 'randomized', 'halving'}, see search.get_search_method.
+        The time and number of fits of each fold are in the fold_stats
+        member after calling cross_validation.
+        The number of NaNs replaced by the training means is in the
+        imputation_stats of the results, see preprocessing.ImputationStats,
+        and in the imputation_stats member for the last call.
+
+    search_n_iter: int
+        Budget of candidates for the 'randomized' search.
+
+    search_factor: int
+        Reduction factor for the 'halving' search.
+
+    random_state: int or None
+        Seed for the 'randomized' and 'halving' searches.
+
+    fast_loo: bool
+        If True, the leave-one-out cross-validations of a RidgeClassifier
+        with the 'grid' search and without scaling (scaler=None or
+        StandardScaler(with_std=False)) are solved in closed form,
+        see loo.ridge_loo_folds. The results are the same as with False,
+        the coef_ of each fold included in features_importance.
+
+    dtype: numpy float dtype
+        Type of the data of each fold, from the imputation to the fit.
+        np.float32 halves the memory and bandwidth of the fold copies,
+        the imputation and scaling statistics are still float64.
+        Learners backed by libsvm or liblinear convert their input to
+        float64 internally anyway.
+
+    precompute_kernel: bool
+        If True, the cross-validations of the RBF and polynomial SVCs
+        (RBFSVC, PolySVC) without feature selection and without scaling
+        (scaler=None, or StandardScaler(with_std=False) for RBF) compute
+        the Gram matrix of the dataset once, and all the folds and grid
+        search candidates take their kernels from it, see kernel.SharedGram.
+        It is kept in the shared_gram member after calling cross_validation.
+        The results are the same as with False.
     """
 
     learner_instantiator  = LearnerInstantiator()
     selector_instantiator = SelectorInstantiator()
 
     def __init__(self, clfmethod, scaler=StandardScaler(), cvmethod='10',
-                 stratified=True, n_cpus=1, gs_scoring='accuracy'):
+                 stratified=True, n_cpus=1, gs_scoring='accuracy',
+                 n_fold_jobs=None, fold_backend='multiprocessing',
+                 warm_start=False, warm_start_n_best=None,
+                 search_method='grid', search_n_iter=10, search_factor=3, random_state=None,
+                 fast_loo=True, dtype=np.float64, precompute_kernel=False):
 
         self.clfmethod  = clfmethod
         self.fsmethods  = []
@@ -98,6 +203,21 @@ class ClassificationPipeline(Printable):
         self.n_cpus     = n_cpus
         self.gs_scoring = gs_scoring
 
+        self.n_fold_jobs  = n_fold_jobs
+        self.fold_backend = fold_backend
+
+        self.warm_start        = warm_start
+        self.warm_start_n_best = warm_start_n_best
+
+        self.search_method = search_method
+        self.search_n_iter = search_n_iter
+        self.search_factor = search_factor
+        self.random_state  = random_state
+        self.fast_loo      = fast_loo
+        self.dtype         = dtype
+
+        self.precompute_kernel = precompute_kernel
+
         self.reset()
 
     def _append_clsname_to_keys(self, adict, cls):
@@ -128,6 +248,15 @@ class ClassificationPipeline(Printable):
         self._gs        = None
         self._results   = None
         self._metrics   = None
+        self.core_plan  = None
+        self.fold_stats = None
+        self.imputation_stats = None
+        self.shared_gram      = None
+
+        if self.warm_start and self.search_method == 'randomized':
+            raise ValueError('warm_start can not be used with the randomized search.')
+
+        check_float_dtype(self.dtype)
 
         try:
             fsmethods = []
@@ -145,7 +274,10 @@ class ClassificationPipeline(Printable):
                 self._paramgrid = clfm_params
 
             #creating grid search
-            self._gs = GridSearchCV(self._pipe, self._paramgrid, n_jobs=self.n_cpus, verbose=0, scoring=self.gs_scoring)
+            self._gs = get_search_method(self._pipe, self._paramgrid, self.search_method,
+                                         n_jobs=self.n_cpus, scoring=self.gs_scoring,
+                                         n_iter=self.search_n_iter, factor=self.search_factor,
+                                         random_state=self.random_state)
         except Exception as exc:
             log.exception('Error instantiating grid search. {}'.format(str(exc)))
             raise
@@ -155,7 +287,9 @@ class ClassificationPipeline(Printable):
 
         Parameters
         ----------
-        samples: array_like
+        samples: array_like or scipy.sparse matrix
+            Sparse samples are processed as CSR matrices without densifying
+            them, the scaler must not center them (with_mean=False).
 
         targets: vector or list
             Class labels set in the same order as in samples
@@ -166,82 +300,385 @@ class ClassificationPipeline(Printable):
         -------
         Classification_Results, Classification Metrics
         """
+        samples = self._check_samples(samples)
+
         if cvmethod is None:
             self._cv = get_cv_method(targets, self.cvmethod, self.stratified)
         else:
             self._cv = cvmethod
 
-        self.n_feats = samples.shape[1]
+        folds = self._cross_validate_folds(samples, targets, list(self._cv), is_leave_one_out(self._cv))
 
-        #We use dictionaries to save each fold classification result
-        #because we will need to identify all sets of results to one fold.
-        #If we used lists, we would loose track of folds if something went
-        #wrong.
-        preds      = OrderedDict()
-        probs      = OrderedDict()
-        truth      = OrderedDict()
-        best_pars  = OrderedDict()
-        importance = OrderedDict()
+        self._results = self._fold_results(folds, targets, self._cv, self.imputation_stats.nan_counts)
 
-        fold_count = 0
-        for train, test in self._cv:
-            log.debug('Processing fold ' + str(fold_count))
+        #calculate performance metrics
+        self._metrics = self.result_metrics()
 
-            #data cv separation
-            x_train, x_test, y_train, y_test = samples[train, :], samples[test, :], targets[train], targets[test]
+        return self._results, self._metrics
 
-            # We correct NaN values in x_train and x_test
-            nan_mean  = stats.nanmean(x_train)
-            nan_train = np.isnan(x_train)
-            nan_test  = np.isnan(x_test)
+    def repeated_cross_validation(self, samples, targets, n_repeats=10, random_state=None, confidence=0.95):
+        """Performs n_repeats K-fold cross-validations of the dataset, each
+        one with the samples shuffled differently, see
+        sklearn_utils.get_repeated_cv_methods.
 
-            #remove Nan values
-            x_test[nan_test] = 0
-            x_test = x_test + nan_test*nan_mean
+        The folds of all the repetitions are processed as the folds of
+        one cross-validation: they are scheduled in the same worker pool,
+        share the samples and the statistics computed once for all of
+        them, and the core_plan, fold_stats and imputation_stats members
+        count all of them.
 
-            x_train[nan_train] = 0
-            x_train = x_train + nan_train*nan_mean
+        Parameters
+        ----------
+        samples: array_like or scipy.sparse matrix
+            See cross_validation.
 
-            #y_train = y_train.ravel()
-            #y_test = y_test.ravel()
+        targets: vector or list
 
-            #scaling
-            #if clfmethod == 'linearsvc' or clfmethod == 'onevsonesvc':
-            if self.scaler is not None:
-                log.debug('Normalizing data with: {}'.format(str(self.scaler)))
-                x_train = self.scaler.fit_transform(x_train)
-                x_test  = self.scaler.transform(x_test)
+        n_repeats: int
 
-            #do it
-            log.debug('Running grid search for fold {}'.format(fold_count))
-            self._gs.fit(x_train, y_train)
+        random_state: int, RandomState or None
+            Seed of the shuffles. With the same seed, the folds are the same.
 
-            log.debug('Predicting on test set')
+        confidence: float
+            Confidence level of the intervals of the metrics.
 
-            #predictions
-            preds    [fold_count] = self._gs.predict(x_test)
-            truth    [fold_count] = y_test
-            best_pars[fold_count] = self._gs.best_params_
+        Returns
+        -------
+        results.RepeatedCVResult
+        """
+        if self.cvmethod == 'loo':
+            raise ValueError('A leave-one-out gives the same folds in every repetition.')
 
-            #features importances
-            if hasattr(self._gs.best_estimator_, 'support_vectors_'):
-                imp = self._gs.best_estimator_.support_vectors_
-            elif hasattr(self._gs.best_estimator_, 'feature_importances_'):
-                imp = self._gs.best_estimator_.feature_importances_
-            else:
-                imp = None
+        samples  = self._check_samples(samples)
+        cvs      = get_repeated_cv_methods(targets, self.cvmethod, n_repeats, self.stratified, random_state)
+        cv_folds = [list(cv) for cv in cvs]
+
+        folds = self._cross_validate_folds(samples, targets, [fold for repeat in cv_folds for fold in repeat])
+
+        results = []
+        start   = 0
+        for cv, repeat_folds in zip(cvs, cv_folds):
+            results.append(self._fold_results(folds[start:start + len(repeat_folds)], targets, cv,
+                                              self.imputation_stats.nan_counts))
+            start += len(repeat_folds)
+
+        metrics = np.array([self.result_metrics(result, cv)[0] for result, cv in zip(results, cvs)])
+        return RepeatedCVResult(results, metrics, *repeated_cv_metrics(metrics, confidence))
+
+    def permutation_test(self, samples, targets, n_permutations=1000, batch_size=20, random_state=None,
+                         early_stopping=True, alpha=0.05, stop_confidence=0.99):
+        """Permutation test of the cross-validation accuracy of the pipeline.
+        The p-value is the fraction of the cross-validations with randomly
+        permuted labels that are at least as accurate as the one with the
+        true labels, see results.permutation_p_value.
+
+        All the cross-validations use the folds of the true labels and
+        share the work that does not depend on the labels: the imputation
+        and scaling sums, the Gram matrices and the fold buffers.
+        The permutations are cross-validated in batches, the folds of all
+        the permutations of a batch are dispatched to the fold workers at once.
+
+        After it, the results of the true labels are the ones of
+        cross_validation.
+
+        Parameters
+        ----------
+        samples: array_like or scipy.sparse matrix
+            See cross_validation.
+
+        targets: vector or list
+
+        n_permutations: int
+            Maximum number of permutations.
+
+        batch_size: int
+            Number of permutations cross-validated at the same time.
+
+        random_state: int, RandomState or None
+            Seed of the permutations. They do not depend on batch_size.
+
+        early_stopping: bool
+            If True, the test stops after a batch if the p-value is clearly
+            below or above alpha, see results.is_p_value_decided.
+
+        alpha: float
+            Significance level of the early stopping.
+
+        stop_confidence: float
+            Confidence level of the early stopping decision.
+
+        Returns
+        -------
+        results.PermutationTestResult
+        """
+        check_random_state = import_this('sklearn.utils.check_random_state')
+
+        samples    = self._check_samples(samples)
+        targets    = np.asarray(targets)
+        self._cv   = get_cv_method(targets, self.cvmethod, self.stratified)
+        cv_folds   = list(self._cv)
+        batch_size = max(1, min(batch_size, n_permutations))
+
+        setup    = self._setup_folds(samples, targets, cv_folds, is_leave_one_out(self._cv),
+                                     len(cv_folds) * batch_size)
+        parallel = Parallel(n_jobs=self.core_plan.fold_jobs, backend=self.fold_backend, verbose=0)
+        rng      = check_random_state(random_state)
+
+        scores  = []
+        stopped = False
+        with limit_blas_threads(self.core_plan.blas_threads):
+            folds = self._run_folds(setup, [targets], cv_folds, parallel)[0]
+            self._set_fold_stats(setup, folds)
+            self._results = self._fold_results(folds, targets, self._cv, self.imputation_stats.nan_counts)
+            self._metrics = self.result_metrics()
+            score         = self._accuracy(self._metrics)
+
+            while len(scores) < n_permutations:
+                batch = [rng.permutation(targets) for _ in range(min(batch_size, n_permutations - len(scores)))]
+                perm_folds_list = self._run_folds(setup, batch, cv_folds, parallel, importance=False)
+                for perm_targets, perm_folds in zip(batch, perm_folds_list):
+                    perm_results = self._fold_results(perm_folds, perm_targets, self._cv,
+                                                      self.imputation_stats.nan_counts)
+                    scores.append(self._accuracy(self.result_metrics(perm_results)))
+
+                n_greater = int(np.sum(np.array(scores) >= score))
+                log.debug('{} of {} permutations score at least {:.3f}.'.format(n_greater, len(scores), score))
+
+                if early_stopping and len(scores) < n_permutations and \
+                        is_p_value_decided(n_greater, len(scores), alpha, stop_confidence):
+                    stopped = True
+                    break
+
+        p_value = permutation_p_value(score, scores)
+        log.info('Permutation test: accuracy {:.3f}, p-value {:.4f} with {} permutations.'.format(score, p_value,
+                                                                                                 len(scores)))
+        return PermutationTestResult(score, np.array(scores), p_value, len(scores), stopped,
+                                     self._results.imputation_stats)
+
+    def _accuracy(self, metrics):
+        """Return the accuracy of the result_metrics of a cross-validation with self._cv."""
+        return metrics.accuracy if is_leave_one_out(self._cv) else metrics[0].accuracy
+
+    def _check_samples(self, samples):
+        """Return samples as CSR if they are sparse, checking the scaler does not center them."""
+        if sp.issparse(samples):
+            samples = samples.tocsr()
+            if getattr(self.scaler, 'with_mean', False):
+                raise ValueError('Cannot center sparse matrices: use a scaler with with_mean=False.')
+        return samples
+
+    def _cross_validate_folds(self, samples, targets, cv_folds, loo=False):
+        """Cross-validate the folds in cv_folds, sharing the CPUs between them.
+        It sets the core_plan, fold_stats, imputation_stats and shared_gram members.
+
+        Parameters
+        ----------
+        samples: array_like or scipy.sparse matrix
+
+        targets: vector
+
+        cv_folds: list of (train, test) indices
+
+        loo: bool
+            True if cv_folds are the folds of a leave-one-out.
+
+        Returns
+        -------
+        list of (preds, probs, y_test, best_params, importance, search_stats, n_imputed), one per fold
+        """
+        setup    = self._setup_folds(samples, targets, cv_folds, loo)
+        parallel = Parallel(n_jobs=self.core_plan.fold_jobs, backend=self.fold_backend, verbose=0)
+
+        with limit_blas_threads(self.core_plan.blas_threads):
+            folds = self._run_folds(setup, [targets], cv_folds, parallel)[0]
+
+        self._set_fold_stats(setup, folds)
+        return folds
+
+    def _set_fold_stats(self, setup, folds):
+        """Set the fold_stats and imputation_stats members from the folds
+        of a cross-validation set up by setup."""
+        #Parallel returns the folds in the same order they were dispatched
+        self.fold_stats = OrderedDict((fold_count, fold[5]) for fold_count, fold in enumerate(folds))
+
+        nan_counts = np.zeros(self.n_feats, dtype=int) if setup.use_fast_loo or setup.use_kernel \
+                     else setup.col_stats.nan_counts
+        self.imputation_stats = _imputation_stats(folds, nan_counts)
+        log.info('Imputed {} NaNs in {} folds.'.format(self.imputation_stats.n_imputed,
+                                                       self.imputation_stats.imputed_folds))
+        log.info('{} search: {} fits in {:.2f} s.'.format(self.search_method,
+                                                         sum(s.n_fits for s in self.fold_stats.values()),
+                                                         sum(s.fit_time for s in self.fold_stats.values())))
+
+    def _setup_folds(self, samples, targets, cv_folds, loo=False, n_tasks=None):
+        """Plan the CPUs of the cross-validation of cv_folds and do the work
+        that does not depend on the labels: the sums of FoldStatistics, the
+        Gram matrix of the precomputed kernel or of the ridge leave-one-out
+        and the fold buffers. It sets the core_plan and shared_gram members.
+
+        Parameters
+        ----------
+        samples: array_like or scipy.sparse matrix
+
+        targets: vector
+
+        cv_folds: list of (train, test) indices
+
+        loo: bool
+            True if cv_folds are the folds of a leave-one-out.
+
+        n_tasks: int or None
+            Number of folds that will be run at the same time, if not len(cv_folds).
+
+        Returns
+        -------
+        FoldSetup
+        """
+        n_tasks      = len(cv_folds) if n_tasks is None else n_tasks
+        n_candidates = count_candidates(self._paramgrid, self.search_method, self.search_n_iter)
+        use_fast_loo = self.fast_loo and self.search_method == 'grid' and loo and \
+                       is_ridge_loo_compatible(self._pipe, self._paramgrid, self.scaler, samples, targets,
+                                               self.gs_scoring)
+        use_kernel   = self.precompute_kernel and not use_fast_loo and \
+                       is_precomputed_kernel_compatible(self._pipe, self.scaler, samples, self.fsmethods,
+                                                        self._paramgrid)
+
+        #share the CPUs between folds, grid search candidates and BLAS
+        #the closed form leave-one-out is all BLAS
+        if use_fast_loo:
+            self.core_plan = plan_core_allocation(self.n_cpus, 1, 1)
+        else:
+            n_fold_jobs    = 1 if self._sequential_warm_start() else self.n_fold_jobs
+            self.core_plan = plan_core_allocation(self.n_cpus, n_tasks, n_candidates, n_fold_jobs,
+                                                  nested_jobs=self.fold_backend == 'threading')
+        log.info('Core allocation plan: {}'.format(self.core_plan))
 
-            importance[fold_count] = imp
+        self.n_feats = samples.shape[1]
+
+        #each fold gets its own copy of the grid search and the scaler,
+        #so they can be fitted at the same time.
+        scaler      = self.scaler
+        grid_search = clone(self._gs).set_params(n_jobs=self.core_plan.gs_jobs)
+        gram        = None
+        col_stats   = None
+        buffers     = None
+
+        self.shared_gram = None
+        with limit_blas_threads(self.core_plan.blas_threads):
+            if use_fast_loo:
+                gram = centered_gram(samples)
+
+            elif use_kernel:
+                #the folds see the sample indices, the kernels come from one Gram matrix
+                log.info('Computing the Gram matrix of {} samples for all the folds.'.format(samples.shape[0]))
+                gram = SharedGram(samples, center=self._pipe.kernel == 'rbf' and not sp.issparse(samples))
+                #a centering scaler only changes the support vectors
+                grid_search.set_params(estimator=PrecomputedKernelSVC.from_svc(self._pipe, gram,
+                                                                               center=scaler is not None))
+                self.shared_gram = gram
+                samples = sample_indices(samples.shape[0])
+                scaler  = None
+
+            if not use_fast_loo:
+                #the imputation and scaling statistics of every training set come from the same sums
+                col_stats = FoldStatistics(samples)
+
+                #folds processed one after the other reuse the same data buffers
+                if self.core_plan.fold_jobs == 1 and not sp.issparse(samples):
+                    buffers = FoldBuffers(max(len(train) for train, _ in cv_folds),
+                                          max(len(test) for _, test in cv_folds), samples.shape[1],
+                                          self.dtype)
+
+        return FoldSetup(samples, scaler, grid_search, col_stats, buffers, gram, use_fast_loo, use_kernel)
+
+    def _run_folds(self, setup, targets_list, cv_folds, parallel, importance=True):
+        """Cross-validate the folds in cv_folds once for each vector of
+        labels in targets_list. Without warm start, all the folds of all
+        the labels are dispatched to parallel at once.
+
+        Parameters
+        ----------
+        setup: FoldSetup
+            See _setup_folds.
 
-            #best grid-search parameters
-            try:
-                probs[fold_count] = self._gs.predict_proba(x_test)
-            except:
-                probs[fold_count] = None
+        targets_list: list of vectors
 
-            log.debug('Result: {} classifies as {}.'.format(y_test, preds[fold_count]))
+        cv_folds: list of (train, test) indices
+
+        parallel: joblib.Parallel
+
+        importance: bool
+            If False, the closed form leave-one-out does not compute the
+            features importance of the folds.
+
+        Returns
+        -------
+        list of lists of (preds, probs, y_test, best_params, importance, search_stats, n_imputed),
+        one list of folds for each vector of labels.
+        """
+        #the BLAS limit of this process is set around the folds, only worker processes set their own
+        fold_processes = self.core_plan.fold_jobs > 1 and self.fold_backend != 'threading'
+        blas           = self.core_plan.blas_threads if fold_processes else None
+
+        if setup.use_fast_loo:
+            log.info('Solving the ridge leave-one-out in closed form.')
+            #it requires a dataset without NaNs, so nothing is imputed
+            return [[fold + (0,) for fold in ridge_loo_folds(setup.samples, targets, cv_folds,
+                                                             self._paramgrid, self._pipe, setup.gram,
+                                                             importance)]
+                    for targets in targets_list]
+
+        if self._sequential_warm_start():
+            return [self._warm_start_folds(clone(setup.grid_search), setup.scaler, setup.samples, targets,
+                                           cv_folds, setup.col_stats, setup.buffers)
+                    for targets in targets_list]
+
+        scaler = setup.scaler
+        folds  = parallel(delayed(_cross_validate_fold)(clone(setup.grid_search),
+                                                        None if scaler is None else clone(scaler),
+                                                        setup.samples, targets, train, test, fold_count, blas,
+                                                        setup.col_stats, setup.buffers, self.dtype)
+                          for targets in targets_list
+                          for fold_count, (train, test) in enumerate(cv_folds))
+
+        n_folds = len(cv_folds)
+        return [folds[idx * n_folds:(idx + 1) * n_folds] for idx in range(len(targets_list))]
+
+    def _fold_results(self, folds, targets, cv, nan_counts):
+        """Return the ClassificationResult of the folds of the cross-validation cv.
+
+        Parameters
+        ----------
+        folds: list of (preds, probs, y_test, best_params, importance, ...)
+            See _cross_validate_folds.
+
+        targets: vector
+
+        cv: cross-validation object
+
+        nan_counts: numpy array of ints
+            Number of NaNs of each feature of the dataset.
+
+        Returns
+        -------
+        results.ClassificationResult
+        """
+        #We use dictionaries to save each fold classification result
+        #because we will need to identify all sets of results to one fold.
+        #If we used lists, we would loose track of folds if something went
+        #wrong.
+        preds      = OrderedDict()
+        probs      = OrderedDict()
+        truth      = OrderedDict()
+        best_pars  = OrderedDict()
+        importance = OrderedDict()
 
-            fold_count += 1
+        for fold_count, fold in enumerate(folds):
+            preds     [fold_count] = fold[0]
+            probs     [fold_count] = fold[1]
+            truth     [fold_count] = fold[2]
+            best_pars [fold_count] = fold[3]
+            importance[fold_count] = fold[4]
 
         #summarize results
         has_values = lambda adict: bool([i for i in adict if adict[i] is not None])
@@ -251,17 +688,75 @@ class ClassificationPipeline(Printable):
         if not has_values(importance):
             importance = None
 
-        if isinstance(self._cv, LeaveOneOut):
+        #one contiguous array per kind of result instead of one small array per fold
+        preds = to_fold_arrays(preds)
+        truth = to_fold_arrays(truth)
+        if probs is not None:
+            probs = to_fold_arrays(probs)
+        if importance is not None:
+            importance = to_fold_arrays(importance, stacked=None)
+
+        if is_leave_one_out(cv):
             truth, preds, probs, labels = enlist_cv_results_from_dict(truth, preds, probs)
         else:
             labels = np.unique(targets)
 
-        self._results = ClassificationResult(preds, probs, truth, best_pars, self._cv, importance, targets, labels)
+        return ClassificationResult(preds, probs, truth, best_pars, cv, importance, targets, labels,
+                                    _imputation_stats(folds, nan_counts))
 
-        #calculate performance metrics
-        self._metrics = self.result_metrics()
+    def _sequential_warm_start(self):
+        """Return True if the warm start carries something from one fold to
+        the next one: fewer grid search candidates or the coef_init of the
+        classifier. Only ranking all the candidates does not make the
+        exhaustive search any faster, so it is not worth serializing the folds."""
+        return self.warm_start and (self.warm_start_n_best is not None or fit_accepts(self._pipe, 'coef_init'))
 
-        return self._results, self._metrics
+    def _warm_start_folds(self, grid_search, scaler, samples, targets, cv_folds, col_stats=None, buffers=None):
+        """Process cv_folds one after the other, each fold with the grid
+        search candidates ranked by the previous fold and, if the classifier
+        accepts it, the coefficients of the previous best estimator as coef_init.
+
+        Parameters
+        ----------
+        grid_search: sklearn.grid_search.GridSearchCV
+            Unfitted grid search object. It is modified here.
+
+        scaler: sklearn scaler object or None
+
+        samples: array_like
+
+        targets: vector
+
+        cv_folds: list of (train, test) indices
+
+        col_stats: preprocessing.FoldStatistics or None
+
+        buffers: preprocessing.FoldBuffers or None
+
+        Returns
+        -------
+        list of (preds, probs, y_test, best_params, importance, search_stats, n_imputed), one per fold
+        """
+        init_coefs = fit_accepts(self._pipe, 'coef_init')
+
+        folds = []
+        for fold_count, (train, test) in enumerate(cv_folds):
+            fold_gs = clone(grid_search)
+            folds.append(_cross_validate_fold(fold_gs, None if scaler is None else clone(scaler),
+                                              samples, targets, train, test, fold_count, None,
+                                              col_stats, buffers, self.dtype))
+
+            if self._paramgrid:
+                param_grid = get_ranked_param_grid(fold_gs.grid_scores_, self.warm_start_n_best)
+                grid_search.set_params(param_grid=param_grid)
+                log.debug('Fold {} searches {} candidates.'.format(fold_count + 1, len(param_grid)))
+
+            if init_coefs:
+                best = fold_gs.best_estimator_
+                grid_search.set_params(fit_params={'coef_init': best.coef_,
+                                                   'intercept_init': best.intercept_})
+
+        return folds
 
     def result_metrics(self, classification_results=None, cvmethod=None):
         """Return the Accuracy, Sensitivity, Specificity, Precision, F1-Score
@@ -297,7 +792,7 @@ class ClassificationPipeline(Printable):
         if cvmethod is None:
             cvmethod = self._cv
 
-        if isinstance(cvmethod, LeaveOneOut):
+        if is_leave_one_out(cvmethod):
 
             acc, sens, spec, \
             prec, f1, auc = classification_metrics(cr.cv_targets,
@@ -319,3 +814,118 @@ class ClassificationPipeline(Printable):
             stds = ClassificationMetrics(*tuple(std_metrics))
 
             return avgs, stds
+
+
+def _imputation_stats(folds, nan_counts):
+    """Return the preprocessing.ImputationStats of folds, each one a tuple
+    ending with its number of imputed NaNs, of a dataset with nan_counts."""
+    n_imputed = [fold[6] for fold in folds]
+    n_skipped = n_imputed.count(0)
+    return ImputationStats(nan_counts, sum(n_imputed), len(n_imputed) - n_skipped, n_skipped)
+
+
+def _cross_validate_fold(grid_search, scaler, samples, targets, train, test, fold_count=0,
+                         blas_threads=None, col_stats=None, buffers=None, dtype=np.float64):
+    """Fits grid_search on one cross-validation training set and predicts its test set.
+
+    This is the unit of work of ClassificationPipeline.cross_validation.
+    It is a module function so it can be sent to joblib workers.
+
+    Parameters
+    ----------
+    grid_search: sklearn.grid_search.GridSearchCV or search.SuccessiveHalvingSearchCV
+        Unfitted search object. It will be fitted here, so
+        it should not be shared with other folds.
+
+    scaler: sklearn scaler object or None
+        Unfitted scaler. It will be fitted here, so
+        it should not be shared with other folds.
+
+    samples: array_like
+
+    targets: vector
+
+    train: array_like
+        Indices of the training samples
+
+    test: array_like
+        Indices of the test samples
+
+    fold_count: int
+        Number of the fold, for logging.
+
+    blas_threads: int or None
+        Maximum number of BLAS threads while fitting the grid search.
+        The limit is global to the process, so only set it if the fold
+        runs in a worker process of its own.
+
+    col_stats: preprocessing.FoldStatistics or None
+        Per-feature sums and NaN locations of samples, from which the
+        training means used to replace the NaNs are derived. If scaler is a
+        StandardScaler, the data is also scaled in place with them instead
+        of refitting the scaler. If None, they are computed here.
+
+    buffers: preprocessing.FoldBuffers or None
+        Preallocated arrays for the fold data, see preprocessing.prepare_fold.
+        They are overwritten, so they should not be shared with folds
+        processed at the same time.
+
+    dtype: numpy float dtype
+        Type of the fold data if buffers is None.
+
+    Returns
+    -------
+    preds, probs, y_test, best_params, importance, search_stats, n_imputed
+        n_imputed is the number of NaNs replaced in the fold data.
+    """
+    log.debug('Processing fold ' + str(fold_count))
+
+    if col_stats is None:
+        col_stats = FoldStatistics(samples)
+
+    #data cv separation, with the NaN values replaced by the training means
+    x_train, x_test, mean, std, n_imputed = prepare_fold(samples, train, test, col_stats, buffers, dtype)
+    y_train, y_test = targets[train], targets[test]
+
+    #scaling
+    if scaler is not None:
+        log.debug('Normalizing data with: {}'.format(str(scaler)))
+        if is_standard_scaler(scaler):
+            standard_scale_(x_train, mean, std, scaler.with_mean, scaler.with_std)
+            standard_scale_(x_test,  mean, std, scaler.with_mean, scaler.with_std)
+        else:
+            x_train = scaler.fit_transform(x_train)
+            x_test  = scaler.transform(x_test)
+
+    #do it
+    log.debug('Running grid search for fold {}'.format(fold_count))
+    start = time.time()
+    with limit_blas_threads(blas_threads):
+        grid_search.fit(x_train, y_train)
+    stats = get_search_stats(grid_search, time.time() - start, len(y_train))
+
+    log.debug('Predicting on test set')
+
+    #predictions
+    preds       = grid_search.predict(x_test)
+    best_params = grid_search.best_params_
+
+    #features importances
+    if hasattr(grid_search.best_estimator_, 'support_vectors_'):
+        imp = grid_search.best_estimator_.support_vectors_
+    elif hasattr(grid_search.best_estimator_, 'feature_importances_'):
+        imp = grid_search.best_estimator_.feature_importances_
+    elif hasattr(grid_search.best_estimator_, 'coef_'):
+        imp = grid_search.best_estimator_.coef_
+    else:
+        imp = None
+
+    #probabilities, if the classifier can give them
+    try:
+        probs = grid_search.predict_proba(x_test)
+    except:
+        probs = None
+
+    log.debug('Result: {} classifies as {}.'.format(y_test, preds))
+
+    return preds, probs, y_test, best_params, imp, stats, n_imputed
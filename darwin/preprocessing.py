@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+
+#------------------------------------------------------------------------------
+#Authors:
+# Alexandre Manhaes Savio <alexsavio@gmail.com>
+# Grupo de Inteligencia Computational <www.ehu.es/ccwintco>
+# Neurita S.L.
+#
+# BSD 3-Clause License
+#
+# 2014, Alexandre Manhaes Savio
+# Use this at your own risk!
+#------------------------------------------------------------------------------
+"""
+Per-fold preprocessing statistics derived from whole-dataset sums.
+
+The training sets of a cross-validation overlap by (k-2)/k or more.
+The per-feature sums of the whole dataset are computed once, and the
+statistics of any training set are the whole-dataset sums minus the
+ones of its held-out samples.
+
+Memory
+------
+prepare_fold copies the fold data into float64 buffers, then imputes
+and scales them in place. Besides the buffers, of
+(n_train + n_test) x n_features x 8 bytes, which can be preallocated
+once for all the folds with FoldBuffers, its peak memory is the copy
+of the held-out rows used to update the statistics,
+n_test x n_features x 8 bytes, and a few n_features and n_nans sized
+vectors. The former imputation used about 4 times the size of the
+training set per fold.
+
+With dtype=np.float32 the buffers take half of that. The statistics
+are still accumulated in float64.
+
+Sparse CSR datasets are never densified: the folds are CSR row copies,
+their NaNs are imputed in the stored values, and they can only be
+scaled without centering.
+"""
+import logging
+import collections
+
+import numpy as np
+import scipy.sparse as sp
+
+from .distance import column_chunks
+
+log = logging.getLogger(__name__)
+
+
+class FoldStatistics(object):
+    """
+    Per-feature number of non-NaN values, sum and sum of squares of a
+    dataset, from which the mean and the standard deviation of the
+    training set of any cross-validation fold are derived.
+
+    NaNs are left out of the sums. The standard deviation is the one of
+    the training set after replacing its NaNs by its mean, as the
+    cross-validation does before scaling.
+
+    The sums are taken around a per-feature shift, the feature means of
+    the whole dataset, to keep the variances accurate.
+
+    Parameters
+    ----------
+    samples: numpy array or scipy.sparse matrix
+        Shape: n_samples x n_features
+        The NaNs of a sparse matrix are the ones in its stored values,
+        and its sums are not shifted.
+
+    chunk_size: int
+        Number of columns processed at once. See distance.column_chunks.
+
+    Members
+    -------
+    n_samples: int
+
+    counts: numpy array
+        Size: n_features, number of non-NaN values.
+
+    sums: numpy array
+        Size: n_features
+
+    sqsums: numpy array
+        Size: n_features
+
+    shift: numpy array
+        Size: n_features
+
+    nan_rows, nan_cols: numpy arrays of ints
+        Size: n_nans, the locations of the NaNs of the dataset.
+
+    nan_features: numpy array of ints
+        The features with NaNs.
+
+    The dataset is checked for NaNs only here, the folds take their NaN
+    locations from nan_rows and nan_cols, and a dataset without NaNs
+    skips the imputation.
+    """
+
+    def __init__(self, samples, chunk_size=None):
+        n_samples, n_feats = samples.shape
+
+        self.n_samples = n_samples
+        self.counts    = np.zeros(n_feats)
+        self.sums      = np.zeros(n_feats)
+        self.sqsums    = np.zeros(n_feats)
+        self.shift     = np.zeros(n_feats)
+
+        if sp.issparse(samples):
+            self._init_sparse(samples.tocsr())
+        else:
+            self._init_dense(samples, chunk_size)
+
+        log.debug('{} NaNs in {} of {} features.'.format(len(self.nan_rows), len(self.nan_features), n_feats))
+
+    def _init_dense(self, samples, chunk_size=None):
+        """Take the shifted sums and the NaN locations of samples by chunks of columns."""
+        n_samples, n_feats = samples.shape
+
+        nan_rows, nan_cols = [np.zeros(0, dtype=int)], [np.zeros(0, dtype=int)]
+        for cols in column_chunks(n_samples, n_feats, chunk_size=chunk_size):
+            xc = np.array(samples[:, cols], dtype=np.float64)
+
+            #cheap check first, as validation._assert_all_finite
+            if np.isfinite(xc.sum()):
+                rows, chunk_cols = nan_rows[0], nan_cols[0]
+                self.shift[cols] = xc.mean(axis=0)
+            else:
+                rows, chunk_cols = np.nonzero(np.isnan(xc))
+                nan_rows.append(rows)
+                nan_cols.append(chunk_cols + cols.start)
+                self.shift[cols] = _nanmean(xc)
+
+            self.counts[cols], self.sums[cols], self.sqsums[cols] = _shifted_sums(xc, self.shift[cols],
+                                                                                  rows, chunk_cols)
+
+        self.nan_rows     = np.concatenate(nan_rows)
+        self.nan_cols     = np.concatenate(nan_cols)
+        self.nan_features = np.unique(self.nan_cols)
+
+    def _init_sparse(self, samples):
+        """Take the sums and the NaN locations from the stored values of the CSR samples."""
+        rows = np.repeat(np.arange(self.n_samples), np.diff(samples.indptr))
+        nans = np.isnan(samples.data)
+
+        self.nan_rows     = rows[nans]
+        self.nan_cols     = samples.indices[nans]
+        self.nan_features = np.unique(self.nan_cols)
+
+        self.counts, self.sums, self.sqsums = _sparse_sums(samples)
+
+    @property
+    def has_nans(self):
+        return len(self.nan_rows) > 0
+
+    @property
+    def nan_counts(self):
+        """Number of NaNs of each feature."""
+        return (self.n_samples - self.counts).astype(int)
+
+    def _local_nans(self, rows):
+        """Return the locations of the NaNs of samples[rows] in it."""
+        local = np.empty(self.n_samples, dtype=int)
+        local.fill(-1)
+        local[rows] = np.arange(len(rows))
+
+        nan_rows = local[self.nan_rows]
+        in_rows  = nan_rows >= 0
+        return nan_rows[in_rows], self.nan_cols[in_rows]
+
+    def _held_out_sums(self, test_samples, test=None):
+        """Return the counts, sums and sqsums of the rows in test of samples."""
+        if sp.issparse(test_samples):
+            return _sparse_sums(test_samples.tocsr())
+
+        x = np.array(test_samples, dtype=np.float64)
+        if not self.has_nans:
+            nan_rows, nan_cols = self.nan_rows, self.nan_cols
+        elif test is None:
+            nan_rows, nan_cols = np.nonzero(np.isnan(x))
+        else:
+            nan_rows, nan_cols = self._local_nans(test)
+
+        return _shifted_sums(x, self.shift, nan_rows, nan_cols)
+
+    def train_moments(self, test_samples, test=None):
+        """Return the per-feature mean and standard deviation of the
+        dataset without test_samples, after replacing its NaNs by its mean.
+
+        Parameters
+        ----------
+        test_samples: numpy array
+            Shape: n_test x n_features, the held-out rows of the dataset.
+
+        test: array_like of ints or None
+            Indices in the dataset of test_samples. If given, their NaNs
+            are not searched again.
+
+        Returns
+        -------
+        mean, std: numpy arrays
+            Size: n_features. Where there are no non-NaN training values,
+            they are NaN.
+        """
+        counts, sums, sqsums = self._held_out_sums(test_samples, test)
+
+        n_train = self.n_samples - test_samples.shape[0]
+        counts  = self.counts - counts
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = (self.sums - sums) / counts
+            var   = (self.sqsums - sqsums - counts * np.square(delta)) / n_train
+
+        return self.shift + delta, np.sqrt(np.maximum(var, 0))
+
+    def impute_(self, x, rows, values):
+        """Replace in place the NaNs of x, a copy of some rows of the
+        dataset, by the values of their features.
+
+        Parameters
+        ----------
+        x: numpy array or scipy.sparse.csr_matrix
+            Shape: len(rows) x n_features
+
+        rows: array_like of ints
+            Indices in the dataset of the rows of x.
+            Not used if x is sparse, its NaNs are in its stored values.
+
+        values: numpy array
+            Size: n_features
+
+        Returns
+        -------
+        int
+            The number of values replaced.
+        """
+        if not self.has_nans:
+            return 0
+
+        if sp.issparse(x):
+            nans = np.isnan(x.data)
+            x.data[nans] = values[x.indices[nans]]
+            return int(nans.sum())
+
+        nan_rows, nan_cols = self._local_nans(rows)
+        x[nan_rows, nan_cols] = values[nan_cols]
+        return len(nan_rows)
+
+
+class FoldBuffers(object):
+    """
+    Preallocated arrays for the training and the test data of the
+    folds of a cross-validation, reused from one fold to the next.
+    Use them only when the folds are processed one after the other.
+
+    Parameters
+    ----------
+    n_train: int
+        Maximum number of training samples in a fold.
+
+    n_test: int
+        Maximum number of test samples in a fold.
+
+    n_feats: int
+
+    dtype: numpy float dtype
+    """
+    def __init__(self, n_train, n_test, n_feats, dtype=np.float64):
+        self.train = np.empty((n_train, n_feats), dtype=dtype)
+        self.test  = np.empty((n_test,  n_feats), dtype=dtype)
+
+    def views(self, n_train, n_test):
+        """Return the first n_train rows of the training buffer and the
+        first n_test rows of the test buffer."""
+        return self.train[:n_train], self.test[:n_test]
+
+
+def _take_rows(samples, rows, out, dtype=np.float64):
+    """Copy samples[rows] into out, allocating it as dtype if None."""
+    if sp.issparse(samples):
+        return samples[rows].astype(dtype)
+
+    if out is None:
+        return np.asarray(samples[rows], dtype=dtype)
+
+    #with the default mode='raise', take buffers out in a temporary copy
+    if samples.dtype == out.dtype:
+        return np.take(samples, rows, axis=0, out=out, mode='clip')
+
+    out[...] = samples[rows]
+    return out
+
+
+def prepare_fold(samples, train, test, col_stats, buffers=None, dtype=np.float64):
+    """Return the training and test data of a fold with the NaNs
+    replaced by the training means, and the training means and standard
+    deviations, see FoldStatistics.train_moments.
+    samples is not modified. See the module docstring for the memory use.
+
+    Parameters
+    ----------
+    samples: numpy array or scipy.sparse.csr_matrix
+        Shape: n_samples x n_features
+        If sparse, x_train and x_test are CSR matrices.
+
+    train: array_like of ints
+        Indices of the training samples
+
+    test: array_like of ints
+        Indices of the test samples
+
+    col_stats: FoldStatistics
+        Statistics of samples.
+
+    buffers: FoldBuffers or None
+        Where to put x_train and x_test. If None, they are allocated.
+        Not used if samples is sparse.
+
+    dtype: numpy float dtype
+        Type of x_train and x_test if buffers is None.
+
+    Returns
+    -------
+    x_train, x_test, mean, std, n_imputed
+        n_imputed is the number of NaNs replaced.
+    """
+    out_train, out_test = (None, None)
+    if buffers is not None and not sp.issparse(samples):
+        out_train, out_test = buffers.views(len(train), len(test))
+
+    x_test    = _take_rows(samples, test, out_test, dtype)
+    mean, std = col_stats.train_moments(x_test, test)
+    n_imputed = col_stats.impute_(x_test, test, mean)
+
+    x_train    = _take_rows(samples, train, out_train, dtype)
+    n_imputed += col_stats.impute_(x_train, train, mean)
+
+    return x_train, x_test, mean, std, n_imputed
+
+
+def _nanmean(x):
+    """Column means of x without NaNs, 0 where the column is all NaN."""
+    nans   = np.isnan(x)
+    counts = x.shape[0] - nans.sum(axis=0)
+    sums   = np.where(nans, 0, x).sum(axis=0)
+    return sums / np.maximum(counts, 1)
+
+
+def _shifted_sums(x, shift, nan_rows, nan_cols):
+    """Return the per-column number of non-NaN values, sum and sum of
+    squares of x - shift, leaving out the NaNs, which are at nan_rows and
+    nan_cols. x is modified."""
+    x -= shift
+    x[nan_rows, nan_cols] = 0
+
+    counts = x.shape[0] - np.bincount(nan_cols, minlength=x.shape[1])
+    sums   = x.sum(axis=0)
+    x *= x
+    return counts, sums, x.sum(axis=0)
+
+
+def _sparse_sums(x):
+    """Return the per-column number of non-NaN values, sum and sum of
+    squares of the CSR matrix x, leaving NaNs out."""
+    nans = np.isnan(x.data)
+    data = np.where(nans, 0, x.data).astype(np.float64)
+
+    n_feats = x.shape[1]
+    counts  = x.shape[0] - np.bincount(x.indices[nans], minlength=n_feats)
+    sums    = np.bincount(x.indices, weights=data,        minlength=n_feats)
+    sqsums  = np.bincount(x.indices, weights=data * data, minlength=n_feats)
+    return counts, sums, sqsums
+
+
+class ImputationStats(collections.namedtuple('Imputation_Stats',
+                                             ['nan_counts', 'n_imputed', 'imputed_folds', 'skipped_folds'])):
+    """
+    Namedtuple to store what the NaN imputation of a cross-validation did:
+    the number of NaNs of each feature of the dataset, the number of
+    values imputed in all the folds, and the number of folds that were
+    imputed and that were skipped for not having NaNs.
+    """
+    pass
+
+
+def standard_scale_(x, mean, std, with_mean=True, with_std=True):
+    """Standardize x in place, as sklearn.preprocessing.StandardScaler would
+    with the given mean and std.
+    Features with (numerically) zero std are not scaled.
+
+    Parameters
+    ----------
+    x: numpy array or scipy.sparse.csr_matrix
+        Shape: n_samples x n_features, float.
+        A sparse x can not be centered, its stored values are scaled.
+
+    mean: numpy array
+
+    std: numpy array
+
+    with_mean: bool
+
+    with_std: bool
+
+    Returns
+    -------
+    x
+    """
+    if with_mean and sp.issparse(x):
+        raise ValueError('Cannot center sparse matrices: use a scaler with with_mean=False.')
+
+    if with_mean:
+        x -= mean
+
+    if with_std:
+        scale = std.copy()
+        scale[scale <= 10 * np.finfo(np.float64).eps * np.maximum(np.abs(mean), 1.)] = 1.
+        if sp.issparse(x):
+            x.data /= scale[x.indices]
+        else:
+            x /= scale
+
+    return x
+
+
+def check_float_dtype(dtype):
+    """Return dtype as a numpy dtype, raising a ValueError if it is not
+    float32 or float64."""
+    dtype = np.dtype(dtype)
+    if dtype not in (np.float32, np.float64):
+        raise ValueError('Expected float32 or float64 as dtype, got {}.'.format(dtype))
+    return dtype
+
+
+def is_standard_scaler(scaler):
+    """Return True if scaler is a sklearn.preprocessing.StandardScaler,
+    whose statistics can be taken from FoldStatistics."""
+    from sklearn.preprocessing import StandardScaler
+    return type(scaler) is StandardScaler
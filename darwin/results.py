@@ -10,17 +10,16 @@
 #-------------------------------------------------------------------------------
 
 import sys
+import numbers
 import logging
 import collections
 import numpy as np
+import scipy.sparse as sp
 
-#scores
-from sklearn.metrics import roc_auc_score
-from sklearn.metrics import accuracy_score
-from sklearn.metrics import precision_score
-from sklearn.metrics import recall_score
-from sklearn.metrics import confusion_matrix
-from sklearn.metrics import f1_score
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 
 log = logging.getLogger(__name__)
 
@@ -28,17 +27,156 @@ log = logging.getLogger(__name__)
 #Classification results namedtuple
 classif_results_varnames = ['predictions', 'probabilities', 'cv_targets',
                             'best_parameters', 'cv_folds',
-                            'features_importance', 'targets', 'labels']
+                            'features_importance', 'targets', 'labels',
+                            'imputation_stats']
 
 
 class ClassificationResult(collections.namedtuple('Classification_Result',
                                                   classif_results_varnames)):
     """
     Namedtuple to store classification results.
+
+    ClassificationPipeline gives predictions, probabilities, cv_targets and
+    features_importance as FoldArrays, the per-fold values of a
+    leave-one-out as arrays with one element per sample, and the NaNs
+    imputed in the folds as a preprocessing.ImputationStats.
     """
     pass
 
 
+class FoldArrays(Mapping):
+    """
+    Read-only dict of the arrays of each cross-validation fold, all of
+    them kept in one contiguous array.
+
+    The rows of the i-th fold are data[offsets[i]:offsets[i + 1]].
+    If stacked, each fold is one row, data[i], e.g., the features
+    importances of all the folds in a [n_folds x n_feats] array.
+
+    np.asarray(fold_arrays) gives data.
+
+    Parameters
+    ----------
+    data: numpy array
+
+    offsets: array_like of ints or None
+        Size: n_folds + 1. Not used if stacked.
+
+    keys: list or None
+        Fold keys, in the order of the folds in data.
+        If None, 0 to n_folds - 1.
+
+    stacked: bool
+    """
+    def __init__(self, data, offsets=None, keys=None, stacked=False):
+        self.data    = np.asarray(data)
+        self.stacked = stacked
+        self.offsets = np.arange(len(self.data) + 1) if stacked else np.asarray(offsets, dtype=int)
+
+        #the default keys are the fold positions, no need to keep them
+        n_folds = len(self.offsets) - 1
+        keys    = None if keys is None else list(keys)
+        if keys == list(range(n_folds)):
+            keys = None
+        if keys is not None and len(keys) != n_folds:
+            raise ValueError('Expected {} fold keys, got {}.'.format(n_folds, len(keys)))
+
+        self._keys  = keys
+        self._index = None if keys is None else dict((key, i) for i, key in enumerate(keys))
+
+    @classmethod
+    def from_dict(cls, adict, stacked=False):
+        """Return the FoldArrays of a dict of arrays, one per fold.
+
+        Parameters
+        ----------
+        adict: dict
+            The values are array_like. Their order is the one of its keys.
+
+        stacked: bool
+            If True, the values must have the same shape, each one is a row of data.
+            If False, they are concatenated along their first axis.
+
+        Returns
+        -------
+        FoldArrays
+        """
+        keys   = list(adict.keys())
+        values = [np.asarray(adict[key]) for key in keys]
+        if stacked:
+            return cls(np.array(values), keys=keys, stacked=True)
+
+        values  = [np.atleast_1d(value) for value in values]
+        offsets = np.concatenate([[0], np.cumsum([len(value) for value in values])])
+        data    = np.concatenate(values) if values else np.zeros(0)
+        return cls(data, offsets, keys)
+
+    def __getitem__(self, key):
+        if self._index is not None:
+            idx = self._index[key]
+        elif isinstance(key, numbers.Integral) and 0 <= key < len(self):
+            idx = key
+        else:
+            raise KeyError(key)
+
+        if self.stacked:
+            return self.data[idx]
+        return self.data[self.offsets[idx]:self.offsets[idx + 1]]
+
+    def __iter__(self):
+        return iter(range(len(self)) if self._keys is None else self._keys)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __array__(self, dtype=None, copy=None):
+        return self.data if dtype is None else self.data.astype(dtype)
+
+    def __repr__(self):
+        return '{}({} folds, data shape {})'.format(self.__class__.__name__, len(self), self.data.shape)
+
+    @property
+    def fold_sizes(self):
+        """Number of rows of each fold."""
+        return np.diff(self.offsets)
+
+    def fold_index(self):
+        """Return the position of the fold of each row of data."""
+        return np.repeat(np.arange(len(self)), self.fold_sizes)
+
+
+def to_fold_arrays(adict, stacked=False):
+    """Return FoldArrays.from_dict(adict, stacked), or adict itself if
+    some fold has no array, e.g., None or a sparse matrix, or if the fold
+    arrays can't be joined, e.g., the probabilities of a fold whose
+    training set lacked a class have fewer columns.
+
+    Parameters
+    ----------
+    adict: dict
+
+    stacked: bool or None
+        If None, the values are stacked if they have the same shape.
+
+    Returns
+    -------
+    FoldArrays or adict
+    """
+    values = list(adict.values())
+    if any(value is None or sp.issparse(value) for value in values):
+        return adict
+
+    shapes = set(np.shape(value) for value in values)
+    if stacked is None:
+        stacked = len(shapes) == 1
+
+    #stacked folds must have the same shape, concatenated ones the same trailing shape
+    if len(shapes if stacked else set(shape[1:] for shape in shapes)) > 1:
+        return adict
+
+    return FoldArrays.from_dict(adict, stacked)
+
+
 #Classification metrics namedtuple
 classif_metrics_varnames = ['accuracy', 'sensitivity', 'specificity',
                             'precision', 'f1_score', 'area_under_curve']
@@ -52,6 +190,38 @@ class ClassificationMetrics(collections.namedtuple('Classification_Metrics',
     pass
 
 
+#Repeated cross-validation results namedtuple
+repeated_cv_varnames = ['results', 'metrics', 'mean', 'std', 'ci_low', 'ci_high']
+
+
+class RepeatedCVResult(collections.namedtuple('Repeated_CV_Result', repeated_cv_varnames)):
+    """
+    Namedtuple to store the results of a repeated cross-validation:
+    the ClassificationResult of each repetition, the [n_repeats x 6]
+    metrics of each repetition averaged over its folds, and the
+    ClassificationMetrics of their mean, standard deviation and
+    confidence interval, see repeated_cv_metrics.
+    """
+    pass
+
+
+#Permutation test results namedtuple
+permutation_test_varnames = ['score', 'permutation_scores', 'p_value', 'n_permutations', 'stopped_early',
+                             'imputation_stats']
+
+
+class PermutationTestResult(collections.namedtuple('Permutation_Test_Result', permutation_test_varnames)):
+    """
+    Namedtuple to store the result of a permutation test: the accuracy
+    with the true labels, the accuracies with the permuted labels (the
+    null distribution), the p-value, the number of permutations done,
+    whether the test stopped before doing all of them and the
+    ImputationStats of the cross-validation with the true labels, the
+    same for every permutation.
+    """
+    pass
+
+
 # class Result(collections.namedtuple('Result', ['metrics', 'cl', 'prefs_thr',
 #                                               'subjsf', 'presels', 'prefs',
 #                                               'fs1', 'fs2',
@@ -63,6 +233,9 @@ def classification_metrics(targets, preds, probs=None, labels=None):
     """Calculate Accuracy, Sensitivity, Specificity, Precision, F1-Score
     and Area-under-ROC of given classification results.
 
+    0/1 labeled results are measured from their confusion matrix, see
+    stacked_classification_metrics, the rest with sklearn.metrics.
+
     Parameters
     ----------
     targets:
@@ -74,6 +247,18 @@ def classification_metrics(targets, preds, probs=None, labels=None):
     -------
     (acc, sens, spec, prec, f1, auc)
     """
+    targets, preds = np.atleast_1d(targets), np.atleast_1d(preds)
+    if _are_binary(targets, preds, labels):
+        folds = np.zeros(len(targets), dtype=int)
+        return tuple(stacked_classification_metrics(folds, targets, preds)[0])
+
+    return _sklearn_classification_metrics(targets, preds, labels)
+
+
+def _sklearn_classification_metrics(targets, preds, labels=None):
+    """classification_metrics with one sklearn.metrics scorer for each measure."""
+    from sklearn.metrics import (roc_auc_score, accuracy_score, precision_score,
+                                 recall_score, confusion_matrix, f1_score)
 
 #    if probs != None and len(probs) > 0:
 #        fpr, tpr, thresholds = roc_curve(targets, probs[:, 1], 1)
@@ -110,10 +295,204 @@ def classification_metrics(targets, preds, probs=None, labels=None):
     return acc, sens, spec, prec, f1, auc
 
 
+def _are_binary(targets, preds, labels=None):
+    """Return True if all the labels are 0 or 1."""
+    values = np.concatenate([np.ravel(targets), np.ravel(preds), np.ravel(labels if labels is not None else [])])
+    return bool(np.all((values == 0) | (values == 1)))
+
+
+def binary_confusion_counts(folds, targets, preds, n_folds=None):
+    """Return the confusion matrix of each fold of 0/1 labeled results,
+    all of them counted at once.
+
+    Parameters
+    ----------
+    folds: numpy array of ints
+        Fold index of each result, from 0 to n_folds - 1.
+
+    targets: numpy array of 0s and 1s
+
+    preds: numpy array of 0s and 1s
+
+    n_folds: int or None
+        If None, folds.max() + 1.
+
+    Returns
+    -------
+    numpy array
+        [n_folds x 4], the columns are the tn, fp, fn and tp counts.
+    """
+    if n_folds is None:
+        n_folds = int(folds.max()) + 1 if len(folds) else 0
+
+    cells = 4 * np.asarray(folds, dtype=int) + 2 * np.asarray(targets, dtype=int) + np.asarray(preds, dtype=int)
+    return np.bincount(cells, minlength=4 * n_folds).reshape(n_folds, 4)
+
+
+def rank_auc(folds, targets, scores, n_folds=None):
+    """Return the area under the ROC curve of the scores of each fold,
+    from the ranks of the scores as in the Mann-Whitney U statistic,
+    with ties counting one half. Folds with only one class get 0.
+
+    Parameters
+    ----------
+    folds: numpy array of ints
+
+    targets: numpy array of 0s and 1s
+
+    scores: numpy array of floats
+        Higher for the class 1.
+
+    n_folds: int or None
+
+    Returns
+    -------
+    numpy array
+        Size: n_folds
+    """
+    folds, targets, scores = np.asarray(folds, dtype=int), np.asarray(targets), np.asarray(scores, dtype=float)
+    if n_folds is None:
+        n_folds = int(folds.max()) + 1 if len(folds) else 0
+
+    order = np.lexsort((scores, folds))
+    folds, targets, scores = folds[order], targets[order], scores[order]
+
+    #average position of each run of tied scores, relative to the start of its fold
+    n      = len(scores)
+    starts = np.ones(n, dtype=bool)
+    starts[1:] = (folds[1:] != folds[:-1]) | (scores[1:] != scores[:-1])
+    tie_id     = np.cumsum(starts) - 1
+    tie_starts = np.nonzero(starts)[0]
+    tie_ends   = np.append(tie_starts[1:], n)
+    fold_start = np.searchsorted(folds, np.arange(n_folds))
+    ranks      = (tie_starts + tie_ends - 1)[tie_id] / 2. - fold_start[folds] + 1
+
+    n_pos = np.bincount(folds, weights=targets, minlength=n_folds)
+    n_neg = np.bincount(folds, minlength=n_folds) - n_pos
+    r_pos = np.bincount(folds, weights=ranks * targets, minlength=n_folds)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        auc = (r_pos - n_pos * (n_pos + 1) / 2.) / (n_pos * n_neg)
+    auc[(n_pos == 0) | (n_neg == 0)] = 0
+    return auc
+
+
+def stacked_classification_metrics(folds, targets, preds, scores=None, n_folds=None):
+    """Accuracy, Sensitivity, Specificity, Precision, F1-Score and
+    Area-under-ROC of the 0/1 labeled results of all the folds at once,
+    from their confusion matrices. The class 1 is the positive one.
+
+    Undefined measures are 0, as sklearn.metrics gives them.
+
+    Parameters
+    ----------
+    folds: numpy array of ints
+        Fold index of each result, from 0 to n_folds - 1.
+
+    targets: numpy array of 0s and 1s
+
+    preds: numpy array of 0s and 1s
+
+    scores: numpy array of floats or None
+        Scores of the class 1, e.g., its probabilities.
+        If given, the AUC is the one of the scores, see rank_auc.
+        If None, the one of preds, as roc_auc_score(targets, preds).
+
+    n_folds: int or None
+        If None, folds.max() + 1.
+
+    Returns
+    -------
+    numpy array
+        [n_folds x 6], the columns are acc, sens, spec, prec, f1, auc.
+    """
+    tn, fp, fn, tp = binary_confusion_counts(folds, targets, preds, n_folds).T.astype(float)
+
+    def ratio(num, den):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(den > 0, num / den, 0.)
+
+    acc  = ratio(tp + tn, tn + fp + fn + tp)
+    sens = ratio(tp, tp + fn)
+    spec = ratio(tn, tn + fp)
+    prec = ratio(tp, tp + fp)
+    f1   = ratio(2 * tp, 2 * tp + fp + fn)
+
+    if scores is not None:
+        auc = rank_auc(folds, targets, scores, len(tn))
+    else:
+        #the ROC curve of 0/1 scores has one point, (1 - spec, sens)
+        auc = np.where((tp + fn > 0) & (tn + fp > 0), (sens + spec) / 2., 0.)
+
+    return np.column_stack([acc, sens, spec, prec, f1, auc])
+
+
+def stack_cv_results(targets, preds):
+    """Concatenate the per-fold lists of results of enlist_cv_results.
+
+    Parameters
+    ----------
+    targets: list of arrays or scalars
+
+    preds: list of arrays or scalars
+
+    Returns
+    -------
+    folds, targets, preds
+        Numpy arrays with one element per result, folds has the fold index of each.
+    """
+    targets = [np.atleast_1d(t) for t in targets]
+    preds   = [np.atleast_1d(p) for p in preds]
+    folds   = np.repeat(np.arange(len(targets)), [len(t) for t in targets])
+
+    stack = lambda arrays: np.concatenate(arrays) if len(arrays) else np.zeros(0, dtype=int)
+    return folds, stack(targets), stack(preds)
+
+
+def repeated_cv_metrics(metrics, confidence=0.95):
+    """Mean, standard deviation and Student's t confidence interval of the
+    mean of the metrics of the repetitions of a cross-validation.
+
+    The interval only accounts for the variability of the estimates
+    between different splits of the same samples, not for the variability
+    between different samples of the population.
+
+    Parameters
+    ----------
+    metrics: array_like
+        [n_repeats x 6], the columns are acc, sens, spec, prec, f1, auc.
+
+    confidence: float
+        Between 0 and 1.
+
+    Returns
+    -------
+    mean, std, ci_low, ci_high
+        ClassificationMetrics. The interval is NaN with only one repetition.
+    """
+    from scipy.stats import t
+
+    metrics   = np.atleast_2d(np.asarray(metrics, dtype=float))
+    n_repeats = metrics.shape[0]
+    mean      = metrics.mean(axis=0)
+    std       = metrics.std(axis=0)
+
+    if n_repeats > 1:
+        half = t.ppf((1 + confidence) / 2., n_repeats - 1) * metrics.std(axis=0, ddof=1) / np.sqrt(n_repeats)
+    else:
+        half = np.nan * mean
+
+    return (ClassificationMetrics(*mean), ClassificationMetrics(*std),
+            ClassificationMetrics(*(mean - half)), ClassificationMetrics(*(mean + half)))
+
+
 def enlist_cv_results_from_dict(cv_targets, cv_preds, cv_probs=None):
     """Put cv_targets, cv_preds and cv_probs in lists for performance measures.
     Also returns the set of target labels.
 
+    The results of a leave-one-out as FoldArrays are returned as they
+    are stored, one array with one element per sample.
+
     Parameters
     ----------
     cv_targets: dict
@@ -124,6 +503,11 @@ def enlist_cv_results_from_dict(cv_targets, cv_preds, cv_probs=None):
     -------
     targets, preds, probs, labels
     """
+    if isinstance(cv_targets, FoldArrays) and isinstance(cv_preds, FoldArrays) \
+            and not cv_targets.stacked and np.all(cv_targets.fold_sizes == 1):
+        probs = np.asarray(cv_probs) if isinstance(cv_probs, FoldArrays) else None
+        return np.asarray(cv_targets), np.asarray(cv_preds), probs, list(np.unique(cv_targets))
+
     targets = []
     preds = []
     labels = set()
@@ -190,7 +574,7 @@ def enlist_cv_results(cv_targets, cv_preds, cv_probs=None):
     -------
     targets, preds, probs, labels
     """
-    if isinstance(cv_targets, dict):
+    if isinstance(cv_targets, Mapping):
         return enlist_cv_results_from_dict(cv_targets, cv_preds, cv_probs)
 
     else:
@@ -237,6 +621,15 @@ def get_cv_classification_metrics(cv_targets, cv_preds, cv_probs=None):
     array_like: metrics
     """
 
+    #all the folds in one pass over their stacked results
+    if isinstance(cv_targets, FoldArrays) and isinstance(cv_preds, FoldArrays) and not cv_targets.stacked:
+        folds, all_targets, all_preds = cv_targets.fold_index(), np.asarray(cv_targets), np.asarray(cv_preds)
+    else:
+        folds, all_targets, all_preds = stack_cv_results(*enlist_cv_results(cv_targets, cv_preds)[:2])
+
+    if _are_binary(all_targets, all_preds):
+        return stacked_classification_metrics(folds, all_targets, all_preds, n_folds=len(cv_targets))
+
     targets, preds, probs, labels = enlist_cv_results(cv_targets,
                                                       cv_preds,
                                                       cv_probs)
@@ -284,8 +677,10 @@ def get_cv_significance(cv_targets, cv_preds):
 
     See a better test here:
     http://scikit-learn.org/stable/auto_examples/plot_permutation_test_for_classification.html
+    and in ClassificationPipeline.permutation_test.
 
     """
+    from sklearn.metrics import confusion_matrix
 
     targets, preds, probs, labels = enlist_cv_results(cv_targets, cv_preds)
 
@@ -299,6 +694,61 @@ def get_cv_significance(cv_targets, cv_preds):
     return np.mean(signfs)
 
 
+def permutation_p_value(score, permutation_scores):
+    """Return the p-value of score against the scores of the permuted
+    labels, (C + 1) / (n_permutations + 1), where C is the number of
+    permutation scores at least as good as score.
+
+    Parameters
+    ----------
+    score: float
+
+    permutation_scores: array_like
+
+    Returns
+    -------
+    float
+    """
+    permutation_scores = np.asarray(permutation_scores)
+    return (np.sum(permutation_scores >= score) + 1.) / (len(permutation_scores) + 1.)
+
+
+def is_p_value_decided(n_greater, n_permutations, alpha=0.05, confidence=0.99):
+    """Return True if the p-value of a permutation test is clearly below
+    or above alpha: the Clopper-Pearson confidence interval of the
+    probability that a permutation scores at least as the true labels,
+    estimated from n_greater of n_permutations, does not contain alpha.
+
+    Parameters
+    ----------
+    n_greater: int
+        Number of permutation scores at least as good as the true one.
+
+    n_permutations: int
+
+    alpha: float
+        Significance level.
+
+    confidence: float
+        Confidence level of the interval. Each check is a new look at the
+        data, so it should be higher than 1 - alpha.
+
+    Returns
+    -------
+    bool
+    """
+    from scipy.stats import beta
+
+    if n_permutations == 0:
+        return False
+
+    tail = (1. - confidence) / 2.
+    low  = beta.ppf(tail, n_greater, n_permutations - n_greater + 1) if n_greater > 0 else 0.
+    high = beta.ppf(1. - tail, n_greater + 1, n_permutations - n_greater) if n_greater < n_permutations else 1.
+
+    return high < alpha or low > alpha
+
+
 def get_confusion_matrix_fisher_significance(table, alternative='two-sided'):
     """
     Returns the value of fisher_exact test on table.
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+
+#------------------------------------------------------------------------------
+#Authors:
+# Alexandre Manhaes Savio <alexsavio@gmail.com>
+# Grupo de Inteligencia Computational <www.ehu.es/ccwintco>
+# Neurita S.L.
+#
+# BSD 3-Clause License
+#
+# 2014, Alexandre Manhaes Savio
+# Use this at your own risk!
+#------------------------------------------------------------------------------
+"""
+Hyper-parameter search strategies for ClassificationPipeline.
+"""
+import math
+import logging
+import collections
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import BaseEstimator, clone
+
+from .instance import import_this
+
+log = logging.getLogger(__name__)
+
+SEARCH_METHODS = ['grid', 'randomized', 'halving']
+
+
+class SearchStats(collections.namedtuple('Search_Stats', ['fit_time', 'n_fits', 'n_candidates',
+                                                          'n_fit_samples'])):
+    """
+    Namedtuple to store the cost of the hyper-parameter search of one
+    cross-validation fold: wall-clock seconds, number of estimator fits
+    (including the final refit), number of candidates considered and
+    number of training samples summed over all the fits, or None if unknown.
+    """
+    pass
+
+
+CVScore = collections.namedtuple('CVScore', ['parameters', 'mean_validation_score',
+                                             'cv_validation_scores'])
+
+
+class SuccessiveHalvingSearchCV(BaseEstimator):
+    """Successive halving hyper-parameter search.
+
+    All the candidates of param_grid are first cross-validated on a small
+    stratified subset of the training samples. Only the best 1/factor of
+    them go on to the next round, which uses factor times more samples,
+    until one candidate is left or all the samples are used.
+    The best candidate is then refitted on all the samples.
+
+    It has the same interface as sklearn.grid_search.GridSearchCV,
+    grid_scores_ holds the scores of the last round.
+
+    Parameters
+    ----------
+    estimator: sklearn estimator
+
+    param_grid: dict or list of dicts
+
+    scoring: str or callable or None
+
+    n_jobs: int
+        Number of candidates cross-validated at the same time.
+
+    factor: int
+        Proportion of candidates discarded and of samples added in each round.
+
+    cv: int
+        Number of stratified folds used to score each candidate.
+
+    min_samples: int or None
+        Number of samples of the first round.
+        If None, it is chosen so the last round uses all the samples.
+
+    fit_params: dict or None
+        Parameters passed to the fit method of the estimator.
+
+    random_state: int, RandomState or None
+        Used to choose the subsets of samples.
+    """
+    def __init__(self, estimator, param_grid, scoring=None, n_jobs=1, factor=3, cv=3,
+                 min_samples=None, fit_params=None, random_state=None, verbose=0):
+        self.estimator    = estimator
+        self.param_grid   = param_grid
+        self.scoring      = scoring
+        self.n_jobs       = n_jobs
+        self.factor       = factor
+        self.cv           = cv
+        self.min_samples  = min_samples
+        self.fit_params   = fit_params
+        self.random_state = random_state
+        self.verbose      = verbose
+
+    def fit(self, X, y):
+        """Run the successive halving search on X and y and refit the best
+        candidate on all of them.
+
+        Parameters
+        ----------
+        X: array_like
+
+        y: vector
+
+        Returns
+        -------
+        self
+        """
+        ParameterGrid      = import_this('sklearn.grid_search.ParameterGrid')
+        check_random_state = import_this('sklearn.utils.check_random_state')
+
+        y          = np.asarray(y)
+        fit_params = self.fit_params or {}
+        candidates = list(ParameterGrid(self.param_grid))
+        n_samples  = len(y)
+        factor     = max(2, int(self.factor))
+
+        order     = stratified_order(y, check_random_state(self.random_state))
+        n_rounds  = int(math.ceil(math.log(len(candidates), factor))) if len(candidates) > 1 else 0
+        n_classes = len(np.unique(y))
+        if self.min_samples is None:
+            n_rsc = max(n_samples // factor**n_rounds, 2 * self.cv * n_classes)
+        else:
+            n_rsc = self.min_samples
+        n_rsc = min(n_rsc, n_samples)
+
+        self.n_candidates_  = len(candidates)
+        self.n_fits_        = 0
+        self.n_fit_samples_ = 0
+
+        parallel = Parallel(n_jobs=self.n_jobs, verbose=self.verbose)
+        while True:
+            rows   = order[:n_rsc]
+            scores = parallel(delayed(_cross_validate_candidate)(self.estimator, params, X[rows], y[rows],
+                                                                 self.scoring, self.cv, fit_params)
+                              for params in candidates)
+
+            self.n_fits_        += sum(len(s) for s in scores)
+            self.n_fit_samples_ += len(candidates) * (self.cv - 1) * n_rsc
+            self.grid_scores_  = [CVScore(params, np.mean(s), s) for params, s in zip(candidates, scores)]
+            log.debug('Successive halving: {} candidates on {} samples.'.format(len(candidates), n_rsc))
+
+            if n_rsc >= n_samples:
+                break
+
+            n_keep     = max(1, int(math.ceil(len(candidates) / float(factor))))
+            ranked     = sorted(self.grid_scores_, key=lambda score: score[1], reverse=True)
+            candidates = [score[0] for score in ranked[:n_keep]]
+            if len(candidates) == 1:
+                break
+
+            n_rsc = min(n_rsc * factor, n_samples)
+
+        best = max(self.grid_scores_, key=lambda score: score[1])
+
+        self.best_params_    = best[0]
+        self.best_score_     = best[1]
+        self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_)
+        self.best_estimator_.fit(X, y, **fit_params)
+        self.n_fits_        += 1
+        self.n_fit_samples_ += n_samples
+
+        return self
+
+    def predict(self, X):
+        return self.best_estimator_.predict(X)
+
+    def predict_proba(self, X):
+        return self.best_estimator_.predict_proba(X)
+
+    def decision_function(self, X):
+        return self.best_estimator_.decision_function(X)
+
+    def score(self, X, y):
+        return self.best_estimator_.score(X, y)
+
+
+def _cross_validate_candidate(estimator, params, X, y, scoring, cv, fit_params):
+    """Return the cross-validation scores of estimator with params on X and y."""
+    cross_val_score = import_this('sklearn.cross_validation.cross_val_score')
+    candidate = clone(estimator).set_params(**params)
+    return cross_val_score(candidate, X, y, scoring=scoring, cv=cv, fit_params=fit_params)
+
+
+def stratified_order(y, rng):
+    """Return a random permutation of the indices of y such that every
+    prefix of it has about the same class proportions as y.
+
+    Parameters
+    ----------
+    y: vector
+
+    rng: numpy.random.RandomState
+
+    Returns
+    -------
+    numpy array of ints
+    """
+    perm = rng.permutation(len(y))
+    rank = np.empty(len(y))
+    for label in np.unique(y):
+        idx = perm[y[perm] == label]
+        rank[idx] = (np.arange(len(idx)) + 0.5) / len(idx)
+
+    return np.argsort(rank, kind='mergesort')
+
+
+def count_candidates(param_grid, search_method='grid', n_iter=10):
+    """Return the number of candidates the first round of a search will fit.
+
+    Parameters
+    ----------
+    param_grid: dict or list of dicts
+
+    search_method: str
+        See get_search_method.
+
+    n_iter: int
+        Number of candidates of the randomized search.
+
+    Returns
+    -------
+    int
+    """
+    if not param_grid:
+        return 1
+
+    ParameterGrid = import_this('sklearn.grid_search.ParameterGrid')
+    n_candidates  = len(ParameterGrid(param_grid))
+    if search_method == 'randomized':
+        return min(n_iter, n_candidates)
+
+    return n_candidates
+
+
+def get_search_method(estimator, param_grid, search_method='grid', n_jobs=1, scoring=None,
+                      n_iter=10, factor=3, random_state=None):
+    """Create a hyper-parameter search object for estimator over param_grid.
+
+    Parameters
+    ----------
+    estimator: sklearn estimator
+
+    param_grid: dict
+
+    search_method: str
+        'grid': exhaustive sklearn.grid_search.GridSearchCV.
+        'randomized': sklearn.grid_search.RandomizedSearchCV with a budget
+            of n_iter candidates.
+        'halving': SuccessiveHalvingSearchCV on the number of samples.
+
+    n_jobs: int
+
+    scoring: str or callable or None
+
+    n_iter: int
+        Budget of candidates of the randomized search.
+        It is capped to the size of param_grid.
+
+    factor: int
+        Reduction factor of the successive halving search.
+
+    random_state: int, RandomState or None
+        Used by the randomized and the successive halving searches.
+
+    Returns
+    -------
+    search object
+    """
+    if search_method == 'grid':
+        GridSearchCV = import_this('sklearn.grid_search.GridSearchCV')
+        return GridSearchCV(estimator, param_grid, n_jobs=n_jobs, verbose=0, scoring=scoring)
+
+    elif search_method == 'randomized':
+        RandomizedSearchCV = import_this('sklearn.grid_search.RandomizedSearchCV')
+        n_iter = count_candidates(param_grid, search_method, n_iter)
+        return RandomizedSearchCV(estimator, param_grid, n_iter=n_iter, n_jobs=n_jobs, verbose=0,
+                                  scoring=scoring, random_state=random_state)
+
+    elif search_method == 'halving':
+        return SuccessiveHalvingSearchCV(estimator, param_grid, scoring=scoring, n_jobs=n_jobs,
+                                         factor=factor, random_state=random_state)
+
+    raise ValueError('Unknown search method {}, expected one of {}.'.format(search_method, SEARCH_METHODS))
+
+
+def get_search_stats(search, fit_time, n_samples=None):
+    """Return the SearchStats of a fitted search object.
+
+    Parameters
+    ----------
+    search: fitted search object
+        GridSearchCV, RandomizedSearchCV or SuccessiveHalvingSearchCV.
+
+    fit_time: float
+        Seconds that took to fit it.
+
+    n_samples: int or None
+        Number of samples it was fitted on. Needed for the n_fit_samples
+        of the searches that do not count them: every candidate of a
+        K-fold search is trained on (K - 1) * n_samples samples in total.
+
+    Returns
+    -------
+    SearchStats
+    """
+    grid_scores  = getattr(search, 'grid_scores_', [])
+    n_candidates = getattr(search, 'n_candidates_', len(grid_scores))
+    n_fits       = getattr(search, 'n_fits_', None)
+    if n_fits is None:
+        n_fits = sum(len(score[2]) for score in grid_scores) + 1
+
+    n_fit_samples = getattr(search, 'n_fit_samples_', None)
+    if n_fit_samples is None and n_samples is not None:
+        n_fit_samples = sum((len(score[2]) - 1) * n_samples for score in grid_scores) + n_samples
+
+    return SearchStats(fit_time, n_fits, n_candidates, n_fit_samples)
@@ -14,17 +14,10 @@
 
 import logging
 
-#cross-validation
-from sklearn.cross_validation import KFold
-from sklearn.cross_validation import LeaveOneOut
-from sklearn.cross_validation import StratifiedKFold
-
-#pipelining
-from sklearn.pipeline import Pipeline, FeatureUnion, make_pipeline, make_union
-
+import numpy as np
 
 #instances
-from darwin.instance import SelectorInstantiator, LearnerInstantiator
+from darwin.instance import SelectorInstantiator, LearnerInstantiator, import_this
 
 log = logging.getLogger(__name__)
 
@@ -77,7 +70,7 @@ def get_fsmethod(fsmethod):
         raise
 
 
-def get_cv_method(targets, cvmethod='10', stratified=True):
+def get_cv_method(targets, cvmethod='10', stratified=True, shuffle=False, random_state=None):
     """Creates a cross-validation object
 
     Parameters
@@ -91,10 +84,20 @@ def get_cv_method(targets, cvmethod='10', stratified=True):
     stratified: bool
         Indicates whether to use a Stratified K-fold approach
 
+    shuffle: bool
+        Shuffle the samples before splitting them in K folds.
+
+    random_state: int, RandomState or None
+        Seed of the shuffle.
+
     Returns
     -------
     Returns a class from sklearn.cross_validation
     """
+    KFold           = import_this('sklearn.cross_validation.KFold')
+    LeaveOneOut     = import_this('sklearn.cross_validation.LeaveOneOut')
+    StratifiedKFold = import_this('sklearn.cross_validation.StratifiedKFold')
+
     n = len(targets)
 
     if cvmethod == 'loo':
@@ -102,19 +105,65 @@ def get_cv_method(targets, cvmethod='10', stratified=True):
 
     if stratified:
         if isinstance(cvmethod, int):
-            return StratifiedKFold(targets, cvmethod)
+            return StratifiedKFold(targets, cvmethod, shuffle=shuffle, random_state=random_state)
         elif isinstance(cvmethod, str):
             if cvmethod.isdigit():
-                return StratifiedKFold(targets, int(cvmethod))
+                return StratifiedKFold(targets, int(cvmethod), shuffle=shuffle, random_state=random_state)
     else:
         if isinstance(cvmethod, int):
-            return KFold(n, cvmethod)
+            return KFold(n, cvmethod, shuffle=shuffle, random_state=random_state)
 
         elif isinstance(cvmethod, str):
             if cvmethod.isdigit():
-                return KFold(n, int(cvmethod))
+                return KFold(n, int(cvmethod), shuffle=shuffle, random_state=random_state)
+
+    return StratifiedKFold(targets, int(cvmethod), shuffle=shuffle, random_state=random_state)
+
+
+def get_repeated_cv_methods(targets, cvmethod='10', n_repeats=10, stratified=True, random_state=None):
+    """Creates the cross-validation objects of a repeated K-fold, one per
+    repetition, each one with the samples shuffled with its own seed.
+
+    Parameters
+    ----------
+    targets: list or vector
+
+    cvmethod: string or int
+        See get_cv_method, a leave-one-out can not be repeated.
+
+    n_repeats: int
+
+    stratified: bool
+
+    random_state: int, RandomState or None
+        Seed of the seeds of the repetitions.
+
+    Returns
+    -------
+    list of sklearn.cross_validation objects
+    """
+    check_random_state = import_this('sklearn.utils.check_random_state')
+
+    if cvmethod == 'loo':
+        raise ValueError('A leave-one-out gives the same folds in every repetition.')
+
+    rng   = check_random_state(random_state)
+    seeds = rng.randint(np.iinfo(np.int32).max, size=n_repeats)
+    return [get_cv_method(targets, cvmethod, stratified, shuffle=True, random_state=seed) for seed in seeds]
 
-    return StratifiedKFold(targets, int(cvmethod))
+
+def is_leave_one_out(cv):
+    """Return True if cv is a sklearn.cross_validation.LeaveOneOut.
+
+    Parameters
+    ----------
+    cv: cross-validation object
+
+    Returns
+    -------
+    bool
+    """
+    return isinstance(cv, import_this('sklearn.cross_validation.LeaveOneOut'))
 
 
 def get_pipeline(fsmethods, clfmethod):
@@ -134,6 +183,9 @@ def get_pipeline(fsmethods, clfmethod):
     -------
     pipe
     """
+    make_pipeline = import_this('sklearn.pipeline.make_pipeline')
+    make_union    = import_this('sklearn.pipeline.make_union')
+
     feat_union = None
     if not isinstance(fsmethods, list):
         if hasattr(fsmethods, 'transform'):
@@ -149,3 +201,49 @@ def get_pipeline(fsmethods, clfmethod):
         pipe = make_pipeline(feat_union, clfmethod)
 
     return pipe
+
+
+def get_ranked_param_grid(grid_scores, n_best=None):
+    """Return the candidates of a fitted grid search as a param_grid
+    ordered from the best to the worst mean validation score.
+
+    Parameters
+    ----------
+    grid_scores: list of (parameters, mean_validation_score, cv_validation_scores)
+        The grid_scores_ member of a fitted sklearn.grid_search.GridSearchCV.
+
+    n_best: int or None
+        If given, only the n_best first candidates are kept.
+
+    Returns
+    -------
+    list of dict
+        One single-candidate dict per parameter combination, to be used as
+        param_grid in a GridSearchCV. Ties keep their original order.
+    """
+    ranked = sorted(grid_scores, key=lambda score: score[1], reverse=True)
+    if n_best is not None:
+        ranked = ranked[:max(1, n_best)]
+
+    return [dict((name, [value]) for name, value in score[0].items()) for score in ranked]
+
+
+def fit_accepts(estimator, arg_name):
+    """Return True if the fit method of estimator has an argument called arg_name.
+
+    Parameters
+    ----------
+    estimator: sklearn estimator
+
+    arg_name: str
+
+    Returns
+    -------
+    bool
+    """
+    import inspect
+
+    if hasattr(inspect, 'signature'):
+        return arg_name in inspect.signature(estimator.fit).parameters
+
+    return arg_name in inspect.getargspec(estimator.fit).args
@@ -139,36 +139,55 @@ def find_histogram(vol, hist, mini, maxi, mask=None):
     ----------
     vol: ndarray
 
-    hist:
-    mini:
-    maxi:
-    mask:
+    hist: ndarray
+        Only its size, the number of bins, is used.
+
+    mini: float
+    maxi: float
+    mask: ndarray
 
     Returns
     -------
     hist, validsize
     """
-    validsize = 0
-    hist = np.zeros(hist.size, dtype=int)
-    if mini == maxi:
-        return -1
-
-    fA = float(hist.size)/(maxi-mini)
-    fB = (float(hist.size)*float(-mini)) / (maxi-mini)
-
     if mask is None:
-        a = vol.flatten()
+        a = vol.ravel()
     else:
-        a = vol[mask > 0.5].flatten()
+        a = vol[mask > 0.5]
+
+    return values_histogram(a, hist.size, mini, maxi)
+
 
-    a = a.astype(int) * fA + fB
-    h = hist.size - 1
+def values_histogram(values, n_bins, mini, maxi):
+    """Histogram of the values within [mini, maxi] in n_bins bins.
+    Values out of the range are counted in the first or last bin.
 
-    for i in np.arange(a.size):
-        hist[max(0, min(a[i], h))] += 1
-        validsize += 1
+    Parameters
+    ----------
+    values: ndarray
+        Flat array of values
 
-    return hist, validsize
+    n_bins: int
+
+    mini: float
+
+    maxi: float
+
+    Returns
+    -------
+    hist, validsize
+    """
+    if mini == maxi:
+        return np.zeros(n_bins, dtype=int), 0
+
+    fA = float(n_bins)/(maxi-mini)
+    fB = (float(n_bins)*float(-mini)) / (maxi-mini)
+
+    bins = values * fA + fB
+    np.clip(bins, 0, n_bins - 1, out=bins)
+
+    hist = np.bincount(bins.astype(int), minlength=n_bins)
+    return hist, values.size
 
 
 def is_symmetric(mat):
@@ -223,9 +242,21 @@ def percentile_threshold(distances, thr=95):
     return sels
 
 
+def _cumulative_bins(hist, count):
+    """Return how many bins of hist, minus one, have to be added up to reach count.
+    It is -1 if count <= 0 and len(hist) - 1 if count is never reached."""
+    if count <= 0:
+        return -1
+
+    return min(np.searchsorted(np.cumsum(hist), count), len(hist) - 1)
+
+
 def find_thresholds(vol, mask=None):
     """For robust limits calculation
 
+    The masked values are extracted once, then each of the (at most 10)
+    histogram refinements is one vectorized pass over them.
+
     Parameters
     ----------
     vol: array_like
@@ -237,11 +268,9 @@ def find_thresholds(vol, mask=None):
     minval, maxval
     """
     hist_bins   = 1000
-    hist        = np.zeros(hist_bins, dtype=int)
     max_jumps   = 10
     top_bin     = 0
     bottom_bin  = 0
-    count       = 0
     jump        = 1
     lowest_bin  = 0
     highest_bin = hist_bins-1
@@ -251,11 +280,16 @@ def find_thresholds(vol, mask=None):
     thresh2  = float(0)
 
     if mask is None:
-        mini = vol.min()
-        maxi = vol.max()
+        values = vol.ravel()
+        vmin   = values.min()
+        vmax   = values.max()
     else:
-        mini = vol[mask > 0].min()
-        maxi = vol[mask > 0].max()
+        values = vol[mask > 0.5]
+        vmin   = vol[mask > 0].min()
+        vmax   = vol[mask > 0].max()
+
+    mini = vmin
+    maxi = vmax
 
     while jump == 1 or ((float(thresh98) - thresh2) < (maxi - mini)/10.):
         if jump > 1:
@@ -267,47 +301,27 @@ def find_thresholds(vol, mask=None):
             mini = tmpmin
 
         if jump == max_jumps or mini == maxi:
-            if mask is None:
-                mini = vol.min()
-                maxi = vol.max()
-            else:
-                mini = vol[mask > 0].min()
-                maxi = vol[mask > 0].max()
+            mini = vmin
+            maxi = vmax
 
-        hist, validsize = find_histogram(vol, hist, mini, maxi, mask)
+        hist, validsize = values_histogram(values, hist_bins, mini, maxi)
 
         if validsize < 1:
-            thresh2 = mini
-            thresh98 = maxi
             minval = mini
             maxval = maxi
             return minval, maxval
 
         if jump == max_jumps:
-            validsize -= np.round(hist[lowest_bin]) + np.round(hist[highest_bin])
+            validsize -= hist[lowest_bin] + hist[highest_bin]
             lowest_bin += 1
             highest_bin -= 1
 
-        if validsize < 0:
-            thresh2 = mini
-            thresh98 = mini
-
         fA = (maxi-mini)/float(hist_bins)
 
-        count = 0
-        bottom_bin = lowest_bin
-        while count < float(validsize)/50:
-            count += np.round(hist[bottom_bin])
-            bottom_bin += 1
-        bottom_bin -= 1
+        bottom_bin = lowest_bin + _cumulative_bins(hist[lowest_bin:], float(validsize)/50)
         thresh2 = mini + float(bottom_bin) * fA
 
-        count = 0
-        top_bin = highest_bin
-        while count < float(validsize)/50:
-            count += np.round(hist[top_bin])
-            top_bin -= 1
-        top_bin += 1
+        top_bin = highest_bin - _cumulative_bins(hist[highest_bin::-1], float(validsize)/50)
         thresh98 = mini + (float(top_bin) + 1) * fA
 
         if jump == max_jumps:
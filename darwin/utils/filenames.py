@@ -12,6 +12,7 @@
 import os
 import os.path as op
 import sys
+import hashlib
 import tempfile
 import numpy as np
 import logging
@@ -439,3 +440,30 @@ def fileobj_size(file_obj):
     """
     file_obj.seek(0, os.SEEK_END)
     return file_obj.tell()
+
+
+def file_hash(filepath, hasher=None, block_size=2**20):
+    """Returns the hex digest of the contents of the file
+
+    Parameters
+    ----------
+    filepath: str
+
+    hasher: hashlib hash object
+        If None, will use hashlib.md5()
+
+    block_size: int
+        Number of bytes read at once
+
+    Returns
+    -------
+    str
+    """
+    if hasher is None:
+        hasher = hashlib.md5()
+
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            hasher.update(block)
+
+    return hasher.hexdigest()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers to share a CPU budget between nested parallel jobs.
+"""
+import logging
+import collections
+import multiprocessing
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+
+class CoreAllocation(collections.namedtuple('Core_Allocation',
+                                            ['n_cpus', 'fold_jobs', 'gs_jobs', 'blas_threads'])):
+    """
+    Namedtuple to store how a CPU budget is split between the outer CV folds,
+    the grid search candidates inside each fold and the BLAS threads of each
+    grid search job. blas_threads is None if they can't be limited.
+    """
+    def __str__(self):
+        blas_threads = 'default' if self.blas_threads is None else self.blas_threads
+        return '{} CPUs: {} parallel folds x {} grid search jobs x {} BLAS threads.'.format(self.n_cpus,
+                                                                                          self.fold_jobs,
+                                                                                          self.gs_jobs,
+                                                                                          blas_threads)
+
+
+def get_n_cpus(n_cpus=-1):
+    """Return the number of CPUs meant by n_cpus, joblib style.
+
+    Parameters
+    ----------
+    n_cpus: int
+        Positive values are returned as they are.
+        -1 means all the CPUs, -2 all the CPUs but one, and so on.
+
+    Returns
+    -------
+    int
+    """
+    if n_cpus is None:
+        return 1
+
+    if n_cpus < 0:
+        n_cpus = multiprocessing.cpu_count() + 1 + n_cpus
+
+    return max(1, n_cpus)
+
+
+def plan_core_allocation(n_cpus, n_folds, n_candidates, n_fold_jobs=None, nested_jobs=True):
+    """Split a total budget of n_cpus between outer folds, grid search
+    candidates and BLAS threads, so that fold_jobs * gs_jobs * blas_threads
+    does not go over n_cpus.
+
+    Folds are the coarsest unit of work, so they get the cores first.
+    What they can't use goes to the grid search and what is left, to BLAS.
+    If BLAS threads can't be limited, see can_limit_blas_threads,
+    blas_threads is None.
+
+    Parameters
+    ----------
+    n_cpus: int
+        Total number of CPUs. See get_n_cpus.
+
+    n_folds: int
+        Number of outer cross-validation folds.
+
+    n_candidates: int
+        Number of parameter combinations in the grid search.
+
+    n_fold_jobs: int or None
+        Number of folds to run at the same time. It is capped to n_cpus.
+        If None, will be chosen from the budget.
+
+    nested_jobs: bool
+        False if the parallel folds run in worker processes, where joblib
+        runs the grid search jobs one after the other. The cores left by the
+        folds then go to BLAS instead.
+
+    Returns
+    -------
+    CoreAllocation
+    """
+    n_cpus       = get_n_cpus(n_cpus)
+    n_folds      = max(1, n_folds)
+    n_candidates = max(1, n_candidates)
+
+    if n_fold_jobs is None:
+        fold_jobs = min(n_folds, n_cpus)
+    else:
+        fold_jobs = min(get_n_cpus(n_fold_jobs), n_folds, n_cpus)
+
+    if fold_jobs > 1 and not nested_jobs:
+        gs_jobs  = 1
+    else:
+        gs_jobs  = max(1, min(n_candidates, n_cpus // fold_jobs))
+
+    blas_threads = max(1, n_cpus // (fold_jobs * gs_jobs)) if can_limit_blas_threads() else None
+
+    return CoreAllocation(n_cpus, fold_jobs, gs_jobs, blas_threads)
+
+
+def can_limit_blas_threads():
+    """Return True if threadpoolctl is installed. The BLAS libraries read
+    their environment variables when they are loaded, so without it the
+    number of BLAS threads of this process and of its forked workers can't
+    be changed."""
+    try:
+        import threadpoolctl
+    except ImportError:
+        return False
+    return True
+
+
+@contextmanager
+def limit_blas_threads(n_threads):
+    """Context manager that limits the number of threads used by BLAS
+    with threadpoolctl.
+
+    The limit is global to the process: with threads, set it once around
+    the work of all of them, not inside each one. Worker processes have to
+    set their own.
+
+    Parameters
+    ----------
+    n_threads: int or None
+        If None, or threadpoolctl is not installed, nothing is done.
+    """
+    if n_threads is None or not can_limit_blas_threads():
+        yield
+        return
+
+    from threadpoolctl import threadpool_limits
+    with threadpool_limits(limits=n_threads, user_api='blas'):
+        yield
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+import pytest
+from sklearn import datasets
+
+
+@pytest.fixture
+def gaussian_data():
+    """Function returning two gaussian quantile classes of n_samples with 10 features."""
+    def make_data(n_samples=60):
+        return datasets.make_gaussian_quantiles(mean=None, cov=1.0, n_samples=n_samples, n_features=10,
+                                                n_classes=2, shuffle=True, random_state=1)
+    return make_data
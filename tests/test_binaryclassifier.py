@@ -1,7 +1,9 @@
 
+import numpy as np
 from sklearn import datasets
 
 from darwin.pipeline import ClassificationPipeline
+from darwin.results import FoldArrays
 
 
 def test_binary_classification_with_classification_pipeline():
@@ -28,3 +30,206 @@ def test_binary_classification_with_classification_pipeline():
 #     inst = instance.LearnerInstantiator()
 #     learner_item_name = 'LinearSVC'
 #     classifier, param_grid = inst.get_method_with_grid(learner_item_name)
+
+
+def test_parallel_folds_give_same_results(gaussian_data):
+    x, y = gaussian_data()
+
+    seq_pipe = ClassificationPipeline(clfmethod='LinearSVC', cvmethod='5')
+    par_pipe = ClassificationPipeline(clfmethod='LinearSVC', cvmethod='5', n_cpus=2, n_fold_jobs=2)
+
+    seq_results, _ = seq_pipe.cross_validation(x, y)
+    par_results, _ = par_pipe.cross_validation(x, y)
+
+    assert(list(seq_results.predictions.keys()) == list(par_results.predictions.keys()))
+    for fold in seq_results.predictions:
+        assert((seq_results.predictions[fold] == par_results.predictions[fold]).all())
+        assert(seq_results.best_parameters[fold] == par_results.best_parameters[fold])
+
+
+def test_warm_start_prunes_candidates(gaussian_data):
+    x, y = gaussian_data()
+
+    pipe = ClassificationPipeline(clfmethod='LinearSVC', cvmethod='5', n_cpus=2,
+                                  warm_start=True, warm_start_n_best=2)
+    results, metrics = pipe.cross_validation(x, y)
+
+    assert(pipe.core_plan.fold_jobs == 1)
+    assert(len(results.best_parameters) == 5)
+
+    #after the first fold, only the 2 best candidates of the previous ones are searched
+    later_cs = set(params['C'] for params in list(results.best_parameters.values())[1:])
+    assert(len(later_cs) <= 2)
+
+
+def test_warm_start_without_pruning_runs_folds_in_parallel(gaussian_data):
+    x, y = gaussian_data()
+
+    cold_pipe = ClassificationPipeline(clfmethod='LinearSVC', cvmethod='5', n_cpus=2)
+    warm_pipe = ClassificationPipeline(clfmethod='LinearSVC', cvmethod='5', n_cpus=2, warm_start=True)
+
+    cold_results, _ = cold_pipe.cross_validation(x, y)
+    warm_results, _ = warm_pipe.cross_validation(x, y)
+
+    #nothing is carried to the next fold, so the folds are not serialized
+    assert(warm_pipe.core_plan.fold_jobs == cold_pipe.core_plan.fold_jobs == 2)
+    for fold in cold_results.predictions:
+        assert((cold_results.predictions[fold] == warm_results.predictions[fold]).all())
+
+
+def test_warm_start_with_coef_init(gaussian_data):
+    x, y = gaussian_data()
+
+    pipe = ClassificationPipeline(clfmethod='Perceptron', cvmethod='5', warm_start=True)
+    results, metrics = pipe.cross_validation(x, y)
+
+    assert(len(results.predictions) == 5)
+    assert(all(params is not None for params in results.best_parameters.values()))
+
+
+def test_results_are_fold_arrays(gaussian_data):
+    x, y = gaussian_data()
+
+    pipe = ClassificationPipeline(clfmethod='RBFSVC', cvmethod='5')
+    results, metrics = pipe.cross_validation(x, y)
+
+    assert(isinstance(results.predictions, FoldArrays) and isinstance(results.cv_targets, FoldArrays))
+    assert(np.asarray(results.predictions).shape == (60,))
+    assert(np.asarray(results.probabilities).shape == (60, 2))
+    #the support vectors of all the folds, one after the other
+    importance = results.features_importance
+    assert(np.asarray(importance).shape == (importance.fold_sizes.sum(), 10))
+    assert(np.isclose(metrics[0].accuracy, np.mean(np.asarray(results.predictions) == np.asarray(results.cv_targets))))
+
+
+def test_search_methods(gaussian_data):
+    x, y = gaussian_data(90)
+
+    n_fits, cost = {}, {}
+    for search_method in ['grid', 'randomized', 'halving']:
+        pipe = ClassificationPipeline(clfmethod='RBFSVC', cvmethod='3', search_method=search_method,
+                                      search_n_iter=5, random_state=0)
+        results, metrics = pipe.cross_validation(x, y)
+
+        assert(len(results.best_parameters) == 3)
+        assert(list(pipe.fold_stats.keys()) == list(results.predictions.keys()))
+        assert(all(stats.fit_time > 0 for stats in pipe.fold_stats.values()))
+        n_fits[search_method] = sum(stats.n_fits for stats in pipe.fold_stats.values())
+        cost  [search_method] = sum(stats.n_fit_samples for stats in pipe.fold_stats.values())
+
+    assert(n_fits['randomized'] < n_fits['grid'])
+    assert(cost['randomized'] < cost['grid'])
+    #the halving search fits more times, but most of them on a few samples
+    assert(cost['halving'] < cost['grid'])
+
+
+def test_scaling_from_fold_statistics(gaussian_data):
+    from sklearn.preprocessing import StandardScaler
+
+    class RefittedScaler(StandardScaler):
+        pass
+
+    x, y = gaussian_data()
+    x[3, 2] = x[10, 5] = float('nan')
+
+    stats_results, _ = ClassificationPipeline(clfmethod='LinearSVC', cvmethod='5').cross_validation(x, y)
+    refit_results, _ = ClassificationPipeline(clfmethod='LinearSVC', cvmethod='5',
+                                              scaler=RefittedScaler()).cross_validation(x, y)
+
+    for fold in stats_results.predictions:
+        assert((stats_results.predictions[fold] == refit_results.predictions[fold]).all())
+        assert(stats_results.best_parameters[fold] == refit_results.best_parameters[fold])
+
+
+def test_imputation_stats(gaussian_data):
+    x, y = gaussian_data()
+
+    pipe = ClassificationPipeline(clfmethod='LinearSVC', cvmethod='5')
+    clean_results, _ = pipe.cross_validation(x, y)
+    assert(clean_results.imputation_stats.n_imputed == 0)
+    assert(clean_results.imputation_stats.imputed_folds == 0)
+    assert(clean_results.imputation_stats.skipped_folds == 5)
+
+    x[3, 2] = x[10, 5] = x[11, 5] = float('nan')
+    results, _ = pipe.cross_validation(x, y)
+    assert(list(results.imputation_stats.nan_counts[[2, 5]]) == [1, 2])
+    assert(results.imputation_stats.n_imputed == 3 * 5)
+    assert(results.imputation_stats.imputed_folds == 5)
+    assert(pipe.imputation_stats.n_imputed == results.imputation_stats.n_imputed)
+    assert(clean_results.imputation_stats.n_imputed == 0)
+
+    #each repetition and the permutation test report their own folds
+    repeated = pipe.repeated_cross_validation(x, y, n_repeats=2, random_state=0)
+    assert(all(result.imputation_stats.n_imputed == 3 * 5 for result in repeated.results))
+    assert(pipe.imputation_stats.n_imputed == 3 * 5 * 2)
+
+    test = pipe.permutation_test(x, y, n_permutations=2, random_state=0)
+    assert(test.imputation_stats.n_imputed == 3 * 5)
+
+
+def test_float32_pipeline_matches_float64(gaussian_data):
+    x, y = gaussian_data()
+
+    #the same rounded data, only the fold copies and their scaling are float32
+    x32 = x.astype(np.float32)
+    results64, metrics64 = ClassificationPipeline(clfmethod='LinearSVC', cvmethod='5').cross_validation(
+        x32.astype(np.float64), y)
+    results32, metrics32 = ClassificationPipeline(clfmethod='LinearSVC', cvmethod='5',
+                                                  dtype=np.float32).cross_validation(x32, y)
+
+    for fold in results64.predictions:
+        assert((results64.predictions[fold] == results32.predictions[fold]).all())
+        assert(results64.best_parameters[fold] == results32.best_parameters[fold])
+    assert(np.allclose(metrics64[0], metrics32[0], rtol=1e-4))
+
+
+def test_sparse_samples_match_dense(gaussian_data):
+    import scipy.sparse as sp
+    from sklearn.preprocessing import StandardScaler
+
+    x, y = gaussian_data()
+    x[np.abs(x) < 0.5] = 0
+    x[3, 2] = float('nan')
+
+    dense_pipe  = ClassificationPipeline(clfmethod='LinearSVC', cvmethod='5', scaler=StandardScaler(with_mean=False))
+    sparse_pipe = ClassificationPipeline(clfmethod='LinearSVC', cvmethod='5', scaler=StandardScaler(with_mean=False))
+
+    dense_results, _  = dense_pipe.cross_validation(x, y)
+    sparse_results, _ = sparse_pipe.cross_validation(sp.csr_matrix(x), y)
+
+    assert(sparse_pipe.imputation_stats.n_imputed == dense_pipe.imputation_stats.n_imputed)
+    for fold in dense_results.predictions:
+        assert((dense_results.predictions[fold] == sparse_results.predictions[fold]).all())
+        assert(dense_results.best_parameters[fold] == sparse_results.best_parameters[fold])
+
+
+def test_repeated_cross_validation(gaussian_data):
+    x, y = gaussian_data()
+
+    pipe     = ClassificationPipeline(clfmethod='LinearSVC', cvmethod='5', n_cpus=2)
+    repeated = pipe.repeated_cross_validation(x, y, n_repeats=3, random_state=0)
+
+    #all the folds of the repetitions in one run
+    assert(len(pipe.fold_stats) == 15)
+    assert(len(repeated.results) == 3 and repeated.metrics.shape == (3, 6))
+    assert(repeated.ci_low.accuracy <= repeated.mean.accuracy <= repeated.ci_high.accuracy)
+
+    #each repetition is a cross-validation of its own folds
+    results, metrics = pipe.cross_validation(x, y, repeated.results[1].cv_folds)
+    for fold in results.predictions:
+        assert((results.predictions[fold] == repeated.results[1].predictions[fold]).all())
+    assert(np.allclose(metrics[0], repeated.metrics[1]))
+
+
+def test_permutation_test_batches():
+    x, y = datasets.make_classification(n_samples=40, n_features=10, n_informative=3, random_state=0)
+
+    pipe   = ClassificationPipeline(clfmethod='LinearSVC', cvmethod='3')
+    tests  = [pipe.permutation_test(x, y, n_permutations=6, batch_size=batch_size, random_state=0,
+                                    early_stopping=False) for batch_size in [1, 4]]
+
+    #the permutations do not depend on the batches
+    assert(tests[0].n_permutations == tests[1].n_permutations == 6)
+    assert(np.allclose(tests[0].permutation_scores, tests[1].permutation_scores))
+    assert(tests[0].score == tests[1].score == pipe.result_metrics()[0].accuracy)
+    assert(np.isclose(tests[0].p_value, (np.sum(tests[0].permutation_scores >= tests[0].score) + 1) / 7.))
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import os
+import os.path as op
+import numpy as np
+import nibabel as nib
+
+from darwin import data_io
+from darwin.data_io import load_data, load_data_cached
+
+
+def make_cohort(dirpath, n_subjs=6, shape=(5, 6, 7), seed=0):
+    """Write n_subjs random NIfTI images, a mask and a subjects list in dirpath.
+    Return the paths to the subjects list and the mask, and the images data."""
+    rng    = np.random.RandomState(seed)
+    affine = np.eye(4)
+
+    mask = (rng.rand(*shape) > 0.5).astype(np.uint8)
+    maskf = op.join(dirpath, 'mask.nii')
+    nib.save(nib.Nifti1Image(mask, affine), maskf)
+
+    data  = rng.rand(n_subjs, *shape).astype(np.float32)
+    lines = []
+    for i in range(n_subjs):
+        imf = op.join(dirpath, 'subj{}.nii'.format(i))
+        nib.save(nib.Nifti1Image(data[i], affine), imf)
+        lines.append('{}:{}\n'.format(imf, i % 2))
+
+    subjsf = op.join(dirpath, 'subjects.txt')
+    with open(subjsf, 'w') as f:
+        f.writelines(lines)
+
+    return subjsf, maskf, data, mask
+
+
+def test_load_data(tmpdir):
+    subjsf, maskf, data, mask = make_cohort(str(tmpdir))
+
+    x, y, scores, imgsiz, msk, indices = load_data(subjsf, '', maskf)
+
+    assert(imgsiz == mask.shape)
+    assert(x.dtype == np.float32)
+    assert(np.array_equal(x, data[:, mask > 0]))
+    assert(np.array_equal(y, [0, 1, 0, 1, 0, 1]))
+
+
+def test_load_data_dtype(tmpdir):
+    subjsf, maskf, data, mask = make_cohort(str(tmpdir))
+
+    x = load_data(subjsf, '', maskf, dtype=np.float64)[0]
+
+    assert(x.dtype == np.float64)
+    assert(np.array_equal(x, data[:, mask > 0]))
+
+
+def test_load_data_threads_and_memmap(tmpdir):
+    subjsf, maskf, data, mask = make_cohort(str(tmpdir), n_subjs=9)
+    outf = str(tmpdir.join('x.npy'))
+
+    x = load_data(subjsf, '', maskf, n_jobs=3, out_file=outf)[0]
+
+    assert(isinstance(x, np.memmap))
+    assert(np.array_equal(x, data[:, mask > 0]))
+    assert(np.array_equal(np.load(outf), data[:, mask > 0]))
+
+
+def test_load_data_cached(tmpdir, monkeypatch):
+    subjsf, maskf, data, mask = make_cohort(str(tmpdir.mkdir('data')))
+    cache_dir = str(tmpdir.mkdir('cache'))
+
+    reads = []
+    read_masked_voxels = data_io.read_masked_voxels
+
+    def counting_read(imf, *args, **kwargs):
+        reads.append(imf)
+        return read_masked_voxels(imf, *args, **kwargs)
+
+    monkeypatch.setattr(data_io, 'read_masked_voxels', counting_read)
+
+    x, y = load_data_cached(subjsf, '', maskf, cache_dir)[:2]
+    assert(len(reads) == 6)
+    assert(np.array_equal(x, data[:, mask > 0]))
+
+    #nothing changed
+    x2, y2 = load_data_cached(subjsf, '', maskf, cache_dir)[:2]
+    assert(len(reads) == 6)
+    assert(np.array_equal(x2, x))
+    assert(np.array_equal(y2, y))
+
+    #one subject changed
+    changed = op.join(op.dirname(subjsf), 'subj2.nii')
+    nib.save(nib.Nifti1Image(data[2] + 1, np.eye(4)), changed)
+    os.utime(changed, (1, 1))
+
+    x3 = load_data_cached(subjsf, '', maskf, cache_dir)[0]
+    assert(reads[6:] == [changed])
+
+    expected = data[:, mask > 0]
+    expected[2] += 1
+    assert(np.array_equal(x3, expected))
+
+    #another cohort with the same mask, both stay cached
+    with open(subjsf) as f:
+        lines = f.readlines()
+    other_subjsf = op.join(op.dirname(subjsf), 'other_subjects.txt')
+    with open(other_subjsf, 'w') as f:
+        f.writelines([lines[idx] for idx in [0, 2, 5]])
+
+    for _ in range(2):
+        x4 = load_data_cached(other_subjsf, '', maskf, cache_dir)[0]
+        x5 = load_data_cached(subjsf, '', maskf, cache_dir)[0]
+        assert(len(reads) == 7)
+        assert(np.array_equal(x4, expected[[0, 2, 5]]) and np.array_equal(x5, expected))
+
+
+def test_read_masked_voxels_of_scaled_image(tmpdir):
+    rng     = np.random.RandomState(0)
+    data    = rng.randint(-100, 100, size=(5, 6, 7)).astype(np.int16)
+    indices = np.where(rng.rand(5, 6, 7) > 0.5)
+
+    for ext in ['.nii', '.nii.gz']:
+        img = nib.Nifti1Image(data, np.eye(4))
+        img.header.set_slope_inter(0.5, 10.)
+        imf = str(tmpdir.join('scaled' + ext))
+        nib.save(img, imf)
+
+        voxels = data_io.read_masked_voxels(imf, indices, data.shape)
+        assert(np.allclose(voxels, data[indices] * 0.5 + 10.))
+        assert(np.allclose(voxels, np.asanyarray(nib.load(imf).dataobj)[indices]))
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import scipy.sparse as sp
+import scipy.stats as stats
+
+from darwin.distance import (pearson_correlation, distance_computation,
+                             class_moments, bhattacharyya_dist, welch_ttest,
+                             PearsonCorrelationDistance, WelchTestDistance,
+                             BhatacharyyaGaussianDistance)
+
+
+def pearsonr_loop(x, y):
+    r = np.array([stats.pearsonr(x[:, i], y)[0] for i in range(x.shape[1])])
+    r[np.isnan(r)] = 0
+    return r
+
+
+def make_data(n_samples=40, n_feats=300, seed=0):
+    rng = np.random.RandomState(seed)
+    y = rng.randint(0, 2, n_samples)
+    x = rng.randn(n_samples, n_feats) + 100 * y[:, np.newaxis] * rng.rand(n_feats)
+    x[:, 5] = 3.  # constant feature
+    return x, y
+
+
+def test_pearson_correlation_equals_loop():
+    x, y = make_data()
+    assert(np.allclose(pearson_correlation(x, y), pearsonr_loop(x, y), rtol=0, atol=1e-12))
+
+
+def test_pearson_correlation_chunks():
+    x, y = make_data()
+    whole = pearson_correlation(x, y)
+    for chunk_size in [1, 7, 299, 1000]:
+        assert(np.allclose(pearson_correlation(x, y, chunk_size=chunk_size), whole, rtol=0, atol=1e-14))
+
+
+def test_distance_computation_pearsonr():
+    x, y = make_data()
+    assert(np.allclose(distance_computation(x, y, stats.pearsonr), pearsonr_loop(x, y)))
+
+
+def test_pearson_distance_measure():
+    x, y = make_data()
+    dist = PearsonCorrelationDistance().fit(x, y)
+    assert(dist.scores_.shape == (x.shape[1], ))
+    assert(dist.scores_[5] == 0)
+
+
+def pairwise_loop(x, y, pair_func):
+    classes = np.unique(y)
+    b = np.zeros(x.shape[1])
+    for i in classes:
+        for j in classes[classes > i]:
+            d = pair_func(x[y == i, :], x[y == j, :])
+            d[np.isnan(d)] = 0
+            d[np.isinf(d)] = 0
+            b = np.maximum(b, d)
+    return b
+
+
+def bhattacharyya_pair(xi, xj):
+    mi, mj = xi.mean(axis=0), xj.mean(axis=0)
+    vi, vj = xi.var(axis=0), xj.var(axis=0)
+    si, sj = xi.std(axis=0), xj.std(axis=0)
+    return 0.25 * (np.square(mi - mj) / (vi + vj)) + 0.5 * (np.log((vi + vj) / (2*si*sj)))
+
+
+def welch_pair(xi, xj):
+    mi, mj = xi.mean(axis=0), xj.mean(axis=0)
+    vi, vj = xi.var(axis=0), xj.var(axis=0)
+    return (mi - mj) / np.sqrt((np.square(vi) / len(xi)) + (np.square(vj) / len(xj)))
+
+
+def make_multiclass_data(n_samples=60, n_feats=200, n_classes=3, seed=0):
+    rng = np.random.RandomState(seed)
+    y = np.arange(n_samples) % n_classes
+    x = 1000 + rng.randn(n_samples, n_feats) * (1 + y[:, np.newaxis]) + y[:, np.newaxis] * rng.rand(n_feats)
+    return x, y
+
+
+def test_class_moments():
+    x, y = make_multiclass_data()
+    moments = class_moments(x, y)
+    for c in moments.classes:
+        assert(np.allclose(moments.means[c], x[y == c].mean(axis=0)))
+        assert(np.allclose(moments.variances[c], x[y == c].var(axis=0)))
+        assert(moments.counts[c] == np.sum(y == c))
+
+
+def test_bhattacharyya_and_welch_equal_pairwise_loop():
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for n_classes in [2, 3, 4]:
+            x, y = make_multiclass_data(n_classes=n_classes)
+            assert(np.allclose(bhattacharyya_dist(x, y), pairwise_loop(x, y, bhattacharyya_pair)))
+            assert(np.allclose(welch_ttest(x, y), pairwise_loop(x, y, welch_pair)))
+
+
+def test_feature_constant_in_one_class():
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x, y = make_multiclass_data(n_classes=2)
+        x[y == 0, 3] = 0.
+        x[y == 1, 4] = 1000.
+
+        moments = class_moments(x, y)
+        assert(moments.variances[0, 3] == 0 and moments.variances[1, 4] == 0)
+        assert(not moments.constant[3] and not moments.constant[4])
+        assert(np.allclose(bhattacharyya_dist(x, y), pairwise_loop(x, y, bhattacharyya_pair)))
+        assert(np.allclose(welch_ttest(x, y), pairwise_loop(x, y, welch_pair)))
+
+
+def test_partial_fit_equals_fit():
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x, y = make_multiclass_data(n_samples=90, n_classes=3)
+        x[:, 7] = 0.1  # constant feature
+        for dist_cls in [PearsonCorrelationDistance, WelchTestDistance, BhatacharyyaGaussianDistance]:
+            whole = dist_cls().fit(x, y).scores_
+
+            batches = [(x[i:i + 20], y[i:i + 20]) for i in range(0, len(y), 20)]
+            streamed = dist_cls().fit_batches(batches).scores_
+
+            assert(np.allclose(whole, streamed, rtol=1e-9, atol=1e-12))
+            assert(streamed[7] == 0)
+
+
+def test_partial_fit_new_class_in_later_batch():
+    x, y = make_multiclass_data(n_samples=60, n_classes=3)
+    order = np.argsort(y, kind='mergesort')
+    x, y = x[order], y[order]
+
+    dist = BhatacharyyaGaussianDistance()
+    for i in range(0, len(y), 15):
+        dist.partial_fit(x[i:i + 15], y[i:i + 15])
+
+    assert(np.array_equal(dist.moments_.classes, [0, 1, 2]))
+    assert(np.allclose(dist.scores_, bhattacharyya_dist(x, y)))
+
+
+def test_partial_fit_feature_constant_in_one_class():
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x, y = make_multiclass_data(n_samples=90, n_classes=3)
+        x[y == 0, 3] = 0.
+        #constant in class 1 inside each batch, but not across them
+        x[y == 1, 4] = np.arange(90)[y == 1] // 20
+
+        batches = [(x[i:i + 20], y[i:i + 20]) for i in range(0, len(y), 20)]
+        for dist_cls in [WelchTestDistance, BhatacharyyaGaussianDistance]:
+            dense    = dist_cls().fit(x, y).scores_
+            streamed = dist_cls().fit_batches(batches).scores_
+            sparse   = dist_cls().fit_batches((sp.csr_matrix(bx), by) for bx, by in batches).scores_
+
+            assert(np.allclose(streamed, dense) and np.allclose(sparse, dense))
+        assert(np.allclose(dense, pairwise_loop(x, y, bhattacharyya_pair)))
+
+        moments = BhatacharyyaGaussianDistance().fit_batches(batches).moments_
+        assert(moments.variances[0, 3] == 0 and moments.variances[1, 4] > 0)
+
+
+def test_float32_scores_match_float64():
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x, y = make_multiclass_data(n_samples=90, n_classes=3)
+        x32  = x.astype(np.float32)
+        for dist_cls in [PearsonCorrelationDistance, WelchTestDistance, BhatacharyyaGaussianDistance]:
+            scores = dist_cls().fit(x32.astype(np.float64), y).scores_
+            assert(np.allclose(dist_cls().fit(x32, y).scores_, scores, rtol=1e-4, atol=1e-5))
+
+
+def test_sparse_scores_match_dense():
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x, y = make_multiclass_data(n_samples=90, n_classes=3)
+        x[np.random.RandomState(1).rand(*x.shape) < 0.8] = 0
+        x[:, 7] = 0  # constant feature
+        xs = sp.csr_matrix(x)
+
+        assert(np.allclose(pearson_correlation(xs, y), pearson_correlation(x, y)))
+        for dist_cls in [PearsonCorrelationDistance, WelchTestDistance, BhatacharyyaGaussianDistance]:
+            scores = dist_cls().fit(x, y).scores_
+            assert(np.allclose(dist_cls().fit(xs, y).scores_, scores))
+
+            batches = [(x[i:i + 20], y[i:i + 20]) for i in range(0, len(y), 20)]
+            sparse_batches = [(sp.csr_matrix(bx), by) for bx, by in batches]
+            assert(np.allclose(dist_cls().fit_batches(sparse_batches).scores_,
+                               dist_cls().fit_batches(batches).scores_))
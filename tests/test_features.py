@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import scipy.sparse as sp
+
+from darwin.features import calculate_stats
+
+
+def test_sparse_calculate_stats_match_dense():
+    rng = np.random.RandomState(0)
+    for n_feats in [30, 31]:
+        x = rng.randn(8, n_feats)
+        x[rng.rand(*x.shape) < 0.7] = 0
+
+        assert(np.allclose(calculate_stats(sp.csr_matrix(x)), calculate_stats(x)))
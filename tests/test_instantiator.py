@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import os
 import os.path as op
 import pytest
 from darwin import instance
@@ -64,3 +65,29 @@ def test_all_default_selector_instances():
         inst.method_name = cls_name
         #assert(str(type(inst.instance)).split()[-1].replace("'", "")[:-1] == inst.method_class)
         assert(type(inst.instance).__name__ == inst.method_class.split('.')[-1])
+
+
+def test_yaml_is_parsed_once(tmpdir):
+    ymlpath = str(tmpdir.join('methods.yml'))
+    with open(ymlpath, 'w') as f:
+        f.write('Foo:\n    class: collections.OrderedDict\n')
+
+    inst1 = instance.MethodInstantiator(ymlpath)
+    inst2 = instance.MethodInstantiator(ymlpath)
+    assert(inst1.yamldata is inst2.yamldata)
+
+    #a modified file is parsed again
+    with open(ymlpath, 'w') as f:
+        f.write('Bar:\n    class: collections.defaultdict\n')
+    os.utime(ymlpath, (1, 1))
+
+    assert(list(inst1.methods) == ['Bar'])
+    assert(type(inst2.get_method_instance('Bar')).__name__ == 'defaultdict')
+
+
+def test_default_params_are_not_shared():
+    inst = instance.SelectorInstantiator()
+    params1 = inst.get_default_params('RFE')
+    params2 = inst.get_default_params('RFE')
+    assert(params1['estimator'] is not params2['estimator'])
+    assert(isinstance(inst.get_yaml_item('RFE')['default']['estimator'], dict))
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import copy
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn import datasets
+from sklearn.base import clone
+from sklearn.svm import SVC
+
+from darwin.kernel import (gram_matrix, SharedGram, PrecomputedKernelSVC, sample_indices,
+                           is_precomputed_kernel_compatible)
+from darwin.pipeline import ClassificationPipeline
+
+
+def test_gram_matrix_chunks():
+    x = np.random.RandomState(0).randn(20, 50)
+    for chunk_size in [1, 7, 50]:
+        assert(np.allclose(gram_matrix(x, chunk_size=chunk_size), np.dot(x, x.T)))
+
+    xc = x - x.mean(axis=0)
+    assert(np.allclose(gram_matrix(x, center=True, chunk_size=7), np.dot(xc, xc.T)))
+    assert(np.allclose(gram_matrix(sp.csr_matrix(x)), np.dot(x, x.T)))
+
+
+def test_shared_gram_is_not_copied():
+    x    = np.random.RandomState(0).randn(20, 5)
+    gram = SharedGram(x)
+    svc  = PrecomputedKernelSVC(gram)
+
+    assert(copy.deepcopy(gram) is gram)
+    assert(clone(svc).gram is gram)
+
+
+def test_precomputed_kernel_svc_equals_svc():
+    x, y = datasets.make_gaussian_quantiles(n_samples=60, n_features=8, n_classes=2, random_state=1)
+    train, test = np.arange(45), np.arange(45, 60)
+    idx = sample_indices(len(y))
+
+    for kernel, params, center in [('rbf', {'gamma': 0.1}, True), ('rbf', {'gamma': 0.5}, False),
+                                   ('poly', {'gamma': 0.2, 'degree': 2, 'coef0': 1.}, False)]:
+        svc = SVC(kernel=kernel, C=10., **params).fit(x[train], y[train])
+        pre = PrecomputedKernelSVC(SharedGram(x, center=center), kernel=kernel, C=10., **params)
+        pre.fit(idx[train], y[train])
+
+        assert(np.allclose(pre.decision_function(idx[test]), svc.decision_function(x[test]), atol=1e-6))
+        assert((pre.predict(idx[test]) == svc.predict(x[test])).all())
+        assert(np.allclose(pre.support_vectors_, svc.support_vectors_))
+
+    centered = PrecomputedKernelSVC(SharedGram(x, center=True), center=True, C=10., gamma=0.1)
+    centered.fit(idx[train], y[train])
+    svc      = SVC(C=10., gamma=0.1).fit(x[train] - x[train].mean(axis=0), y[train])
+    assert(np.allclose(centered.support_vectors_, svc.support_vectors_))
+
+
+def test_precomputed_kernel_compatibility():
+    from sklearn.preprocessing import StandardScaler
+
+    x = np.random.RandomState(0).randn(10, 4)
+    assert(is_precomputed_kernel_compatible(SVC(kernel='rbf', gamma=0.1), None, x))
+    assert(is_precomputed_kernel_compatible(SVC(kernel='rbf', gamma=0.1), StandardScaler(with_std=False), x))
+    assert(not is_precomputed_kernel_compatible(SVC(kernel='poly', gamma=0.1), StandardScaler(with_std=False), x))
+    assert(not is_precomputed_kernel_compatible(SVC(kernel='rbf', gamma=0.1), StandardScaler(), x))
+    assert(not is_precomputed_kernel_compatible(SVC(kernel='linear', gamma=0.1), None, x))
+
+    x[0, 0] = np.nan
+    assert(not is_precomputed_kernel_compatible(SVC(kernel='rbf', gamma=0.1), None, x))
+
+
+def test_pipeline_precomputed_kernel(gaussian_data):
+    from sklearn.preprocessing import StandardScaler
+
+    x, y = gaussian_data()
+    x += 5.
+
+    for scaler in [None, StandardScaler(with_std=False)]:
+        results = []
+        for precompute_kernel in [False, True]:
+            pipe = ClassificationPipeline(clfmethod='RBFSVC', cvmethod='3', scaler=scaler,
+                                          precompute_kernel=precompute_kernel)
+            results.append(pipe.cross_validation(x, y)[0])
+            assert((pipe.shared_gram is not None) == precompute_kernel)
+
+        for fold in results[0].predictions:
+            assert((results[0].predictions[fold] == results[1].predictions[fold]).all())
+            assert(results[0].best_parameters[fold] == results[1].best_parameters[fold])
+
+        #the support vectors are the same, centered if the scaler centers
+        assert(np.allclose(np.asarray(results[0].features_importance),
+                           np.asarray(results[1].features_importance)))
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from sklearn import datasets
+from sklearn.linear_model import RidgeClassifier
+from sklearn.preprocessing import StandardScaler
+
+from darwin.loo import centered_gram, ridge_hat_loo_scores, decode_ridge_scores, ridge_loo_coefs
+from darwin.pipeline import ClassificationPipeline
+
+
+def test_ridge_hat_loo_matches_refits():
+    x, y = datasets.make_classification(n_samples=30, n_features=50, n_classes=3, n_informative=5,
+                                        random_state=0)
+    x += 10.
+
+    classes, scores = ridge_hat_loo_scores(centered_gram(x, chunk_size=7), y, 3.)
+    preds = decode_ridge_scores(scores, classes)
+
+    for i in range(len(y)):
+        train = np.arange(len(y)) != i
+        clf   = RidgeClassifier(alpha=3.).fit(x[train], y[train])
+        assert(np.allclose(clf.decision_function(x[i:i+1]), scores[i], atol=1e-8))
+        assert(clf.predict(x[i:i+1])[0] == preds[i])
+
+
+def test_ridge_loo_coefs_match_refits():
+    x, y = datasets.make_classification(n_samples=30, n_features=50, n_classes=3, n_informative=5,
+                                        random_state=0)
+    x += 10.
+    alphas = np.tile([0.5, 3.], 15)
+
+    coefs = ridge_loo_coefs(x, centered_gram(x), y, np.arange(len(y)), alphas, chunk_size=7)
+    for i in range(len(y)):
+        train = np.arange(len(y)) != i
+        clf   = RidgeClassifier(alpha=alphas[i]).fit(x[train], y[train])
+        assert(np.allclose(clf.coef_, coefs[i]))
+
+
+def test_ridge_loo_pipeline_matches_generic_loop():
+    x, y = datasets.make_classification(n_samples=40, n_features=60, n_informative=5, random_state=1)
+
+    for scaler in [None, StandardScaler(with_std=False)]:
+        fast = ClassificationPipeline(clfmethod='RidgeClassifier', cvmethod='loo', scaler=scaler)
+        slow = ClassificationPipeline(clfmethod='RidgeClassifier', cvmethod='loo', scaler=scaler,
+                                      fast_loo=False)
+
+        fast_results, fast_metrics = fast.cross_validation(x, y)
+        slow_results, slow_metrics = slow.cross_validation(x, y)
+
+        assert(fast.core_plan.fold_jobs == 1)
+        assert(list(fast_results.best_parameters.values()) == list(slow_results.best_parameters.values()))
+        assert((np.array(fast_results.predictions) == np.array(slow_results.predictions)).all())
+        assert(fast_metrics == slow_metrics)
+        #the coef_ of each fold, binary ones are 1-d in some sklearn versions
+        assert(np.allclose(np.asarray(fast_results.features_importance).reshape(len(y), -1),
+                           np.asarray(slow_results.features_importance).reshape(len(y), -1)))
+
+
+def test_permutation_test_of_ridge_loo():
+    x, y = datasets.make_classification(n_samples=40, n_features=60, n_informative=5, random_state=1)
+
+    pipe = ClassificationPipeline(clfmethod='RidgeClassifier', cvmethod='loo', scaler=None)
+    test = pipe.permutation_test(x, y, n_permutations=1000, batch_size=50, random_state=0)
+
+    #the true labels are learnt, so the test stops well before 1000 permutations
+    assert(test.stopped_early and test.n_permutations < 1000)
+    assert(len(test.permutation_scores) == test.n_permutations)
+    assert(test.p_value < 0.05 and test.score > test.permutation_scores.max())
+    assert(pipe.result_metrics().accuracy == test.score)
+
+    #random labels are not
+    noise = pipe.permutation_test(x, np.random.RandomState(0).permutation(y), n_permutations=1000,
+                                  batch_size=50, random_state=0)
+    assert(noise.stopped_early and noise.p_value > 0.05)
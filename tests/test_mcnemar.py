@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from darwin.mcnemar import (get_mcnemar_abcd, get_mcnemar_tables, mcnemar,
+                            mcnemar_test_matrix, mcnemar_pairwise, mcnemar_pvalues, adjust_pvalues)
+
+
+def loop_abcd(y_vals, c1_preds, c2_preds):
+    a, b, c, d = 0, 0, 0, 0
+    for y, c1, c2 in zip(y_vals, c1_preds, c2_preds):
+        if c1 == c2:
+            if c1 == y:
+                a += 1
+            else:
+                d += 1
+        else:
+            if c1 == y:
+                b += 1
+            else:
+                c += 1
+    return a, b, c, d
+
+
+def make_predictions(n_clfs=5, n_samples=500, n_classes=3, seed=0):
+    rng = np.random.RandomState(seed)
+    y = rng.randint(0, n_classes, n_samples)
+    preds = np.array([np.where(rng.rand(n_samples) < 0.5 + 0.1 * i, y, rng.randint(0, n_classes, n_samples))
+                      for i in range(n_clfs)])
+    return y, preds
+
+
+def test_get_mcnemar_abcd_equals_loop():
+    y, preds = make_predictions()
+    assert(get_mcnemar_abcd(y, preds[0], preds[1]) == loop_abcd(y, preds[0], preds[1]))
+    assert(get_mcnemar_abcd(list(y), list(preds[2]), list(preds[3])) == loop_abcd(y, preds[2], preds[3]))
+
+
+def test_get_mcnemar_tables_equals_pairwise():
+    for n_classes in [2, 4]:
+        y, preds = make_predictions(n_classes=n_classes)
+        tables = get_mcnemar_tables(y, preds, chunk_size=77)
+        for i in range(len(preds)):
+            for j in range(len(preds)):
+                assert(tuple(tables[i, j]) == loop_abcd(y, preds[i], preds[j]))
+
+
+def test_mcnemar_test_matrix_equals_mcnemar():
+    y, preds = make_predictions(n_clfs=6, n_classes=2)
+    for onetailed in [True, False]:
+        tables, accepted = mcnemar_test_matrix(y, preds, alpha=0.1, onetailed=onetailed)
+        for i in range(len(preds)):
+            for j in range(len(preds)):
+                a, b, c, d = [int(v) for v in tables[i, j]]
+                assert(accepted[i, j] == mcnemar(a, b, c, d, alpha=0.1, onetailed=onetailed))
+        assert(accepted.diagonal().all())
+
+
+def test_mcnemar_pairwise_equals_mcnemar():
+    y, preds = make_predictions(n_clfs=6, n_classes=2)
+    for onetailed in [True, False]:
+        _, accepted = mcnemar_test_matrix(y, preds, alpha=0.1, onetailed=onetailed)
+        comparison = mcnemar_pairwise(y, preds, alpha=0.1, onetailed=onetailed)
+        assert(np.array_equal(comparison.reject, ~accepted))
+        assert(np.allclose(comparison.statistic, -comparison.statistic.T))
+
+
+def test_mcnemar_pairwise_correction():
+    y, preds = make_predictions(n_clfs=6, n_classes=2)
+    raw  = mcnemar_pairwise(y, preds, alpha=0.1)
+    bonf = mcnemar_pairwise(y, preds, alpha=0.1, correction='bonferroni')
+    holm = mcnemar_pairwise(y, preds, alpha=0.1, correction='holm')
+
+    assert(np.all(raw.pvalue <= holm.pvalue + 1e-15))
+    assert(np.all(holm.pvalue <= bonf.pvalue + 1e-15))
+    assert(np.array_equal(bonf.pvalue, bonf.pvalue.T))
+    assert(np.all(bonf.reject <= holm.reject))
+    assert(np.all(holm.reject <= raw.reject))
+
+
+def test_adjust_pvalues():
+    pvalues = np.array([0.01, 0.04, 0.03, 0.2])
+    assert(np.allclose(adjust_pvalues(pvalues, 'bonferroni'), [0.04, 0.16, 0.12, 0.8]))
+    assert(np.allclose(adjust_pvalues(pvalues, 'holm'), [0.04, 0.09, 0.09, 0.2]))
+    assert(np.array_equal(adjust_pvalues(pvalues, None), pvalues))
+
+
+def test_mcnemar_pvalues():
+    from scipy.stats import chi2
+
+    tables = np.array([[50, 12, 3, 5], [50, 3, 12, 5], [60, 0, 0, 10]])
+
+    z, twotailed = mcnemar_pvalues(tables)
+    assert(np.allclose(z, [9 / np.sqrt(15), -9 / np.sqrt(15), 0]))
+    assert(np.allclose(twotailed[:2], chi2.sf(81 / 15., 1)) and twotailed[2] == 1)
+
+    _, onetailed = mcnemar_pvalues(tables, onetailed=True)
+    assert(np.isclose(onetailed[0], twotailed[0] / 2) and onetailed[1] == 1 and onetailed[2] == 1)
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from darwin.utils.parallel import plan_core_allocation, get_n_cpus, can_limit_blas_threads
+
+
+def test_plan_core_allocation_does_not_oversubscribe():
+    for n_cpus in [1, 2, 7, 32]:
+        for n_folds in [1, 3, 10]:
+            for n_candidates in [1, 5, 25]:
+                plan = plan_core_allocation(n_cpus, n_folds, n_candidates)
+                assert(plan.fold_jobs * plan.gs_jobs * (plan.blas_threads or 1) <= n_cpus)
+                assert(plan.fold_jobs <= n_folds)
+                assert(plan.gs_jobs <= n_candidates)
+
+
+def test_plan_core_allocation_folds_first():
+    plan = plan_core_allocation(32, 10, 25)
+    assert(plan.fold_jobs == 10)
+    assert(plan.gs_jobs == 3)
+    assert(plan.blas_threads == (1 if can_limit_blas_threads() else None))
+
+
+def test_plan_core_allocation_fixed_fold_jobs():
+    plan = plan_core_allocation(8, 10, 25, n_fold_jobs=1)
+    assert(plan[:3] == (8, 1, 8))
+
+    plan = plan_core_allocation(8, 10, 2, n_fold_jobs=2)
+    assert(plan[:3] == (8, 2, 2))
+    assert(plan.blas_threads == (2 if can_limit_blas_threads() else None))
+
+
+def test_plan_core_allocation_process_folds():
+    #the grid search of a worker process runs its candidates one after the other
+    plan = plan_core_allocation(32, 10, 25, nested_jobs=False)
+    assert(plan[:3] == (32, 10, 1))
+    assert(plan.blas_threads == (3 if can_limit_blas_threads() else None))
+
+    #one fold at a time runs in this process
+    assert(plan_core_allocation(8, 10, 25, n_fold_jobs=1, nested_jobs=False).gs_jobs == 8)
+
+
+def test_get_n_cpus():
+    assert(get_n_cpus(3) == 3)
+    assert(get_n_cpus(-1) >= 1)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import StandardScaler
+
+from darwin.preprocessing import FoldStatistics, FoldBuffers, prepare_fold, standard_scale_
+
+
+def _dataset():
+    rng = np.random.RandomState(0)
+    x = rng.normal(1000., 0.01, size=(30, 12))
+    x[:, 3] = 5.
+    x[rng.rand(30, 12) < 0.1] = np.nan
+    return x
+
+
+def test_fold_statistics_match_the_imputed_training_set():
+    x     = _dataset()
+    stats = FoldStatistics(x, chunk_size=5)
+
+    for test in [np.arange(3), np.array([7]), np.arange(10, 30, 2)]:
+        train   = np.setdiff1d(np.arange(len(x)), test)
+        x_train = x[train]
+        means   = np.nanmean(x_train, axis=0)
+        x_train = np.where(np.isnan(x_train), means, x_train)
+
+        mean, std = stats.train_moments(x[test])
+        assert(np.allclose(mean, x_train.mean(axis=0), rtol=0, atol=1e-10))
+        assert(np.allclose(std, x_train.std(axis=0), rtol=1e-7, atol=1e-12))
+
+        scaled = standard_scale_(x_train.copy(), mean, std)
+        assert(np.allclose(scaled, StandardScaler().fit_transform(x_train), atol=1e-6))
+        assert((scaled[:, 3] == 0).all())
+
+
+def test_prepare_fold_imputes_without_touching_the_samples():
+    x     = _dataset()
+    orig  = x.copy()
+    stats = FoldStatistics(x)
+    train, test = np.arange(5, 30), np.arange(5)
+
+    x_train, x_test, mean, std, n_imputed = prepare_fold(x, train, test, stats)
+
+    assert(n_imputed == np.isnan(x).sum())
+    assert(np.array_equal(np.isnan(x), np.isnan(orig)))
+    assert(np.array_equal(x[~np.isnan(x)], orig[~np.isnan(orig)]))
+    means = np.nanmean(x[train], axis=0)
+    assert(np.allclose(x_train, np.where(np.isnan(x[train]), means, x[train])))
+    assert(np.allclose(x_test,  np.where(np.isnan(x[test]),  means, x[test])))
+    assert(np.allclose(mean, means))
+
+
+def test_no_imputation_without_nans():
+    x     = np.random.RandomState(0).rand(30, 12)
+    stats = FoldStatistics(x, chunk_size=5)
+
+    assert(not stats.has_nans)
+    assert(len(stats.nan_features) == 0)
+    assert((stats.nan_counts == 0).all())
+
+    x_train, x_test, mean, std, n_imputed = prepare_fold(x, np.arange(5, 30), np.arange(5), stats)
+    assert(n_imputed == 0)
+    assert(np.array_equal(x_train, x[5:]))
+    assert(np.allclose(std, x[5:].std(axis=0)))
+
+
+def test_nan_counts():
+    x     = _dataset()
+    stats = FoldStatistics(x, chunk_size=5)
+
+    assert(stats.has_nans)
+    assert(np.array_equal(stats.nan_counts, np.isnan(x).sum(axis=0)))
+    assert(np.array_equal(stats.nan_features, np.nonzero(np.isnan(x).any(axis=0))[0]))
+
+
+def test_prepare_fold_float32():
+    x     = _dataset().astype(np.float32)
+    stats = FoldStatistics(x)
+    train, test = np.arange(5, 30), np.arange(5)
+
+    x_train, x_test, mean, std, _ = prepare_fold(x, train, test, stats, dtype=np.float32)
+    x_train64, x_test64, _, _, _  = prepare_fold(x, train, test, stats)
+
+    assert(x_train.dtype == x_test.dtype == np.float32)
+    assert(np.allclose(x_train, x_train64, rtol=1e-6, atol=0))
+
+    buffers = FoldBuffers(len(train), len(test), x.shape[1], np.float32)
+    x_train = prepare_fold(x, train, test, stats, buffers)[0]
+    assert(x_train.dtype == np.float32)
+    assert(np.allclose(standard_scale_(x_train, mean, std), standard_scale_(x_train64, mean, std), atol=1e-2))
+
+
+def _sparse_dataset():
+    rng = np.random.RandomState(0)
+    x = sp.random(30, 40, density=0.2, format='csr', random_state=rng)
+    x.data[rng.rand(x.nnz) < 0.1] = np.nan
+    return x
+
+
+def test_sparse_fold_statistics_match_dense():
+    x     = _sparse_dataset()
+    dense = x.toarray()
+    stats = FoldStatistics(x)
+    dense_stats = FoldStatistics(dense)
+
+    assert(np.array_equal(stats.nan_counts, dense_stats.nan_counts))
+
+    train, test = np.arange(6, 30), np.arange(6)
+    for moments, dense_moments in zip(stats.train_moments(x[test], test),
+                                      dense_stats.train_moments(dense[test], test)):
+        assert(np.allclose(moments, dense_moments))
+
+    x_train, x_test, mean, std, n_imputed = prepare_fold(x, train, test, stats)
+    d_train, d_test, _, _, dense_imputed  = prepare_fold(dense, train, test, dense_stats)
+
+    assert(sp.isspmatrix_csr(x_train) and sp.isspmatrix_csr(x_test))
+    assert(n_imputed == dense_imputed)
+    assert(np.allclose(x_train.toarray(), d_train))
+    assert(np.isnan(x.data).sum() == stats.nan_counts.sum())
+
+    scaled = standard_scale_(x_train, mean, std, with_mean=False)
+    assert(sp.issparse(scaled))
+    assert(np.allclose(scaled.toarray(), standard_scale_(d_train, mean, std, with_mean=False)))
+
+    try:
+        standard_scale_(x_test, mean, std)
+        assert(False)
+    except ValueError:
+        pass
+
+
+def test_prepare_fold_peak_memory():
+    import tracemalloc
+
+    rng = np.random.RandomState(0)
+    x   = rng.rand(400, 2500)
+    x[rng.rand(*x.shape) < 0.01] = np.nan
+
+    stats       = FoldStatistics(x)
+    train, test = np.arange(40, 400), np.arange(40)
+    buffers     = FoldBuffers(len(train), len(test), x.shape[1])
+    test_bytes  = len(test) * x.shape[1] * 8
+
+    tracemalloc.start()
+    try:
+        prepare_fold(x, train, test, stats, buffers)
+        _, buffered_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        prepare_fold(x, train, test, stats)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    #with buffers: the held-out copy to update the statistics and small vectors
+    assert(buffered_peak < 2 * test_bytes)
+    #without: also the fold data itself
+    assert(peak < x.nbytes + 2 * test_bytes)
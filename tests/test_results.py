@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+import pickle
+from collections import OrderedDict
+
+import numpy as np
+from sklearn.metrics import roc_auc_score
+
+from darwin.results import (classification_metrics, _sklearn_classification_metrics,
+                            get_cv_classification_metrics, stacked_classification_metrics, rank_auc,
+                            enlist_cv_results, FoldArrays, to_fold_arrays, repeated_cv_metrics,
+                            permutation_p_value, is_p_value_decided)
+
+
+def _folds(n_folds=30, fold_size=12, seed=0):
+    rng     = np.random.RandomState(seed)
+    targets = [rng.randint(0, 2, fold_size) for _ in range(n_folds)]
+    preds   = [np.where(rng.rand(fold_size) < 0.7, t, 1 - t) for t in targets]
+    #degenerate folds: no negatives, no positive predictions
+    targets[0] = np.ones(fold_size, dtype=int)
+    preds  [1] = np.zeros(fold_size, dtype=int)
+    return targets, preds
+
+
+def test_stacked_metrics_equal_sklearn():
+    targets, preds = _folds()
+    metrics = get_cv_classification_metrics(np.array(targets), np.array(preds))
+
+    assert(metrics.shape == (len(targets), 6))
+    for i in range(1, len(targets)):
+        assert(np.allclose(metrics[i], _sklearn_classification_metrics(targets[i], preds[i], [0, 1])))
+
+    #sklearn can not give the AUC of a fold with only one class
+    assert(np.allclose(metrics[0, :5], _sklearn_classification_metrics(targets[0], preds[0], [0, 1])[:5]))
+    assert(metrics[0, 5] == 0)
+
+
+def test_classification_metrics_non_binary_labels():
+    targets, preds = np.array([1, 2, 1, 2, 2]), np.array([1, 2, 2, 2, 1])
+    assert(np.allclose(classification_metrics(targets, preds, labels=[1, 2]),
+                       _sklearn_classification_metrics(targets, preds, [1, 2])))
+
+
+def test_rank_auc_equals_roc_auc_score():
+    rng     = np.random.RandomState(0)
+    folds   = np.repeat(np.arange(20), 15)
+    targets = rng.randint(0, 2, len(folds))
+    scores  = np.round(rng.rand(len(folds)) + 0.3 * targets, 1)  # with ties
+
+    order = rng.permutation(len(folds))
+    aucs  = rank_auc(folds[order], targets[order], scores[order])
+    for fold in range(20):
+        assert(np.isclose(aucs[fold], roc_auc_score(targets[folds == fold], scores[folds == fold])))
+
+    stacked = stacked_classification_metrics(folds, targets, (scores > 0.5).astype(int), scores)
+    assert(np.allclose(stacked[:, 5], aucs))
+
+
+def test_fold_arrays_dict_access():
+    targets, preds = _folds(n_folds=5, fold_size=4)
+    preds[2] = preds[2][:3]
+    cv_preds = OrderedDict((fold * 10, p) for fold, p in enumerate(preds))
+
+    arrays = FoldArrays.from_dict(cv_preds)
+    assert(list(arrays.keys()) == list(cv_preds.keys()))
+    assert(np.asarray(arrays).shape == (19,))
+    assert(list(arrays.fold_sizes) == [4, 4, 3, 4, 4])
+    assert((arrays.fold_index() == np.repeat(np.arange(5), arrays.fold_sizes)).all())
+    for fold in cv_preds:
+        assert((arrays[fold] == cv_preds[fold]).all())
+
+    loaded = pickle.loads(pickle.dumps(arrays))
+    assert(all((loaded[fold] == arrays[fold]).all() for fold in arrays))
+
+    #same shapes are stacked, others kept as they are
+    importance = to_fold_arrays(OrderedDict((fold, np.ones(7) * fold) for fold in range(5)), stacked=None)
+    assert(importance.stacked and np.asarray(importance).shape == (5, 7))
+    assert((importance[3] == 3).all())
+    assert(isinstance(to_fold_arrays({0: np.ones(2), 1: None}), dict))
+
+    #a fold whose training set lacked a class has fewer probability columns
+    probs = OrderedDict([(0, np.ones((4, 3))), (1, np.ones((4, 2))), (2, np.ones((3, 3)))])
+    assert(to_fold_arrays(probs) is probs)
+    assert(to_fold_arrays(probs, stacked=None) is probs)
+    assert(to_fold_arrays(OrderedDict([(0, np.ones((4, 3))), (1, np.ones((3, 3)))])).fold_sizes.sum() == 7)
+
+
+def test_cv_metrics_of_fold_arrays():
+    targets, preds = _folds()
+    cv_targets = OrderedDict(enumerate(targets))
+    cv_preds   = OrderedDict(enumerate(preds))
+
+    metrics = get_cv_classification_metrics(cv_targets, cv_preds)
+    assert(np.allclose(get_cv_classification_metrics(to_fold_arrays(cv_targets), to_fold_arrays(cv_preds)),
+                       metrics))
+
+    #leave-one-out results come back as one array
+    loo_targets = to_fold_arrays(OrderedDict((i, t[:1]) for i, t in enumerate(targets)))
+    loo_preds   = to_fold_arrays(OrderedDict((i, p[:1]) for i, p in enumerate(preds)))
+    loo = enlist_cv_results(loo_targets, loo_preds)
+    assert((loo[0] == [t[0] for t in targets]).all() and (loo[1] == [p[0] for p in preds]).all())
+    assert(loo[2] is None and loo[3] == [0, 1])
+
+
+def test_repeated_cv_metrics():
+    rng     = np.random.RandomState(0)
+    metrics = rng.rand(20, 6)
+
+    mean, std, ci_low, ci_high = repeated_cv_metrics(metrics, confidence=0.95)
+    assert(np.allclose(mean, metrics.mean(axis=0)) and np.allclose(std, metrics.std(axis=0)))
+    assert(np.all(np.array(ci_low) < np.array(mean)) and np.allclose(np.array(ci_low) + ci_high, 2 * np.array(mean)))
+
+    #wider with more confidence, narrower with more repetitions
+    assert(np.all(np.array(repeated_cv_metrics(metrics, 0.99)[2]) < ci_low))
+    assert(np.all(np.array(repeated_cv_metrics(np.tile(metrics, (4, 1)))[2]) > ci_low))
+    assert(np.isnan(repeated_cv_metrics(metrics[:1])[2].accuracy))
+
+
+def test_permutation_p_value_and_early_stopping():
+    assert(np.isclose(permutation_p_value(0.8, [0.5, 0.8, 0.9, 0.6]), 3 / 5.))
+    assert(np.isclose(permutation_p_value(0.95, np.full(99, 0.5)), 0.01))
+
+    #0 of 200 is clearly below 0.05, 30 of 100 clearly above, 5 of 100 undecided
+    assert(is_p_value_decided(0, 200, alpha=0.05))
+    assert(is_p_value_decided(30, 100, alpha=0.05))
+    assert(not is_p_value_decided(5, 100, alpha=0.05))
+    assert(not is_p_value_decided(0, 20, alpha=0.05))
+    assert(not is_p_value_decided(0, 0))
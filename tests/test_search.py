@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from sklearn import datasets
+from sklearn.svm import LinearSVC
+
+from darwin.search import SuccessiveHalvingSearchCV, stratified_order, get_search_stats
+
+
+def test_stratified_order_prefixes_keep_class_proportions():
+    y     = np.array([0] * 60 + [1] * 30)
+    order = stratified_order(y, np.random.RandomState(0))
+
+    assert(sorted(order) == list(range(len(y))))
+    for n in [9, 30, 45]:
+        assert(abs(np.sum(y[order[:n]] == 1) - n / 3.) <= 1)
+
+
+def test_successive_halving_search():
+    x, y = datasets.make_classification(n_samples=120, n_features=10, random_state=0)
+
+    search = SuccessiveHalvingSearchCV(LinearSVC(), {'C': [0.001, 0.01, 0.1, 1.0, 10.0, 100.0, 1000.0, 0.0001, 0.5]},
+                                       factor=3, random_state=0)
+    search.fit(x, y)
+
+    stats = get_search_stats(search, 1.)
+    assert(stats.n_candidates == 9)
+    #9 candidates, then 3, then 1 refit, 3 folds each
+    assert(stats.n_fits == 9 * 3 + 3 * 3 + 1)
+    #9 candidates on 13 samples, 3 on 39, trained on 2 of 3 folds, then the refit on 120
+    assert(stats.n_fit_samples == 9 * 2 * 13 + 3 * 2 * 39 + 120)
+    assert(search.best_params_ in [score.parameters for score in search.grid_scores_])
+    assert(search.predict(x).shape == y.shape)
+
+
+def test_successive_halving_schedule():
+    x, y = datasets.make_classification(n_samples=60, n_features=10, random_state=0)
+
+    search = SuccessiveHalvingSearchCV(LinearSVC(), {'C': list(np.logspace(-4, 4, 25))}, factor=3, random_state=0)
+    search.fit(x, y)
+
+    #25 candidates on 12 samples, 9 on 36 and 3 on 60, 3 folds each, plus the refit
+    stats = get_search_stats(search, 1.)
+    assert(stats.n_fits == 25 * 3 + 9 * 3 + 3 * 3 + 1)
+    assert(stats.n_fit_samples == 25 * 2 * 12 + 9 * 2 * 36 + 3 * 2 * 60 + 60)
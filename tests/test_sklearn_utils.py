@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from sklearn.svm import LinearSVC
+from sklearn.linear_model import SGDClassifier
+
+from darwin.sklearn_utils import get_ranked_param_grid, fit_accepts, get_repeated_cv_methods
+
+
+def test_get_ranked_param_grid():
+    grid_scores = [({'C': 0.1}, 0.6, None),
+                   ({'C': 1.0}, 0.8, None),
+                   ({'C': 10.0}, 0.7, None),
+                   ({'C': 100.0}, 0.8, None)]
+
+    assert(get_ranked_param_grid(grid_scores) == [{'C': [1.0]}, {'C': [100.0]},
+                                                  {'C': [10.0]}, {'C': [0.1]}])
+    assert(get_ranked_param_grid(grid_scores, n_best=2) == [{'C': [1.0]}, {'C': [100.0]}])
+
+
+def test_fit_accepts():
+    assert(fit_accepts(SGDClassifier(), 'coef_init'))
+    assert(not fit_accepts(LinearSVC(), 'coef_init'))
+
+
+def test_get_repeated_cv_methods():
+    targets = np.array([0] * 20 + [1] * 10)
+
+    cvs = get_repeated_cv_methods(targets, '5', n_repeats=4, random_state=0)
+    assert(len(cvs) == 4)
+
+    tests = []
+    for cv in cvs:
+        folds = list(cv)
+        assert(len(folds) == 5)
+        assert(sorted(np.concatenate([test for _, test in folds])) == list(range(30)))
+        #stratified
+        assert(all(targets[test].sum() == 2 for _, test in folds))
+        tests.append([sorted(test) for _, test in folds])
+
+    #each repetition shuffles differently, the same seed gives the same folds
+    assert(tests[0] != tests[1])
+    again = [[sorted(test) for _, test in cv] for cv in get_repeated_cv_methods(targets, '5', 4, random_state=0)]
+    assert(again == tests)
+
+    pytest.raises(ValueError, get_repeated_cv_methods, targets, 'loo')
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from darwin.threshold import (find_histogram, find_thresholds, robust_range_threshold)
+
+
+def loop_histogram(vol, n_bins, mini, maxi, mask=None):
+    """Reference element by element histogram."""
+    hist = np.zeros(n_bins, dtype=int)
+    if mini == maxi:
+        return hist, 0
+
+    a = vol.flatten() if mask is None else vol[mask > 0.5].flatten()
+    validsize = 0
+    for v in a:
+        b = v * float(n_bins)/(maxi-mini) + (float(n_bins)*float(-mini)) / (maxi-mini)
+        hist[int(max(0, min(b, n_bins - 1)))] += 1
+        validsize += 1
+    return hist, validsize
+
+
+def loop_thresholds(vol, mask=None):
+    """Reference find_thresholds with the bin counting while loops."""
+    hist_bins, max_jumps = 1000, 10
+    top_bin, bottom_bin, jump = 0, 0, 1
+    lowest_bin, highest_bin = 0, hist_bins - 1
+    thresh98, thresh2 = 0., 0.
+
+    sel = vol if mask is None else vol[mask > 0]
+    mini, maxi = sel.min(), sel.max()
+
+    while jump == 1 or ((float(thresh98) - thresh2) < (maxi - mini)/10.):
+        if jump > 1:
+            bottom_bin = max(bottom_bin-1, 0)
+            top_bin = min(top_bin + 1, hist_bins - 1)
+            tmpmin = mini + (float(bottom_bin)/float(hist_bins)) * (maxi-mini)
+            maxi = mini + (float(top_bin + 1)/float(hist_bins)) * (maxi-mini)
+            mini = tmpmin
+
+        if jump == max_jumps or mini == maxi:
+            mini, maxi = sel.min(), sel.max()
+
+        hist, validsize = loop_histogram(vol, hist_bins, mini, maxi, mask)
+        if validsize < 1:
+            return mini, maxi
+
+        if jump == max_jumps:
+            validsize -= hist[lowest_bin] + hist[highest_bin]
+            lowest_bin += 1
+            highest_bin -= 1
+
+        fA = (maxi-mini)/float(hist_bins)
+
+        count, bottom_bin = 0, lowest_bin
+        while count < float(validsize)/50:
+            count += hist[bottom_bin]
+            bottom_bin += 1
+        bottom_bin -= 1
+        thresh2 = mini + float(bottom_bin) * fA
+
+        count, top_bin = 0, highest_bin
+        while count < float(validsize)/50:
+            count += hist[top_bin]
+            top_bin -= 1
+        top_bin += 1
+        thresh98 = mini + (float(top_bin) + 1) * fA
+
+        if jump == max_jumps:
+            break
+        jump += 1
+
+    return thresh2, thresh98
+
+
+def make_scores(size=5000, seed=0):
+    rng = np.random.RandomState(seed)
+    vol = np.abs(rng.standard_cauchy(size)) * 0.01
+    vol[rng.rand(size) < 0.3] = 0
+    return vol
+
+
+def test_find_histogram_equals_loop():
+    vol = make_scores()
+    hist = np.zeros(1000, dtype=int)
+    for mini, maxi in [(vol.min(), vol.max()), (0.001, 0.02), (0.5, 0.5)]:
+        h, validsize = find_histogram(vol, hist, mini, maxi)
+        ref_h, ref_validsize = loop_histogram(vol, hist.size, mini, maxi)
+        assert(validsize == ref_validsize)
+        assert(np.array_equal(h, ref_h))
+
+
+def test_find_thresholds_equals_loop():
+    for seed in range(3):
+        vol  = make_scores(seed=seed)
+        mask = (vol > 0).astype(int)
+        assert(np.allclose(find_thresholds(vol), loop_thresholds(vol)))
+        assert(np.allclose(find_thresholds(vol, mask), loop_thresholds(vol, mask)))
+
+
+def test_robust_range_threshold():
+    vol = make_scores()
+    thr = robust_range_threshold(vol.copy(), 95)
+    assert(thr.shape == vol.shape)
+    assert(np.all((thr == 0) | (thr == vol)))
+    assert(0 < np.count_nonzero(thr) < np.count_nonzero(vol))